@@ -0,0 +1,132 @@
+"""
+Прогон рассылки: N получателей в локальном индексе подписок, заглушка Bot API
+(доля 429 и заблокировавших бота), параллельно — интерактивные пользователи.
+Рассылка прерывается посередине (как при деплое) и продолжается с checkpoint'а;
+в конце проверяется, что никто не получил сообщение дважды.
+
+    python -m bench.broadcast --recipients 600 --blocked-rate 0.05 --tg-429-rate 0.01
+    python -m bench.broadcast --recipients 3000 --tg-global-rate 1000 --interrupt-at 0.5
+"""
+import argparse
+import asyncio
+import itertools
+import random
+import time
+
+from bench.fakes import FakeTelegram, import_bot, make_update, percentile
+
+FIRST_RECIPIENT = 500000
+INTERACTIVE_USERS = 5
+ADMIN_CHAT = 1
+
+
+async def interactive_probe(fake: FakeTelegram, stop: asyncio.Event, samples: dict[str, list[float]], phase: list[str]):
+    """
+    Пользователи открывают «Информацию»: время до ответа бота, отдельно до рассылки и во время неё.
+    Пауза между тапами больше 1/TG_CHAT_RATE, чтобы не мерить лимит на чат.
+    """
+    ids = itertools.count(10_000_000)
+
+    async def user(chat_id: int):
+        while not stop.is_set():
+            done = fake.expect_messages(chat_id, 1)
+            t0 = time.perf_counter()
+            fake.push_update(make_update(next(ids), chat_id, text="ℹ️ Информация"))
+            try:
+                t1 = await asyncio.wait_for(done, 30)
+                samples.setdefault(phase[0], []).append((t1 - t0) * 1000)
+            except asyncio.TimeoutError:
+                pass
+            await asyncio.sleep(1.5)
+
+    await asyncio.gather(*(user(100 + i) for i in range(INTERACTIVE_USERS)))
+
+
+async def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--recipients", type=int, default=600)
+    ap.add_argument("--blocked-rate", type=float, default=0.05)
+    ap.add_argument("--tg-latency-ms", type=float, default=20.0)
+    ap.add_argument("--tg-429-rate", type=float, default=0.0)
+    ap.add_argument("--tg-global-rate", default="30")
+    ap.add_argument("--interrupt-at", type=float, default=0.4, help="доля получателей, после которой «рестарт»")
+    ap.add_argument("--photo", action="store_true", help="рассылка картинкой (один file_id на всех)")
+    ap.add_argument("--hard-kill", action="store_true", help="обрывать задачу рассылки, а не останавливать штатно")
+    ap.add_argument("--baseline-s", type=float, default=5.0, help="сколько мерить интерактив без рассылки")
+    args = ap.parse_args()
+
+    fake = FakeTelegram(latency_ms=args.tg_latency_ms, retry_after_rate=args.tg_429_rate)
+    tg_base = await fake.start()
+    botmod = import_bot(tg_base, TG_GLOBAL_RATE=args.tg_global_rate, SUBSCRIPTION_SYNC_INTERVAL="0")
+    from notion import CabinetRecord
+
+    recipients = [FIRST_RECIPIENT + i for i in range(args.recipients)]
+    botmod.subscription_index.upsert([
+        CabinetRecord(tg_id=str(tg_id), status="approved", created_time="2026-01-01T00:00:00.000Z")
+        for tg_id in recipients
+    ])
+    fake.blocked = {tg_id for tg_id in recipients if random.random() < args.blocked_rate}
+
+    polling = asyncio.create_task(
+        botmod.dp.start_polling(botmod.bot, handle_signals=False, close_bot_session=False, polling_timeout=10)
+    )
+    stop = asyncio.Event()
+    samples: dict[str, list[float]] = {}
+    phase = ["idle"]
+    probe = asyncio.create_task(interactive_probe(fake, stop, samples, phase))
+    await asyncio.sleep(args.baseline_s)
+    phase[0] = "broadcast"
+
+    b = botmod.broadcast_store.create(
+        "Анонс: стрим в пятницу",
+        photo="photo-file-id" if args.photo else "",
+        admin_chat_id=ADMIN_CHAT,
+    )
+    t0 = time.perf_counter()
+    try:
+        botmod.broadcaster.start(b)
+        # «деплой»: штатная остановка (дослать текущую страницу) или обрыв, как при падении процесса
+        while botmod.broadcaster.current() and b.processed < args.recipients * args.interrupt_at:
+            await asyncio.sleep(0.05)
+        await botmod.broadcaster.close(timeout=0 if args.hard_kill else 5)
+        interrupted_at = b.processed
+        await asyncio.sleep(0.5)
+
+        resumed = botmod.broadcaster.resume()
+        report = fake.expect_messages(ADMIN_CHAT, 1)
+        await asyncio.wait_for(report, 600)
+        wall = time.perf_counter() - t0
+        b = botmod.broadcast_store.get(resumed.broadcast_id)
+    finally:
+        stop.set()
+        await asyncio.gather(probe, return_exceptions=True)
+        await asyncio.wait_for(botmod.updates.join(), 10)
+        await botmod.dp.stop_polling()
+        await asyncio.gather(polling, return_exceptions=True)
+        await botmod.updates.close()
+        await botmod.outbound.close()
+        await botmod.bot.session.close()
+        await fake.close()
+
+    sent = [fake.messages_by_chat[tg_id] for tg_id in recipients if tg_id not in fake.blocked]
+    duplicates = sum(1 for n in sent if n > 1)
+    missing = sum(1 for n in sent if n == 0)
+    print(
+        f"recipients={args.recipients} blocked={len(fake.blocked)} interrupted_at={interrupted_at} "
+        f"status={b.status}"
+    )
+    print(
+        f"delivered={b.delivered} blocked={b.blocked} failed={b.failed} "
+        f"msgs/s={b.rate:.1f} (wall {wall:.1f}s incl. restart)"
+    )
+    # duplicates при --hard-kill: сообщения, которые были в полёте в момент обрыва
+    print(f"duplicates={duplicates} missing={missing} retry_after_hits={botmod.outbound.retry_after_hits}")
+    for name, latencies in samples.items():
+        print(
+            f"interactive ({name}): n={len(latencies)} "
+            f"p50={percentile(latencies, 0.5):.1f}ms p95={percentile(latencies, 0.95):.1f}ms"
+        )
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
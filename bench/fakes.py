@@ -0,0 +1,333 @@
+"""
+Локальные заглушки внешних API для бенчмарков.
+"""
+import json
+import os
+import asyncio
+import random
+import tempfile
+import time
+from collections import Counter, defaultdict
+
+from aiohttp import web
+
+BOT_USER = {"id": 1, "is_bot": True, "first_name": "Fake", "username": "fake_bot"}
+
+MESSAGE_METHODS = {"sendMessage", "sendPhoto", "sendDocument", "editMessageText", "editMessageCaption", "editMessageMedia"}
+
+
+async def start_site(app: web.Application) -> tuple[web.AppRunner, str]:
+    runner = web.AppRunner(app, access_log=None)
+    await runner.setup()
+    site = web.TCPSite(runner, "127.0.0.1", 0)
+    await site.start()
+    port = site._server.sockets[0].getsockname()[1]
+    return runner, f"http://127.0.0.1:{port}"
+
+
+def make_update(
+    update_id: int,
+    chat_id: int,
+    *,
+    text: str | None = None,
+    callback_data: str | None = None,
+    photo: bool = False,
+) -> dict:
+    user = {"id": chat_id, "is_bot": False, "first_name": f"user{chat_id}", "username": f"user{chat_id}"}
+    message = {
+        "message_id": update_id,
+        "date": int(time.time()),
+        "chat": {"id": chat_id, "type": "private"},
+        "from": user,
+    }
+    if callback_data is not None:
+        # сообщение бота, под которым нажали инлайн-кнопку
+        message["from"] = BOT_USER
+        if photo:
+            message["photo"] = [{"file_id": "photo-0", "file_unique_id": "u", "width": 1, "height": 1}]
+            message["caption"] = "menu"
+        else:
+            message["text"] = "menu"
+        return {
+            "update_id": update_id,
+            "callback_query": {
+                "id": str(update_id),
+                "from": user,
+                "chat_instance": str(chat_id),
+                "message": message,
+                "data": callback_data,
+            },
+        }
+    message["text"] = text or ""
+    return {"update_id": update_id, "message": message}
+
+
+class FakeTelegram:
+    """
+    Заглушка Bot API: getUpdates (long poll), send*/edit*/answerCallbackQuery/deleteMessage,
+    set/deleteWebhook. Настраиваемая задержка и доля ответов 429;
+    чаты из blocked отвечают 403 (бот заблокирован пользователем).
+    """
+
+    def __init__(self, *, latency_ms: float = 0.0, retry_after_rate: float = 0.0, retry_after: int = 1):
+        self.latency_ms = latency_ms
+        self.retry_after_rate = retry_after_rate
+        self.retry_after = retry_after
+        self.blocked: set[int] = set()
+        self.calls: Counter = Counter()
+        self.calls_by_chat: dict[int, Counter] = defaultdict(Counter)
+        self._updates: list[dict] = []
+        self._new_update = asyncio.Event()
+        self._reply_waiters: dict[int, list[asyncio.Future]] = defaultdict(list)
+        self.messages_by_chat: Counter = Counter()
+        self._count_waiters: dict[int, list[tuple[int, asyncio.Future]]] = defaultdict(list)
+        self._message_id = 0
+        self.runner: web.AppRunner | None = None
+        self.base_url = ""
+
+    async def start(self) -> str:
+        app = web.Application(client_max_size=32 * 1024 * 1024)
+        app.router.add_post("/bot{token}/{method}", self._handle)
+        self.runner, self.base_url = await start_site(app)
+        return self.base_url
+
+    async def close(self):
+        if self.runner:
+            await self.runner.cleanup()
+
+    def push_update(self, update: dict):
+        self._updates.append(update)
+        self._new_update.set()
+
+    def wait_reply(self, chat_id: int) -> asyncio.Future:
+        fut = asyncio.get_running_loop().create_future()
+        self._reply_waiters[chat_id].append(fut)
+        return fut
+
+    def expect_messages(self, chat_id: int, n: int = 1) -> asyncio.Future:
+        """Future, который сработает, когда в чат уйдут ещё n сообщений (send*/edit*)."""
+        fut = asyncio.get_running_loop().create_future()
+        self._count_waiters[chat_id].append((self.messages_by_chat[chat_id] + n, fut))
+        return fut
+
+    def reset_counters(self):
+        self.calls.clear()
+        self.calls_by_chat.clear()
+
+    async def _get_updates(self, params) -> list[dict]:
+        offset = int(params.get("offset") or 0)
+        timeout = float(params.get("timeout") or 0)
+        deadline = time.monotonic() + timeout
+        while True:
+            self._updates = [u for u in self._updates if u["update_id"] >= offset]
+            if self._updates or time.monotonic() >= deadline:
+                return self._updates[:100]
+            self._new_update.clear()
+            try:
+                await asyncio.wait_for(self._new_update.wait(), deadline - time.monotonic())
+            except asyncio.TimeoutError:
+                pass
+
+    async def _handle(self, request: web.Request) -> web.Response:
+        method = request.match_info["method"]
+        params = await request.post()
+        if self.latency_ms:
+            await asyncio.sleep(self.latency_ms / 1000)
+
+        if method == "getUpdates":
+            return web.json_response({"ok": True, "result": await self._get_updates(params)})
+
+        self.calls[method] += 1
+        chat_id = int(params.get("chat_id") or 0)
+        if chat_id:
+            self.calls_by_chat[chat_id][method] += 1
+
+        if self.retry_after_rate and method != "getMe" and random.random() < self.retry_after_rate:
+            return web.json_response({
+                "ok": False,
+                "error_code": 429,
+                "description": f"Too Many Requests: retry after {self.retry_after}",
+                "parameters": {"retry_after": self.retry_after},
+            }, status=429)
+
+        if chat_id in self.blocked and method in MESSAGE_METHODS:
+            return web.json_response({
+                "ok": False,
+                "error_code": 403,
+                "description": "Forbidden: bot was blocked by the user",
+            }, status=403)
+
+        if method == "getMe":
+            result = BOT_USER
+        elif method in MESSAGE_METHODS:
+            self._message_id += 1
+            result = {
+                "message_id": int(params.get("message_id") or self._message_id),
+                "date": int(time.time()),
+                "chat": {"id": chat_id, "type": "private"},
+                "from": BOT_USER,
+            }
+            if method in ("sendPhoto", "editMessageMedia"):
+                result["photo"] = [{"file_id": f"photo-{self._message_id}", "file_unique_id": "u", "width": 1, "height": 1}]
+                result["caption"] = params.get("caption") or ""
+            elif method == "sendDocument":
+                result["document"] = {"file_id": f"doc-{self._message_id}", "file_unique_id": "d"}
+            else:
+                result["text"] = params.get("text") or ""
+            now = time.perf_counter()
+            for fut in self._reply_waiters.pop(chat_id, []):
+                if not fut.done():
+                    fut.set_result(now)
+            self.messages_by_chat[chat_id] += 1
+            if chat_id in self._count_waiters:
+                waiting = []
+                for target, fut in self._count_waiters.pop(chat_id):
+                    if self.messages_by_chat[chat_id] >= target:
+                        if not fut.done():
+                            fut.set_result(now)
+                    else:
+                        waiting.append((target, fut))
+                if waiting:
+                    self._count_waiters[chat_id] = waiting
+        else:
+            result = True
+        return web.json_response({"ok": True, "result": result})
+
+
+def percentile(values: list[float], q: float) -> float:
+    values = sorted(values)
+    idx = min(len(values) - 1, max(0, int(round(q * (len(values) - 1)))))
+    return values[idx]
+
+
+def _plain(page: dict, name: str) -> str:
+    return (page["properties"].get(name, {}).get("rich_text") or [{}])[0].get("plain_text", "")
+
+
+def _sort_key(sort: dict):
+    if "property" in sort:
+        return lambda page: _plain(page, sort["property"])
+    return lambda page: page.get(sort["timestamp"], "")
+
+
+def _tg_ids_in_filter(filter_obj: dict | None) -> set[str] | None:
+    """tg_id из фильтра бота (один equals или or из нескольких); None — фильтр не по tg_id."""
+    if not filter_obj:
+        return None
+    conditions = filter_obj.get("or", [filter_obj])
+    ids = {c["rich_text"]["equals"] for c in conditions if c.get("property") == "tg_id" and "rich_text" in c}
+    return ids or None
+
+
+class FakeNotion:
+    """
+    Заглушка Notion: GET /databases/{id} (схема) и POST /databases/{id}/query
+    по засеянным страницам — фильтр по tg_id, sorts (по умолчанию created_time desc),
+    page_size/start_cursor, filter_properties. Настраиваемая задержка, доля 5xx и 429.
+    """
+
+    def __init__(
+        self,
+        pages: list[dict] | None = None,
+        *,
+        latency_ms: float = 0.0,
+        error_rate: float = 0.0,
+        throttle_rate: float = 0.0,
+        retry_after: float = 1.0,
+    ):
+        self.pages = sorted(pages or [], key=lambda p: p.get("created_time", ""), reverse=True)
+        self.latency_ms = latency_ms
+        self.error_rate = error_rate
+        self.throttle_rate = throttle_rate
+        self.retry_after = retry_after
+        self.calls: Counter = Counter()
+        # порядок по sorts считается один раз: выгрузка по всей базе — сотни запросов
+        self._sorted: dict[str, list[dict]] = {}
+        self.runner: web.AppRunner | None = None
+        self.base_url = ""
+
+    async def start(self) -> str:
+        app = web.Application()
+        app.router.add_post("/v1/databases/{db}/query", self._query)
+        app.router.add_get("/v1/databases/{db}", self._schema)
+        self.runner, base = await start_site(app)
+        self.base_url = f"{base}/v1"
+        return self.base_url
+
+    async def close(self):
+        if self.runner:
+            await self.runner.cleanup()
+
+    async def _schema(self, request: web.Request) -> web.Response:
+        self.calls["schema"] += 1
+        names = set()
+        for page in self.pages:
+            names.update(page.get("properties", {}))
+        # id свойства = имя: filter_properties можно сверять напрямую
+        return web.json_response({"object": "database", "properties": {n: {"id": n} for n in sorted(names)}})
+
+    async def _query(self, request: web.Request) -> web.Response:
+        body = await request.json()
+        if self.latency_ms:
+            await asyncio.sleep(self.latency_ms / 1000)
+        r = random.random()
+        if r < self.throttle_rate:
+            self.calls["429"] += 1
+            return web.json_response(
+                {"object": "error", "status": 429, "code": "rate_limited"},
+                status=429,
+                headers={"Retry-After": str(self.retry_after)},
+            )
+        if r < self.throttle_rate + self.error_rate:
+            self.calls["5xx"] += 1
+            return web.json_response({"object": "error", "status": 502, "code": "bad_gateway"}, status=502)
+        self.calls["query"] += 1
+
+        ids = _tg_ids_in_filter(body.get("filter"))
+        if ids is None:
+            matched = self.pages
+        else:
+            matched = [p for p in self.pages if _plain(p, "tg_id") in ids]
+        sorts = body.get("sorts") or []
+        if sorts and sorts != [{"timestamp": "created_time", "direction": "descending"}]:
+            key = json.dumps([sorts, sorted(ids or [])], sort_keys=True)
+            if key not in self._sorted:
+                ordered = list(matched)
+                for sort in reversed(sorts):
+                    ordered.sort(key=_sort_key(sort), reverse=sort.get("direction") == "descending")
+                self._sorted[key] = ordered
+            matched = self._sorted[key]
+        start = int(body.get("start_cursor") or 0)
+        size = int(body.get("page_size") or 100)
+        chunk = matched[start:start + size]
+        wanted = request.query.getall("filter_properties", [])
+        if wanted:
+            chunk = [{**p, "properties": {k: v for k, v in p["properties"].items() if k in wanted}} for p in chunk]
+        has_more = start + size < len(matched)
+        return web.json_response({
+            "object": "list",
+            "results": chunk,
+            "has_more": has_more,
+            "next_cursor": str(start + size) if has_more else None,
+        })
+
+
+def import_bot(telegram_base: str, *, notion_base: str = "", **env: str):
+    """
+    Импортирует bot.py с тестовым окружением и направляет Bot на заглушку Telegram.
+    """
+    os.environ.setdefault("BOT_TOKEN", "123456:FAKE-token")
+    os.environ.setdefault("NOTION_TOKEN", "fake")
+    os.environ.setdefault("NOTION_DATABASE_ID", "db")
+    os.environ.setdefault("TALLY_FORM_URL", "https://tally.so/r/fake")
+    os.environ.setdefault("DATA_DIR", tempfile.mkdtemp(prefix="bench-bot-"))
+    if notion_base:
+        os.environ["NOTION_API_BASE"] = notion_base
+    os.environ.update(env)
+
+    from aiogram.client.telegram import TelegramAPIServer
+
+    import bot as bot_module
+
+    bot_module.bot.session.api = TelegramAPIServer.from_base(telegram_base)
+    return bot_module
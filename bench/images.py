@@ -0,0 +1,61 @@
+"""
+Бенчмарк: загрузка картинок экранов исходными PNG против оптимизированных вариантов.
+Каждая картинка отправляется «холодной» (без file_id) в заглушку Bot API.
+Плюс время подготовки вариантов: первый старт (конвертация) и повторный (только хеши).
+    python -m bench.images
+"""
+import asyncio
+import tempfile
+import time
+import tracemalloc
+
+from bench.fakes import FakeTelegram, import_bot, make_update
+from images import ImageOptimizer, pillow_available
+
+
+async def upload_all(botmod, message, paths: list[str]) -> tuple[float, int]:
+    tracemalloc.start()
+    t0 = time.perf_counter()
+    for path in paths:
+        botmod.media.forget(botmod.image_variants.resolve(path))
+        await botmod.send_photo_safe(message, path, caption="bench")
+    elapsed = time.perf_counter() - t0
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return elapsed, peak
+
+
+async def main():
+    if not pillow_available():
+        print("Pillow is not installed: nothing to compare")
+        return
+    fake = FakeTelegram()
+    base = await fake.start()
+    botmod = import_bot(base, TG_GLOBAL_RATE="10000", TG_CHAT_RATE="10000", TG_CHAT_BURST="10000")
+    from aiogram.types import Update
+
+    message = Update.model_validate(make_update(1, 777, text="x"), context={"bot": botmod.bot}).message
+    paths = botmod.SCREENS.images()
+
+    t_png, mem_png = await upload_all(botmod, message, paths)
+
+    out_dir = tempfile.mkdtemp(prefix="bench-images-")
+    for label in ("cold", "warm"):
+        optimizer = ImageOptimizer(out_dir)
+        t0 = time.perf_counter()
+        optimizer.prepare(paths)
+        print(f"prepare ({label} start): {(time.perf_counter() - t0) * 1000:.0f}ms")
+    botmod.image_variants = optimizer
+    t_opt, mem_opt = await upload_all(botmod, message, paths)
+
+    print("\n".join(optimizer.report()))
+    print(f"upload original: {t_png * 1000:7.1f}ms, peak python memory {mem_png / 1024:.0f} KB")
+    print(f"upload variants: {t_opt * 1000:7.1f}ms, peak python memory {mem_opt / 1024:.0f} KB")
+
+    await botmod.outbound.close()
+    await botmod.bot.session.close()
+    await fake.close()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,165 @@
+"""
+Нагрузочный прогон бота целиком: заглушки Bot API и Notion (bench.fakes), апдейты
+идут через getUpdates (или webhook), пользователи проходят сценарии при растущей
+конкурентности. Латентность шага — от отдачи апдейта до последнего сообщения бота в ответ.
+
+    python -m bench.load --levels 1,10,50,100 --flows purchase,cabinet_storm
+    python -m bench.load --tg-latency-ms 50 --tg-429-rate 0.01 --notion-latency-ms 150 --notion-error-rate 0.02
+
+Лимиты бота (TG_GLOBAL_RATE, NOTION_RATE, ...) по умолчанию боевые — прогон показывает,
+во что упирается бот; --tg-global-rate / --notion-rate их поднимают.
+"""
+import argparse
+import asyncio
+import itertools
+import time
+
+import aiohttp
+
+from bench.fakes import FakeNotion, FakeTelegram, import_bot, make_update, percentile, start_site
+from bench.notion_payload import recorded_page
+
+SECRET = "bench-secret"
+FIRST_USER = 100000  # tg_id засеянных в Notion пользователей (recorded_page)
+
+# шаг: (text, callback_data, нажали под фото?, сколько сообщений бот отправит/отредактирует)
+FLOWS = {
+    "purchase": [
+        ("📦 Мои продукты", None, False, 2),
+        ("Hadiukov Community", None, False, 1),
+        (None, "buy:community", True, 1),
+        (None, "pm:community:crypto", True, 1),
+        (None, "sub:community:crypto:1m", True, 1),
+    ],
+    "cabinet_storm": [("👤 Личный кабинет", None, False, 1)] + [(None, "cabinet:refresh", False, 1)] * 5,
+    "browse": [
+        ("ℹ️ Информация", None, False, 1),
+        ("❓ Помощь", None, False, 2),
+        ("🌐 Мои ресурсы", None, False, 2),
+        ("В главное меню", None, False, 1),
+    ],
+}
+
+
+async def run_level(fake: FakeTelegram, deliver, flow: list, users: int, rounds: int, ids, step_timeout: float):
+    latencies: list[float] = []
+    failures = 0
+
+    async def user(chat_id: int):
+        nonlocal failures
+        for _ in range(rounds):
+            for text, data, photo, replies in flow:
+                done = fake.expect_messages(chat_id, replies)
+                t0 = time.perf_counter()
+                await deliver(make_update(next(ids), chat_id, text=text, callback_data=data, photo=photo))
+                try:
+                    t1 = await asyncio.wait_for(done, step_timeout)
+                except asyncio.TimeoutError:
+                    failures += 1
+                    continue
+                latencies.append((t1 - t0) * 1000)
+
+    t0 = time.perf_counter()
+    await asyncio.gather(*(user(FIRST_USER + i) for i in range(users)))
+    wall = time.perf_counter() - t0
+    return latencies, failures, wall
+
+
+def report(flow: str, users: int, latencies: list[float], failures: int, wall: float):
+    steps = len(latencies) + failures
+    if not latencies:
+        print(f"{flow:<14} users={users:<4} all {failures} steps timed out")
+        return
+    print(
+        f"{flow:<14} users={users:<4} updates/s={steps / wall:8.1f} "
+        f"p50={percentile(latencies, 0.5):8.1f}ms p95={percentile(latencies, 0.95):8.1f}ms "
+        f"p99={percentile(latencies, 0.99):8.1f}ms timeouts={failures}"
+    )
+
+
+async def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--levels", default="1,10,50,100", help="число одновременных пользователей")
+    ap.add_argument("--flows", default=",".join(FLOWS))
+    ap.add_argument("--rounds", type=int, default=2, help="сколько раз каждый пользователь проходит сценарий")
+    ap.add_argument("--mode", choices=("polling", "webhook"), default="polling")
+    ap.add_argument("--step-timeout", type=float, default=30.0)
+    ap.add_argument("--tg-latency-ms", type=float, default=0.0)
+    ap.add_argument("--tg-429-rate", type=float, default=0.0)
+    ap.add_argument("--notion-latency-ms", type=float, default=0.0)
+    ap.add_argument("--notion-error-rate", type=float, default=0.0)
+    ap.add_argument("--notion-429-rate", type=float, default=0.0)
+    ap.add_argument("--tg-global-rate", default="30")
+    ap.add_argument("--tg-chat-rate", default="1")
+    ap.add_argument("--notion-rate", default="3")
+    args = ap.parse_args()
+
+    levels = [int(x) for x in args.levels.split(",")]
+    fake = FakeTelegram(latency_ms=args.tg_latency_ms, retry_after_rate=args.tg_429_rate)
+    tg_base = await fake.start()
+    fake_notion = FakeNotion(
+        [recorded_page(i) for i in range(max(levels))],
+        latency_ms=args.notion_latency_ms,
+        error_rate=args.notion_error_rate,
+        throttle_rate=args.notion_429_rate,
+    )
+    notion_base = await fake_notion.start()
+    botmod = import_bot(
+        tg_base,
+        notion_base=notion_base,
+        WEBHOOK_SECRET=SECRET,
+        TG_GLOBAL_RATE=args.tg_global_rate,
+        TG_CHAT_RATE=args.tg_chat_rate,
+        NOTION_RATE=args.notion_rate,
+        NOTION_BURST=args.notion_rate,
+        SUBSCRIPTION_SYNC_INTERVAL="0",
+    )
+    await botmod.notion.start()
+
+    http = None
+    runner = None
+    polling = None
+    if args.mode == "webhook":
+        runner, hook_base = await start_site(botmod.build_webhook_app())
+        url = f"{hook_base}{botmod.WEBHOOK_PATH}"
+        http = aiohttp.ClientSession(headers={"X-Telegram-Bot-Api-Secret-Token": SECRET})
+
+        async def deliver(update: dict):
+            async with http.post(url, json=update) as r:
+                r.raise_for_status()
+    else:
+        polling = asyncio.create_task(
+            botmod.dp.start_polling(botmod.bot, handle_signals=False, close_bot_session=False, polling_timeout=10)
+        )
+
+        async def deliver(update: dict):
+            fake.push_update(update)
+
+    ids = itertools.count(1)
+    try:
+        for name in args.flows.split(","):
+            for users in levels:
+                latencies, failures, wall = await run_level(
+                    fake, deliver, FLOWS[name], users, args.rounds, ids, args.step_timeout
+                )
+                report(name, users, latencies, failures, wall)
+        print(f"notion calls: {dict(fake_notion.calls)}")
+    finally:
+        await asyncio.wait_for(botmod.updates.join(), 10)
+        if polling is not None:
+            await botmod.dp.stop_polling()
+            await asyncio.gather(polling, return_exceptions=True)
+        if http is not None:
+            await http.close()
+        if runner is not None:
+            await runner.cleanup()
+        await botmod.updates.close()
+        await botmod.outbound.close()
+        await botmod.notion.close()
+        await botmod.bot.session.close()
+        await fake_notion.close()
+        await fake.close()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,64 @@
+"""
+Сколько вызовов Bot API стоит каждый пользовательский сценарий.
+Заглушки Telegram и Notion локальные, апдейты подаются прямо в Dispatcher.
+    python -m bench.navigation
+"""
+import asyncio
+import itertools
+
+from aiogram.types import Update
+
+from bench.fakes import FakeNotion, FakeTelegram, import_bot, make_update
+from bench.notion_payload import recorded_page
+
+# (text, callback_data, нажали под фото?)
+FLOWS = {
+    "community -> buy -> crypto -> 1m": [
+        ("Hadiukov Community", None, False),
+        (None, "buy:community", True),
+        (None, "pm:community:crypto", True),
+        (None, "sub:community:crypto:1m", True),
+    ],
+    "cabinet + 3x refresh": [
+        ("👤 Личный кабинет", None, False),
+        (None, "cabinet:refresh", False),
+        (None, "cabinet:refresh", False),
+        (None, "cabinet:refresh", False),
+    ],
+    "help": [("❓ Помощь", None, False)],
+    "resources": [("🌐 Мои ресурсы", None, False)],
+    "legacy buy:mentoring": [(None, "buy:mentoring", True)],
+    "close": [(None, "close", True)],
+}
+
+
+async def main():
+    fake = FakeTelegram()
+    base = await fake.start()
+    fake_notion = FakeNotion([recorded_page(i) for i in range(10)])
+    notion_base = await fake_notion.start()
+    botmod = import_bot(base, notion_base=notion_base, TG_GLOBAL_RATE="10000", TG_CHAT_RATE="10000", TG_CHAT_BURST="10000")
+    ids = itertools.count(1)
+
+    print(f"{'flow':<36} {'api calls':>9}  breakdown")
+    for chat_id, (name, steps) in enumerate(FLOWS.items(), start=500):
+        fake.reset_counters()
+        for text, data, photo in steps:
+            raw = make_update(next(ids), chat_id, text=text, callback_data=data, photo=photo)
+            update = Update.model_validate(raw, context={"bot": botmod.bot})
+            await botmod.dp.feed_update(botmod.bot, update)
+            await botmod.updates.join()
+        calls = fake.calls.copy()
+        calls.pop("getMe", None)
+        print(f"{name:<36} {sum(calls.values()):>9}  {dict(sorted(calls.items()))}")
+
+    await botmod.updates.close()
+    await botmod.outbound.close()
+    await botmod.notion.close()
+    await botmod.bot.session.close()
+    await fake_notion.close()
+    await fake.close()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,84 @@
+"""
+Бенчмарк: httpx.AsyncClient на каждый запрос (как было) против общего NotionClient.
+
+Поднимает локальную заглушку Notion (bench.fakes.FakeNotion) и меряет p50/p99.
+Запуск из корня репо:
+    python -m bench.notion_client --requests 500 --concurrency 10
+"""
+import argparse
+import asyncio
+import statistics
+import time
+
+import httpx
+
+from bench.fakes import FakeNotion, percentile
+from bench.notion_payload import recorded_page
+from notion import NotionClient, NOTION_VERSION
+from ratelimit import AdaptiveRateLimiter
+
+async def per_request_client(base_url: str) -> None:
+    # старый вариант: новый клиент (и новое соединение) на каждый запрос
+    headers = {"Authorization": "Bearer x", "Notion-Version": NOTION_VERSION, "Content-Type": "application/json"}
+    async with httpx.AsyncClient(timeout=httpx.Timeout(30.0, connect=10.0)) as client:
+        r = await client.post(f"{base_url}/databases/db/query", headers=headers, json={"page_size": 10})
+    r.raise_for_status()
+    r.json()
+
+
+async def run(name: str, call, total: int, concurrency: int) -> None:
+    sem = asyncio.Semaphore(concurrency)
+    latencies: list[float] = []
+
+    async def one():
+        async with sem:
+            t0 = time.perf_counter()
+            await call()
+            latencies.append((time.perf_counter() - t0) * 1000)
+
+    t0 = time.perf_counter()
+    await asyncio.gather(*(one() for _ in range(total)))
+    wall = time.perf_counter() - t0
+    print(
+        f"{name:<20} n={total} p50={percentile(latencies, 0.5):7.2f}ms "
+        f"p99={percentile(latencies, 0.99):7.2f}ms mean={statistics.mean(latencies):7.2f}ms "
+        f"rps={total / wall:8.1f}"
+    )
+
+
+async def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--requests", type=int, default=500)
+    ap.add_argument("--concurrency", type=int, default=10)
+    ap.add_argument("--latency-ms", type=float, default=0.0)
+    args = ap.parse_args()
+
+    fake = FakeNotion([recorded_page(i) for i in range(args.requests)], latency_ms=args.latency_ms)
+    base_url = await fake.start()
+    # меряем только транспорт: лимитер и хеджирование не мешают
+    notion = NotionClient(
+        "x",
+        "db",
+        base_url=base_url,
+        max_connections=args.concurrency,
+        limiter=AdaptiveRateLimiter(rate=1e6, burst=1e6),
+        hedge_quantile=None,
+    )
+    await notion.start()
+    try:
+        counter = iter(range(10**9))
+
+        def pooled():
+            # разные tg_id, чтобы single-flight не склеивал запросы
+            filter_obj = {"property": "tg_id", "rich_text": {"equals": str(100000 + next(counter))}}
+            return notion.query_database(filter_obj)
+
+        await run("per-request client", lambda: per_request_client(base_url), args.requests, args.concurrency)
+        await run("pooled NotionClient", pooled, args.requests, args.concurrency)
+    finally:
+        await notion.close()
+        await fake.close()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,107 @@
+"""
+Бенчмарк: полный ответ Notion (page_size=10, все свойства) против урезанного
+(page_size=1 + filter_properties) и память на закэшированного пользователя:
+JSON страницы против CabinetRecord.
+
+Ответы собраны по форме реальных ответов databases/{id}/query для нашей базы заявок.
+    python -m bench.notion_payload
+"""
+import json
+import time
+import tracemalloc
+
+from notion import CABINET_PROPERTIES, CabinetRecord
+
+
+def _rt(value: str) -> dict:
+    return {
+        "id": "x",
+        "type": "rich_text",
+        "rich_text": [{
+            "type": "text",
+            "text": {"content": value, "link": None},
+            "annotations": {
+                "bold": False, "italic": False, "strikethrough": False,
+                "underline": False, "code": False, "color": "default",
+            },
+            "plain_text": value,
+            "href": None,
+        }],
+    }
+
+
+def recorded_page(i: int, properties: tuple[str, ...] | None = None) -> dict:
+    props = {
+        "Name": {"id": "title", "type": "title", "title": [{"type": "text", "plain_text": f"Order {i}"}]},
+        "tg_id": _rt(str(100000 + i)),
+        "tg_username": _rt(f"user{i}"),
+        "product": _rt("Hadiukov Community"),
+        "period": _rt("1 month"),
+        "period_key": _rt("1m"),
+        "pay_method": _rt("Crypto (USDT)"),
+        "order_id": _rt("6f1c1b8e-1d8a-4c55-9a55-6d2c5d1f0b3e"),
+        "amount_usdt": _rt("50"),
+        "amount_uah": _rt(""),
+        "expires_at": _rt("2030-01-01"),
+        "status": {"id": "s", "type": "status", "status": {"id": "a", "name": "approved", "color": "green"}},
+        "discord": _rt(f"user{i}#0001"),
+        "email": _rt(f"user{i}@example.com"),
+        "screenshot": {"id": "f", "type": "files", "files": [{
+            "name": "payment.png", "type": "file",
+            "file": {"url": "https://prod-files-secure.s3.us-west-2.amazonaws.com/" + "a" * 400, "expiry_time": "2030-01-01T00:00:00.000Z"},
+        }]},
+    }
+    if properties is not None:
+        props = {k: v for k, v in props.items() if k in properties}
+    return {
+        "object": "page",
+        "id": f"00000000-0000-0000-0000-{i:012d}",
+        "created_time": "2024-01-01T00:00:00.000Z",
+        "last_edited_time": "2024-01-02T00:00:00.000Z",
+        "created_by": {"object": "user", "id": "u"},
+        "last_edited_by": {"object": "user", "id": "u"},
+        "cover": None,
+        "icon": None,
+        "parent": {"type": "database_id", "database_id": "db"},
+        "archived": False,
+        "in_trash": False,
+        "properties": props,
+        "url": f"https://www.notion.so/{i}",
+        "public_url": None,
+    }
+
+
+def response(pages: list[dict]) -> bytes:
+    return json.dumps({"object": "list", "results": pages, "next_cursor": None, "has_more": False}).encode()
+
+
+def decode_cost(raw: bytes, n: int = 2000) -> float:
+    t0 = time.perf_counter()
+    for _ in range(n):
+        json.loads(raw)
+    return (time.perf_counter() - t0) / n * 1e6
+
+
+def retained_bytes(make, n: int = 5000) -> float:
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    kept = [make(i) for i in range(n)]
+    after = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    del kept
+    return (after - before) / n
+
+
+def main():
+    full = response([recorded_page(i) for i in range(10)])
+    trimmed = response([recorded_page(0, CABINET_PROPERTIES)])
+    print(f"response bytes   full={len(full):7d}  trimmed={len(trimmed):6d}")
+    print(f"json decode      full={decode_cost(full):7.1f}us trimmed={decode_cost(trimmed):6.1f}us")
+
+    full_mem = retained_bytes(lambda i: json.loads(response([recorded_page(i)]))["results"][0])
+    rec_mem = retained_bytes(lambda i: CabinetRecord.from_page(recorded_page(i, CABINET_PROPERTIES)))
+    print(f"cached per user  page-json={full_mem:7.0f}B CabinetRecord={rec_mem:6.0f}B")
+
+
+if __name__ == "__main__":
+    main()
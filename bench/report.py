@@ -0,0 +1,119 @@
+"""
+Отчёт /report и выгрузка по всей базе: потоковый проход по Notion (iter_batches)
+с предвыборкой следующей пачки и без неё, память прохода при разном размере базы.
+
+    python -m bench.report --pages 2000,20000 --notion-latency-ms 100
+"""
+import argparse
+import asyncio
+import gc
+import os
+import random
+import tempfile
+import time
+import tracemalloc
+
+from bench.fakes import FakeNotion
+from bench.notion_payload import _rt, recorded_page
+from notion import PRIORITY_REPORT, NotionClient
+from orders import OrderLedger
+from ratelimit import AdaptiveRateLimiter
+from reports import REPORT_PROPERTIES, REPORT_SORTS, ReportRow, RowWriter, SubscriberReport
+
+SAMPLE_EVERY = 1000
+STATUSES = ("approved", "approved", "approved", "pending", "rejected")
+
+
+def seed(n: int, ledger: OrderLedger) -> list[dict]:
+    """n заявок от n/2 пользователей; у трети сумма только в журнале заказов (компактная ссылка Tally)."""
+    rnd = random.Random(n)
+    pages = []
+    for i in range(n):
+        page = recorded_page(i)
+        props = page["properties"]
+        tg_id = 200000 + i // 2
+        props["tg_id"] = _rt(str(tg_id))
+        props["status"]["status"]["name"] = rnd.choice(STATUSES)
+        props["expires_at"] = _rt(rnd.choice(("2020-01-01", "2030-01-01")))
+        page["created_time"] = f"2024-01-{1 + i % 28:02d}T00:00:{i % 60:02d}.000Z"
+        if i % 3 == 0:
+            order = ledger.create(tg_id, period_key="3m", currency="UAH", amount=3900)
+            props["order_id"] = _rt(ledger.token(order.order_id))
+            props["amount_usdt"] = _rt("")
+            props["period_key"] = _rt("")
+        pages.append(page)
+    return pages
+
+
+async def run_pass(notion: NotionClient, ledger: OrderLedger, prefetch: bool, export: str | None):
+    """
+    Один проход по базе. live — память, реально удерживаемая проходом (после gc.collect()
+    каждые SAMPLE_EVERY строк): httpx держит Response и его поток в цикле ссылок,
+    поэтому пик tracemalloc включает ещё не собранный мусор.
+    """
+    report = SubscriberReport()
+    writer = RowWriter(export, "csv") if export else None
+    live = 0
+    rows = 0
+    t0 = time.perf_counter()
+    async for batch in notion.iter_batches(
+        None,
+        page_size=100,
+        sorts=REPORT_SORTS,
+        priority=PRIORITY_REPORT,
+        filter_properties=REPORT_PROPERTIES,
+        prefetch=prefetch,
+    ):
+        for page in batch:
+            row = ReportRow.from_page(page, ledger.resolve)
+            report.add(row)
+            if writer:
+                writer.write(row)
+            rows += 1
+            if tracemalloc.is_tracing() and rows % SAMPLE_EVERY == 0:
+                gc.collect()
+                live = max(live, tracemalloc.get_traced_memory()[0])
+    if writer:
+        writer.close()
+    return report, time.perf_counter() - t0, live
+
+
+async def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--pages", default="2000,20000")
+    ap.add_argument("--notion-latency-ms", type=float, default=100.0)
+    ap.add_argument("--notion-rate", type=float, default=50.0, help="лимитер клиента, req/s")
+    args = ap.parse_args()
+
+    tmp = tempfile.mkdtemp(prefix="bench-report-")
+    for n in [int(x) for x in args.pages.split(",")]:
+        ledger = OrderLedger(os.path.join(tmp, f"orders-{n}.sqlite3"), b"bench")
+        fake = FakeNotion(seed(n, ledger), latency_ms=args.notion_latency_ms)
+        base = await fake.start()
+        notion = NotionClient(
+            "x", "db", base_url=base, limiter=AdaptiveRateLimiter(rate=args.notion_rate, burst=args.notion_rate)
+        )
+        await notion.start()
+        try:
+            export = os.path.join(tmp, f"export-{n}.csv")
+            for prefetch in (False, True):
+                report, wall, _ = await run_pass(notion, ledger, prefetch, export)
+                print(
+                    f"pages={n:<6} prefetch={'on ' if prefetch else 'off'} {wall:6.2f}s {n / wall:7.0f} rows/s  "
+                    f"users={report.users} active={report.active} expired={report.expired} "
+                    f"pending={report.pending} rejected={report.rejected}"
+                )
+            tracemalloc.start()
+            _, _, live = await run_pass(notion, ledger, True, export)
+            tracemalloc.stop()
+            print(f"    live memory of the pass: {live / 1024:.0f} KB, export {os.path.getsize(export) // 1024} KB")
+            for (period, currency), (count, total) in sorted(report.revenue.items()):
+                print(f"    revenue {period} {currency}: {count} / {total}")
+        finally:
+            await notion.close()
+            await fake.close()
+            ledger.close()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
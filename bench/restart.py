@@ -0,0 +1,103 @@
+"""
+Тёплый рестарт: пользователи открывают кабинет, бот пишет снапшот, затем «деплой» —
+in-memory состояние сбрасывается и все снова открывают кабинет: без снапшота
+(холодный старт) и с загруженным снапшотом. Синхронизация индекса подписок выключена,
+поэтому кабинет его не читает: всё, что переживает рестарт, — снапшот кэша.
+
+    python -m bench.restart --users 200 --without-request 0.5 --notion-latency-ms 150
+"""
+import argparse
+import asyncio
+import itertools
+import time
+
+from bench.fakes import FakeNotion, FakeTelegram, import_bot, make_update, percentile
+from bench.notion_payload import recorded_page
+
+FIRST_USER = 100000  # tg_id засеянных в Notion пользователей (recorded_page)
+CABINET = "👤 Личный кабинет"
+
+
+async def open_cabinet(fake: FakeTelegram, users: int, ids) -> list[float]:
+    async def user(chat_id: int) -> float:
+        done = fake.expect_messages(chat_id, 1)
+        t0 = time.perf_counter()
+        fake.push_update(make_update(next(ids), chat_id, text=CABINET))
+        t1 = await asyncio.wait_for(done, 60)
+        return (t1 - t0) * 1000
+
+    return await asyncio.gather(*(user(FIRST_USER + i) for i in range(users)))
+
+
+def reset(botmod):
+    """То, что теряет новый процесс: кэш кабинета и состояние лимитеров."""
+    botmod.cabinet_cache._data.clear()
+    botmod.notion.limiter.bucket.set_rate(botmod.notion.limiter.max_rate)
+    botmod.notion.limiter._paused_until = 0.0
+
+
+async def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--users", type=int, default=200)
+    ap.add_argument("--without-request", type=float, default=0.5, help="доля пользователей без заявки в Notion")
+    ap.add_argument("--notion-latency-ms", type=float, default=150.0)
+    ap.add_argument("--notion-rate", default="3")
+    ap.add_argument("--downtime-s", type=float, default=5.0, help="пауза между остановкой и стартом")
+    args = ap.parse_args()
+
+    fake = FakeTelegram()
+    tg_base = await fake.start()
+    with_request = args.users - int(args.users * args.without_request)
+    fake_notion = FakeNotion([recorded_page(i) for i in range(with_request)], latency_ms=args.notion_latency_ms)
+    notion_base = await fake_notion.start()
+    botmod = import_bot(
+        tg_base,
+        notion_base=notion_base,
+        TG_GLOBAL_RATE="1000",
+        NOTION_RATE=args.notion_rate,
+        NOTION_BURST=args.notion_rate,
+        SUBSCRIPTION_SYNC_INTERVAL="0",
+        SNAPSHOT_INTERVAL="0",
+    )
+    await botmod.notion.start()
+    polling = asyncio.create_task(
+        botmod.dp.start_polling(botmod.bot, handle_signals=False, close_bot_session=False, polling_timeout=10)
+    )
+    ids = itertools.count(1)
+    try:
+        await open_cabinet(fake, args.users, ids)
+        t0 = time.perf_counter()
+        botmod.snapshot.save()
+        print(
+            f"snapshot: {len(botmod.cabinet_cache)} cabinet entries, {botmod.snapshot.last_size} bytes, "
+            f"save {(time.perf_counter() - t0) * 1000:.1f}ms"
+        )
+        await asyncio.sleep(args.downtime_s)
+
+        for warm in (False, True):
+            reset(botmod)
+            if warm:
+                t0 = time.perf_counter()
+                botmod.snapshot.load()
+                print(f"load {(time.perf_counter() - t0) * 1000:.1f}ms, {len(botmod.cabinet_cache)} entries restored")
+            queries = fake_notion.calls["query"]
+            latencies = await open_cabinet(fake, args.users, ids)
+            print(
+                f"{'warm' if warm else 'cold'}: notion queries={fake_notion.calls['query'] - queries:<4} "
+                f"first cabinet p50={percentile(latencies, 0.5):7.1f}ms "
+                f"p95={percentile(latencies, 0.95):7.1f}ms max={max(latencies):7.1f}ms"
+            )
+    finally:
+        await asyncio.wait_for(botmod.updates.join(), 10)
+        await botmod.dp.stop_polling()
+        await asyncio.gather(polling, return_exceptions=True)
+        await botmod.updates.close()
+        await botmod.outbound.close()
+        await botmod.notion.close()
+        await botmod.bot.session.close()
+        await fake_notion.close()
+        await fake.close()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,89 @@
+"""
+Микробенчмарк: стоимость диспетчеризации апдейта — цепочка lambda-фильтров (как было)
+против одного F.text-хендлера с TextRouter.
+
+Хендлеры пустые, сеть не трогаем: меряем только aiogram + фильтры.
+    python -m bench.routing --updates 20000
+"""
+import argparse
+import asyncio
+import time
+
+from aiogram import Bot, Dispatcher, F
+from aiogram.filters import Command, CommandStart
+from aiogram.types import Update
+
+from bench.fakes import make_update
+from routing import TextRouter
+
+TEXTS = [
+    "ℹ️ Информация",
+    "❓ Помощь",
+    "📦 Мои продукты",
+    "🌐 Мои ресурсы",
+    "👤 Личный кабинет",
+    "В главное меню",
+    "Hadiukov Community",
+    "Hadiukov Mentoring",
+    "привет, как оплатить подписку?",  # свободный текст проходит всю цепочку
+]
+
+
+async def noop(message):
+    return None
+
+
+def filter_chain_dispatcher() -> Dispatcher:
+    dp = Dispatcher()
+    dp.message(CommandStart())(noop)
+    dp.message(Command("menu"))(noop)
+    dp.message(lambda m: (m.text or "") == "В главное меню")(noop)
+    dp.message(lambda m: "Информация" in (m.text or ""))(noop)
+    dp.message(lambda m: "Помощь" in (m.text or ""))(noop)
+    dp.message(lambda m: "Мои ресурсы" in (m.text or ""))(noop)
+    dp.message(lambda m: "Мои продукты" in (m.text or ""))(noop)
+    dp.message(F.text == "Hadiukov Community")(noop)
+    dp.message(F.text == "Hadiukov Mentoring")(noop)
+    dp.message(lambda m: "Личный кабинет" in (m.text or ""))(noop)
+    return dp
+
+
+def routing_table_dispatcher() -> Dispatcher:
+    dp = Dispatcher()
+    router = TextRouter({t: noop for t in TEXTS[:-1]}, fallback=noop)
+    dp.message(CommandStart())(noop)
+    dp.message(Command("menu"))(noop)
+    dp.message(F.text)(router.dispatch)
+    return dp
+
+
+async def measure(name: str, dp: Dispatcher, bot: Bot, updates: list[Update]):
+    for u in updates[:200]:
+        await dp.feed_update(bot, u)
+    t0 = time.perf_counter()
+    for u in updates:
+        await dp.feed_update(bot, u)
+    dt = time.perf_counter() - t0
+    print(f"{name:<14} {dt / len(updates) * 1e6:8.1f} us/update")
+
+
+async def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--updates", type=int, default=20000)
+    args = ap.parse_args()
+
+    bot = Bot("123456:FAKE-token")
+    for text in (None, TEXTS[-1]):
+        sample = [text] if text else TEXTS
+        updates = [
+            Update.model_validate(make_update(i, 1, text=sample[i % len(sample)]), context={"bot": bot})
+            for i in range(args.updates)
+        ]
+        print(f"-- {'free text only' if text else 'all menu labels + free text'}")
+        await measure("filter chain", filter_chain_dispatcher(), bot, updates)
+        await measure("routing table", routing_table_dispatcher(), bot, updates)
+    await bot.session.close()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,80 @@
+"""
+Бенчмарк: задержка «апдейт → ответ» в режимах polling и webhook.
+
+Заглушка Bot API добавляет --api-latency-ms к каждому вызову (в том числе к getUpdates),
+что моделирует путь до api.telegram.org. Запуск из корня репо:
+    python -m bench.webhook --updates 200 --concurrency 20 --api-latency-ms 50
+"""
+import argparse
+import asyncio
+import time
+
+import aiohttp
+
+from bench.fakes import FakeTelegram, import_bot, make_update, percentile, start_site
+
+SECRET = "bench-secret"
+
+
+async def drive(fake: FakeTelegram, deliver, total: int, concurrency: int, first_id: int) -> list[float]:
+    sem = asyncio.Semaphore(concurrency)
+    latencies: list[float] = []
+
+    async def one(i: int):
+        async with sem:
+            chat_id = 10_000 + i
+            reply = fake.wait_reply(chat_id)
+            t0 = time.perf_counter()
+            await deliver(make_update(first_id + i, chat_id, text="/start"))
+            t1 = await asyncio.wait_for(reply, 30)
+            latencies.append((t1 - t0) * 1000)
+
+    await asyncio.gather(*(one(i) for i in range(total)))
+    return latencies
+
+
+def report(name: str, latencies: list[float]):
+    print(f"{name:<8} n={len(latencies)} p50={percentile(latencies, 0.5):7.2f}ms p99={percentile(latencies, 0.99):7.2f}ms")
+
+
+async def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--updates", type=int, default=200)
+    ap.add_argument("--concurrency", type=int, default=20)
+    ap.add_argument("--api-latency-ms", type=float, default=50.0)
+    args = ap.parse_args()
+
+    fake = FakeTelegram(latency_ms=args.api_latency_ms)
+    base = await fake.start()
+    # лимиты Telegram здесь не меряем — снимаем глобальный bucket
+    botmod = import_bot(base, WEBHOOK_SECRET=SECRET, TG_GLOBAL_RATE="10000")
+
+    # polling
+    polling = asyncio.create_task(
+        botmod.dp.start_polling(botmod.bot, handle_signals=False, close_bot_session=False, polling_timeout=10)
+    )
+
+    async def push(update: dict):
+        fake.push_update(update)
+
+    report("polling", await drive(fake, push, args.updates, args.concurrency, 1))
+    await botmod.dp.stop_polling()
+    await asyncio.gather(polling, return_exceptions=True)
+
+    # webhook
+    runner, hook_base = await start_site(botmod.build_webhook_app())
+    url = f"{hook_base}{botmod.WEBHOOK_PATH}"
+    async with aiohttp.ClientSession(headers={"X-Telegram-Bot-Api-Secret-Token": SECRET}) as http:
+        async def post(update: dict):
+            async with http.post(url, json=update) as r:
+                r.raise_for_status()
+
+        report("webhook", await drive(fake, post, args.updates, args.concurrency, 1_000_000))
+
+    await runner.cleanup()
+    await botmod.bot.session.close()
+    await fake.close()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
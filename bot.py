@@ -1,4 +1,5 @@
-import uuid
+import os
+import signal
 import asyncio
 import logging
 import time
@@ -6,10 +7,11 @@ from datetime import datetime, date
 from urllib.parse import urlencode, quote
 
 import httpx
+from aiohttp import web
 from dateutil.relativedelta import relativedelta
 
 from aiogram import Bot, Dispatcher, F
-from aiogram.filters import CommandStart, Command
+from aiogram.filters import CommandStart, Command, CommandObject
 from aiogram.types import (
     Message,
     CallbackQuery,
@@ -19,18 +21,104 @@ from aiogram.types import (
     ReplyKeyboardMarkup,
     KeyboardButton,
     FSInputFile,
+    InputMediaPhoto,
 )
-from aiogram.exceptions import TelegramNetworkError, TelegramRetryAfter
-
-from config import BOT_TOKEN, TALLY_FORM_URL, NOTION_TOKEN, NOTION_DATABASE_ID
+from aiogram.types.base import UNSET_PARSE_MODE
+from aiogram.exceptions import TelegramBadRequest, TelegramForbiddenError, TelegramNetworkError, TelegramRetryAfter
+from aiogram.webhook.aiohttp_server import SimpleRequestHandler
+
+from config import (
+    BOT_TOKEN,
+    TALLY_FORM_URL,
+    LOG_LEVEL,
+    LOG_FORMAT,
+    LOG_INFO_RATE,
+    LOG_INFO_BURST,
+    NOTION_TOKEN,
+    NOTION_DATABASE_ID,
+    NOTION_API_BASE,
+    NOTION_MAX_CONNECTIONS,
+    NOTION_MAX_KEEPALIVE,
+    NOTION_KEEPALIVE_EXPIRY,
+    MEDIA_CACHE_PATH,
+    IMAGE_OPTIMIZE,
+    IMAGE_CACHE_DIR,
+    IMAGE_MAX_SIDE,
+    IMAGE_QUALITY,
+    IMAGE_FORMAT,
+    CABINET_CACHE_SIZE,
+    CABINET_CACHE_TTL,
+    CABINET_CACHE_STALE,
+    SUBSCRIPTION_INDEX_PATH,
+    SUBSCRIPTION_SYNC_INTERVAL,
+    SUBSCRIPTION_FULL_SYNC_INTERVAL,
+    EXPIRY_REMINDER_DAYS,
+    EXPIRY_REMINDER_HOUR_UTC,
+    EXPIRY_REMINDER_GRACE_HOURS,
+    REMINDER_LOG_PATH,
+    BROADCAST_PATH,
+    BROADCAST_CHUNK,
+    EXPORT_DIR,
+    SNAPSHOT_PATH,
+    SNAPSHOT_INTERVAL,
+    SNAPSHOT_MAX_AGE,
+    ORDER_LEDGER_PATH,
+    ORDER_TOKEN_SECRET,
+    ORDER_PENDING_DAYS,
+    TALLY_COMPACT_URL,
+    RUN_MODE,
+    WEBHOOK_BASE_URL,
+    WEBHOOK_PATH,
+    WEBHOOK_SECRET,
+    WEBHOOK_HOST,
+    WEBHOOK_PORT,
+    UPDATE_WORKERS,
+    UPDATE_MAX_QUEUE,
+    METRICS_PATH,
+    METRICS_HOST,
+    METRICS_PORT,
+    METRICS_TOKEN,
+    TG_GLOBAL_RATE,
+    TG_CHAT_RATE,
+    TG_CHAT_BURST,
+    TG_GROUP_RATE_PER_MIN,
+    NOTION_RATE,
+    NOTION_BURST,
+    NOTION_MAX_QUEUE,
+    NOTION_INTERACTIVE_MAX_WAIT,
+    NOTION_BREAKER_FAILURE_RATE,
+    NOTION_BREAKER_SLOW_CALL,
+    NOTION_BREAKER_OPEN_SECONDS,
+    CABINET_DEADLINE,
+    NOTION_HEDGE_QUANTILE,
+    NOTION_HEDGE_BUDGET,
+    CABINET_BATCH_WINDOW_MS,
+    CABINET_BATCH_MAX,
+)
+from broadcast import Broadcast, Broadcaster, BroadcastStore
+from cache import BatchLoader, TTLCache
+from circuit import CircuitBreaker, CircuitOpenError
+from expiry import ExpiryScheduler, ReminderLog
+from images import ImageOptimizer
+from logs import LogContextMiddleware, setup_logging
+from media import MediaRegistry
+from metrics import REGISTRY, HandlerMetricsMiddleware, TelegramRequestMetrics, add_metrics_route, is_loopback
+from orders import Order, OrderLedger
+from notion import PRIORITY_INTERACTIVE, SYNC_PROPERTIES, CabinetRecord, NotionClient
+from ratelimit import AdaptiveRateLimiter, RateLimitExceeded
+from reports import EXPORT_FORMATS, RowWriter, SubscriberReport, iter_report_rows, missing_report_properties
+from routing import TextRouter
+from screens import Screen, ScreenCatalog
+from snapshot import Snapshot
+from sender import BULK, OutboundScheduler
+from subscriptions import AUDIENCES, SubscriptionIndex, sync_forever
+from updates import ALLOWED_UPDATES, UpdateExecutor
 
 # =========================
 # LOGGING
 # =========================
-logging.basicConfig(
-    level=logging.INFO,
-    format="%(asctime)s | %(levelname)s | %(name)s | %(message)s",
-)
+# запись в stderr — в фоновом потоке, event loop только кладёт запись в очередь
+setup_logging(level=LOG_LEVEL, fmt=LOG_FORMAT, info_rate=LOG_INFO_RATE, info_burst=LOG_INFO_BURST)
 log = logging.getLogger("bot")
 
 # =========================
@@ -69,34 +157,56 @@ MENTORING_USDT = 3000
 MENTORING_UAH = 130000
 
 PERIOD_TEXT = {"1m": "1 month", "3m": "3 months"}
+PERIOD_TEXT_RU = {"1m": "1 месяц", "3m": "3 месяца"}
 PERIOD_MONTHS = {"1m": 1, "3m": 3}
 
+# method -> (currency, {period_key: amount}); отсюда и кнопки, и суммы к оплате
+COMMUNITY_PRICES = {
+    "crypto": ("USDT", {"1m": COMMUNITY_USDT_1M, "3m": COMMUNITY_USDT_3M}),
+    "fiat": ("UAH", {"1m": COMMUNITY_UAH_1M, "3m": COMMUNITY_UAH_3M}),
+}
+PAY_METHOD_TEXT = {"crypto": "Crypto (USDT)", "fiat": "Fiat (UAH)"}
+
 # =========================
 # BOT INIT
 # =========================
 
 bot = Bot(BOT_TOKEN, parse_mode="HTML")
 dp = Dispatcher()
+# ограниченный пул обработчиков, порядок внутри чата сохраняется
+updates = UpdateExecutor(workers=UPDATE_WORKERS, max_queue=UPDATE_MAX_QUEUE)
+dp.update.outer_middleware(updates)
+media = MediaRegistry(MEDIA_CACHE_PATH)
+image_variants = ImageOptimizer(IMAGE_CACHE_DIR, max_side=IMAGE_MAX_SIDE, quality=IMAGE_QUALITY, fmt=IMAGE_FORMAT)
+outbound = OutboundScheduler(
+    global_rate=TG_GLOBAL_RATE,
+    global_burst=TG_GLOBAL_RATE,
+    chat_rate=TG_CHAT_RATE,
+    chat_burst=TG_CHAT_BURST,
+    group_rate=TG_GROUP_RATE_PER_MIN / 60.0,
+    group_burst=TG_CHAT_BURST,
+)
 
 # =========================
 # SAFE SEND (Telegram retry)
 # =========================
 
-async def safe_answer(message: Message, text: str, *, reply_markup=None, retries: int = 3):
+async def safe_answer(message: Message, text: str, *, reply_markup=None, parse_mode=UNSET_PARSE_MODE, retries: int = 3):
     """
-    Надёжная отправка сообщений:
+    Надёжная отправка сообщений (через общий планировщик исходящих):
     - TelegramNetworkError: повторяем
-    - TelegramRetryAfter (Flood control): ждём и повторяем
+    - TelegramRetryAfter (Flood control): планировщик ставит чат на паузу, повтор встаёт в очередь за ней
     """
     last_err = None
     for attempt in range(retries):
         try:
-            return await message.answer(text, reply_markup=reply_markup)
+            return await outbound.send(
+                message.chat.id,
+                lambda: message.answer(text, reply_markup=reply_markup, parse_mode=parse_mode),
+            )
         except TelegramRetryAfter as e:
             last_err = e
-            wait_s = float(getattr(e, "retry_after", 2.0))
-            log.warning("TelegramRetryAfter: wait %.2fs (attempt %s/%s)", wait_s, attempt + 1, retries)
-            await asyncio.sleep(wait_s)
+            log.warning("TelegramRetryAfter: %ss (attempt %s/%s)", e.retry_after, attempt + 1, retries)
         except TelegramNetworkError as e:
             last_err = e
             await asyncio.sleep(1.0 + attempt * 0.5)
@@ -114,13 +224,11 @@ async def safe_cb_answer(cb: CallbackQuery, *, retries: int = 3):
     last_err = None
     for attempt in range(retries):
         try:
-            await cb.answer()
+            await outbound.send(None, cb.answer)
             return
         except TelegramRetryAfter as e:
             last_err = e
-            wait_s = float(getattr(e, "retry_after", 2.0))
-            log.warning("cb.answer TelegramRetryAfter: wait %.2fs (attempt %s/%s)", wait_s, attempt + 1, retries)
-            await asyncio.sleep(wait_s)
+            log.warning("cb.answer TelegramRetryAfter: %ss (attempt %s/%s)", e.retry_after, attempt + 1, retries)
         except TelegramNetworkError as e:
             last_err = e
             await asyncio.sleep(1.0 + attempt * 0.5)
@@ -129,125 +237,237 @@ async def safe_cb_answer(cb: CallbackQuery, *, retries: int = 3):
             break
     log.error("safe_cb_answer failed: %r", last_err)
 
+
+async def send_bulk(chat_id: int, text: str, *, reply_markup=None, photo: str = "", retries: int = 3) -> str:
+    """
+    Сообщение не в ответ пользователю (напоминания, рассылки): приоритет BULK,
+    интерактивные ответы всегда идут раньше. photo — file_id (уже загруженная картинка, text — подпись).
+    Возвращает "delivered" | "blocked" (бот заблокирован / чата нет) | "failed".
+    """
+    def call():
+        if photo:
+            return bot.send_photo(chat_id, photo, caption=text, reply_markup=reply_markup)
+        return bot.send_message(chat_id, text, reply_markup=reply_markup)
+
+    for attempt in range(retries):
+        try:
+            await outbound.send(chat_id, call, priority=BULK)
+            return "delivered"
+        except TelegramForbiddenError:
+            return "blocked"
+        except TelegramRetryAfter:
+            # планировщик уже поставил на паузу всю полосу BULK — повтор встанет в очередь после неё
+            continue
+        except TelegramNetworkError:
+            await asyncio.sleep(1.0 + attempt * 0.5)
+        except TelegramBadRequest as e:
+            if "chat not found" in str(e):
+                return "blocked"
+            log.warning("send_bulk rejected chat_id=%s: %s", chat_id, e)
+            return "failed"
+    return "failed"
+
+
+def _not_modified(e: TelegramBadRequest) -> bool:
+    return "message is not modified" in str(e)
+
+
+async def safe_edit_text(message: Message, text: str, *, reply_markup=None, parse_mode=UNSET_PARSE_MODE) -> bool:
+    """
+    Переписать текст сообщения бота на месте (1 вызов вместо delete + send).
+    False — отредактировать нельзя (фото вместо текста, сообщение удалено и т.п.), вызывающий шлёт новое.
+    """
+    try:
+        await outbound.send(
+            message.chat.id,
+            lambda: message.edit_text(text, reply_markup=reply_markup, parse_mode=parse_mode),
+        )
+        return True
+    except TelegramBadRequest as e:
+        if _not_modified(e):
+            return True
+        log.info("edit_text fallback: %s", e)
+    except (TelegramRetryAfter, TelegramNetworkError) as e:
+        log.warning("edit_text failed: %r", e)
+    return False
+
 # =========================
 # NOTION (READ ONLY)
 # =========================
 
-NOTION_API_BASE = "https://api.notion.com/v1"
-NOTION_VERSION = "2022-06-28"
+notion = NotionClient(
+    NOTION_TOKEN,
+    NOTION_DATABASE_ID,
+    base_url=NOTION_API_BASE,
+    max_connections=NOTION_MAX_CONNECTIONS,
+    max_keepalive_connections=NOTION_MAX_KEEPALIVE,
+    keepalive_expiry=NOTION_KEEPALIVE_EXPIRY,
+    hedge_quantile=NOTION_HEDGE_QUANTILE or None,
+    hedge_budget=NOTION_HEDGE_BUDGET,
+    limiter=AdaptiveRateLimiter(rate=NOTION_RATE, burst=NOTION_BURST, max_queue=NOTION_MAX_QUEUE),
+    breaker=CircuitBreaker(
+        name="notion",
+        failure_rate=NOTION_BREAKER_FAILURE_RATE,
+        slow_call_s=NOTION_BREAKER_SLOW_CALL,
+        open_seconds=NOTION_BREAKER_OPEN_SECONDS,
+    ),
+)
+
 
+async def notion_query_database(
+    filter_obj: dict,
+    page_size: int = 10,
+    max_attempts: int = 4,
+    *,
+    priority: int = PRIORITY_INTERACTIVE,
+    max_wait: float | None = None,
+    deadline: float | None = None,
+    filter_properties: tuple[str, ...] | None = None,
+    start_cursor: str | None = None,
+) -> dict:
+    return await notion.query_database(
+        filter_obj,
+        page_size=page_size,
+        max_attempts=max_attempts,
+        priority=priority,
+        max_wait=max_wait,
+        deadline=deadline,
+        filter_properties=filter_properties,
+        start_cursor=start_cursor,
+    )
+
+
+cabinet_cache = TTLCache(
+    maxsize=CABINET_CACHE_SIZE,
+    fresh_ttl=CABINET_CACHE_TTL,
+    stale_ttl=CABINET_CACHE_STALE,
+    name="cabinet_cache",
+)
 
-async def notion_query_database(filter_obj: dict, page_size: int = 10, max_attempts: int = 4) -> dict:
+
+subscription_index = SubscriptionIndex(SUBSCRIPTION_INDEX_PATH)
+order_ledger = OrderLedger(ORDER_LEDGER_PATH, ORDER_TOKEN_SECRET.encode())
+
+
+async def _fetch_latest_requests(tg_ids: list[int], deadline: float | None = None) -> dict[int, CabinetRecord]:
     """
-    Query Notion DB с ретраями + backoff.
-    Ретраим:
-      - timeout / transport errors
-      - 429 (rate limit)
-      - 5xx
+    Последние заявки сразу для нескольких пользователей одним запросом (or по tg_id).
+    Сортировка created_time desc -> первая встреченная страница пользователя и есть последняя.
     """
-    url = f"{NOTION_API_BASE}/databases/{NOTION_DATABASE_ID}/query"
-    headers = {
-        "Authorization": f"Bearer {NOTION_TOKEN}",
-        "Notion-Version": NOTION_VERSION,
-        "Content-Type": "application/json",
-    }
-    payload = {
-        "filter": filter_obj,
-        "page_size": page_size,
-        "sorts": [{"timestamp": "created_time", "direction": "descending"}],
-    }
+    wanted = {str(t): t for t in tg_ids}
+    conditions = [{"property": "tg_id", "rich_text": {"equals": tg_id_str}} for tg_id_str in wanted]
+    if len(conditions) == 1:
+        filter_obj, page_size = conditions[0], 1
+    else:
+        filter_obj, page_size = {"or": conditions}, 100
+
+    found: dict[str, CabinetRecord] = {}
+    start_cursor = None
+    while True:
+        data = await notion_query_database(
+            filter_obj,
+            page_size=page_size,
+            max_wait=NOTION_INTERACTIVE_MAX_WAIT,
+            deadline=deadline,
+            filter_properties=SYNC_PROPERTIES,
+            start_cursor=start_cursor,
+        )
+        for page in data.get("results", []):
+            record = CabinetRecord.from_page(page)
+            if record.tg_id in wanted and record.tg_id not in found:
+                found[record.tg_id] = record
+        if len(found) == len(wanted) or not data.get("has_more") or not data.get("next_cursor"):
+            break
+        start_cursor = data["next_cursor"]
 
-    base_delay = 0.7
-    timeout = httpx.Timeout(30.0, connect=10.0)
+    subscription_index.upsert(list(found.values()))
+    return {wanted[k]: v for k, v in found.items()}
 
-    last_err = None
-    for attempt in range(1, max_attempts + 1):
-        t0 = time.perf_counter()
-        try:
-            async with httpx.AsyncClient(timeout=timeout) as client:
-                r = await client.post(url, headers=headers, json=payload)
-
-            dt_ms = int((time.perf_counter() - t0) * 1000)
-
-            if r.status_code == 429 or 500 <= r.status_code <= 599:
-                retry_after = r.headers.get("Retry-After")
-                if retry_after:
-                    sleep_s = float(retry_after)
-                else:
-                    sleep_s = base_delay * (2 ** (attempt - 1))
-                log.warning(
-                    "Notion query retryable status=%s (%sms) attempt=%s/%s sleep=%.2fs",
-                    r.status_code, dt_ms, attempt, max_attempts, sleep_s
-                )
-                await asyncio.sleep(sleep_s)
-                continue
-
-            r.raise_for_status()
-
-            log.info("Notion query OK (%sms) attempt=%s/%s", dt_ms, attempt, max_attempts)
-            return r.json()
-
-        except (httpx.TimeoutException, httpx.TransportError) as e:
-            last_err = e
-            sleep_s = base_delay * (2 ** (attempt - 1))
-            log.warning("Notion query network/timeout: %r attempt=%s/%s sleep=%.2fs", e, attempt, max_attempts, sleep_s)
-            await asyncio.sleep(sleep_s)
-        except httpx.HTTPStatusError as e:
-            last_err = e
-            log.error("Notion query HTTPStatusError: %s", str(e))
-            raise
-        except Exception as e:
-            last_err = e
-            log.error("Notion query unknown error: %r", e)
-            raise
 
-    log.error("Notion query failed after %s attempts: %r", max_attempts, last_err)
-    raise last_err
-
-
-def _rt_plain(props: dict, prop_name: str) -> str:
-    p = (props or {}).get(prop_name)
-    if not p:
-        return ""
-    if p.get("type") != "rich_text":
-        return ""
-    arr = p.get("rich_text") or []
-    if not arr:
-        return ""
-    return arr[0].get("plain_text", "") or ""
-
-
-def _status_name(props: dict, prop_name: str = "status") -> str:
-    p = (props or {}).get(prop_name)
-    if not p:
-        return ""
-    t = p.get("type")
-    if t == "status":
-        s = p.get("status") or {}
-        return (s.get("name") or "").strip().lower()
-    if t == "rich_text":
-        return (_rt_plain(props, prop_name) or "").strip().lower()
-    if t == "select":
-        s = p.get("select") or {}
-        return (s.get("name") or "").strip().lower()
-    return ""
-
-
-def _parse_expires(expires_at_str: str) -> date | None:
-    if not expires_at_str:
+# Кабинеты, открытые почти одновременно (например, после рассылки), грузятся одним запросом
+cabinet_loader = BatchLoader(
+    _fetch_latest_requests,
+    window=CABINET_BATCH_WINDOW_MS / 1000,
+    max_batch=CABINET_BATCH_MAX,
+)
+
+
+async def get_latest_request_for_user(
+    tg_id: int,
+    *,
+    force: bool = False,
+    deadline: float | None = None,
+) -> CabinetRecord | None:
+    """
+    Последняя заявка пользователя (status/discord/email/expires_at).
+    Свежий ответ Notion из кэша, затем локальный индекс (если его синхронизируют),
+    в Notion — только если пользователя нигде нет или нажали «Обновить».
+    """
+    if not force and not _cache_fresh(tg_id):
+        record = _indexed_request(tg_id)
+        if record:
+            return record
+    return await cabinet_cache.get_or_load(tg_id, lambda: cabinet_loader.load(tg_id, deadline), force=force)
+
+
+def last_known_request_for_user(tg_id: int) -> tuple[bool, CabinetRecord | None]:
+    """(known, record) из кэша/локального индекса, без Notion — для деградированного режима."""
+    entry = cabinet_cache.peek(tg_id)
+    # «заявок нет» из кэша уступает индексу, если успело устареть: заявку могли подать после
+    if entry is not None and (entry[1] is not None or _cache_fresh(tg_id)):
+        return True, entry[1]
+    record = _indexed_request(tg_id)
+    if record:
+        return True, record
+    if entry is not None:
+        return True, entry[1]
+    return False, None
+
+
+def _cache_fresh(tg_id: int) -> bool:
+    entry = cabinet_cache.peek(tg_id)
+    return entry is not None and time.time() - entry[0] < cabinet_cache.fresh_ttl
+
+
+def _indexed_request(tg_id: int) -> CabinetRecord | None:
+    # без фоновой синхронизации индекс пополняется только кабинетом и не видит правок в Notion
+    if SUBSCRIPTION_SYNC_INTERVAL <= 0:
         return None
+    return subscription_index.get(tg_id)
+
+
+def _notion_time(value: str) -> float:
     try:
-        return datetime.strptime(expires_at_str.strip(), "%Y-%m-%d").date()
-    except Exception:
+        return datetime.fromisoformat(value.replace("Z", "+00:00")).timestamp()
+    except (ValueError, AttributeError):
+        return 0.0
+
+
+def order_awaits_request(order: Order, record: CabinetRecord | None) -> bool:
+    """Ссылка на оплату выдана позже последней известной заявки — заявки по заказу в Notion ещё нет."""
+    return record is None or not record.created_time or _notion_time(record.created_time) < order.created_at
+
+
+def pending_order_for_user(tg_id: int, record: CabinetRecord | None = None) -> Order | None:
+    """
+    Заказ, оплата по которому на проверке: последняя заявка в Notion ещё не одобрена
+    и не отклонена и подана после выдачи ссылки — сумма и период берутся из журнала.
+    Просто нажатый период (оплаты могло и не быть) или уже обработанная заявка — None.
+    Только локальные данные.
+    """
+    if record is None or not record.created_time or record.status in ("approved", "rejected"):
         return None
+    return order_ledger.latest_for(
+        tg_id,
+        since=time.time() - ORDER_PENDING_DAYS * 86400,
+        before=_notion_time(record.created_time),
+    )
 
 
-async def get_latest_request_for_user(tg_id: int) -> dict | None:
-    tg_id_str = str(tg_id)
-    filter_obj = {"property": "tg_id", "rich_text": {"equals": tg_id_str}}
-    data = await notion_query_database(filter_obj, page_size=10)
-    results = data.get("results", [])
-    return results[0] if results else None
+def format_order(order: Order) -> str:
+    currency = "грн" if order.currency == "UAH" else order.currency
+    parts = [order.product, order.period_text, f"{order.amount} {currency}"]
+    return ", ".join(p for p in parts if p)
 
 # =========================
 # HELPERS
@@ -265,15 +485,83 @@ def build_tally_url(params: dict) -> str:
     return f"{TALLY_FORM_URL}?{query}"
 
 
-async def send_photo_safe(message: Message, path: str, caption: str | None = None, reply_markup=None):
+async def send_photo_safe(
+    message: Message,
+    path: str,
+    caption: str | None = None,
+    reply_markup=None,
+    parse_mode=UNSET_PARSE_MODE,
+):
+    # pictures/*.png -> уменьшенный JPEG/WebP, если он подготовлен на старте
+    path = image_variants.resolve(path)
+    file_id = media.get(path)
+    if file_id:
+        try:
+            await outbound.send(
+                message.chat.id,
+                lambda: message.answer_photo(photo=file_id, caption=caption, reply_markup=reply_markup, parse_mode=parse_mode),
+            )
+            return
+        except TelegramBadRequest as e:
+            # file_id протух (или другой бот) — загрузим файл заново
+            log.warning("Cached file_id rejected for %s: %s", path, e)
+            media.forget(path)
+        except Exception:
+            await safe_answer(message, caption or " ", reply_markup=reply_markup, parse_mode=parse_mode)
+            return
+
     try:
         photo = FSInputFile(path)
-        await message.answer_photo(photo=photo, caption=caption, reply_markup=reply_markup)
+        sent = await outbound.send(
+            message.chat.id,
+            lambda: message.answer_photo(photo=photo, caption=caption, reply_markup=reply_markup, parse_mode=parse_mode),
+        )
+        if sent and sent.photo:
+            media.put(path, sent.photo[-1].file_id)
     except TelegramNetworkError:
-        await safe_answer(message, caption or " ", reply_markup=reply_markup)
+        await safe_answer(message, caption or " ", reply_markup=reply_markup, parse_mode=parse_mode)
     except Exception:
         # если файла нет/ошибка чтения — просто отправим текст
-        await safe_answer(message, caption or " ", reply_markup=reply_markup)
+        await safe_answer(message, caption or " ", reply_markup=reply_markup, parse_mode=parse_mode)
+
+
+async def edit_photo_safe(
+    message: Message,
+    path: str,
+    caption: str | None = None,
+    reply_markup=None,
+    parse_mode=UNSET_PARSE_MODE,
+) -> bool:
+    """
+    Заменить картинку, подпись и инлайн-клавиатуру у фото-сообщения бота одним editMessageMedia.
+    False — редактирование не удалось, вызывающий отправляет экран заново.
+    """
+    path = image_variants.resolve(path)
+    file_id = media.get(path)
+    photo = InputMediaPhoto(media=file_id or FSInputFile(path), caption=caption, parse_mode=parse_mode)
+    try:
+        edited = await outbound.send(
+            message.chat.id,
+            lambda: message.edit_media(photo, reply_markup=reply_markup),
+        )
+    except TelegramBadRequest as e:
+        if _not_modified(e):
+            return True
+        if file_id:
+            # возможно, протух file_id — send_photo_safe перезальёт файл
+            media.forget(path)
+        log.info("edit_media fallback for %s: %s", path, e)
+        return False
+    except Exception as e:
+        log.warning("edit_media failed for %s: %r", path, e)
+        return False
+    if not file_id and isinstance(edited, Message) and edited.photo:
+        media.put(path, edited.photo[-1].file_id)
+    return True
+
+
+def is_admin(user) -> bool:
+    return bool(user and user.username) and user.username.lower() == ADMIN_USERNAME.lstrip("@").lower()
 
 
 def tally_confirm_kb(tally_url: str) -> InlineKeyboardMarkup:
@@ -308,46 +596,71 @@ async def send_payment_flow_final(
     period_text: str = "",
     expires_at: str = "",
 ):
-    order_id = str(uuid.uuid4())
+    order = order_ledger.create(
+        tg_id,
+        tg_username=tg_username,
+        product=product,
+        period_key=period_key,
+        period_text=period_text,
+        pay_method=pay_method,
+        currency=currency,
+        amount=amount,
+        expires_at=expires_at,
+    )
+    token = order_ledger.token(order.order_id)
 
+    # сумма, период и способ оплаты идут в Notion всегда: по ним сверяются оплаты,
+    # даже если локальный журнал (data/) потерян
     params = {
         "t": str(tg_id),
-        "u": tg_username or "",
-        "product": product,
-        "period": period_text,
+        "ex": expires_at,
+        "o": token,
         "pk": period_key,
         "pm": pay_method,
-        "o": order_id,
-        "ex": expires_at,
+        "as": str(amount) if currency == "USDT" else "",
+        "au": "" if currency == "USDT" else str(amount),
     }
-
-    if currency == "USDT":
-        params["as"] = str(amount)
-        params["au"] = ""
-    else:
-        params["as"] = ""
-        params["au"] = str(amount)
+    if not TALLY_COMPACT_URL:
+        # описательные поля для форм, которые их ещё маппят; в компактной ссылке — только в журнале
+        params.update({"u": tg_username or "", "product": product, "period": period_text})
 
     tally_url = build_tally_url(params)
     kb = tally_confirm_kb(tally_url)
 
+    # одно сообщение: сумма, реквизиты и кнопка подтверждения
     if currency == "USDT":
-        await safe_answer(message, f"Для оплаты Вам необходимо перевести {amount} USDT:")
-        await safe_answer(message, f"<code>{USDT_TRC20_ADDRESS}</code> (USDT. Сеть TRC20)", reply_markup=kb)
+        text = (
+            f"Для оплаты Вам необходимо перевести {amount} USDT:\n"
+            f"<code>{USDT_TRC20_ADDRESS}</code> (USDT. Сеть TRC20)"
+        )
     else:
-        await safe_answer(message, f"Для оплаты Вам необходимо перевести {amount} грн на указанные реквизиты:")
-        await safe_answer(message, "Скоро добавим карту.", reply_markup=kb)
+        text = (
+            f"Для оплаты Вам необходимо перевести {amount} грн на указанные реквизиты:\n"
+            "Скоро добавим карту."
+        )
+    await safe_answer(message, text, reply_markup=kb)
 
 # =========================
 # KEYBOARDS
 # =========================
 
+# Тексты кнопок reply-клавиатуры (они же ключи MENU_ROUTES)
+BTN_INFO = "ℹ️ Информация"
+BTN_HELP = "❓ Помощь"
+BTN_PRODUCTS = "📦 Мои продукты"
+BTN_RESOURCES = "🌐 Мои ресурсы"
+BTN_CABINET = "👤 Личный кабинет"
+BTN_MAIN_MENU = "В главное меню"
+BTN_COMMUNITY = "Hadiukov Community"
+BTN_MENTORING = "Hadiukov Mentoring"
+
+
 def main_menu_kb() -> ReplyKeyboardMarkup:
     return ReplyKeyboardMarkup(
         keyboard=[
-            [KeyboardButton(text="ℹ️ Информация"), KeyboardButton(text="❓ Помощь")],
-            [KeyboardButton(text="📦 Мои продукты"), KeyboardButton(text="🌐 Мои ресурсы")],
-            [KeyboardButton(text="👤 Личный кабинет")],
+            [KeyboardButton(text=BTN_INFO), KeyboardButton(text=BTN_HELP)],
+            [KeyboardButton(text=BTN_PRODUCTS), KeyboardButton(text=BTN_RESOURCES)],
+            [KeyboardButton(text=BTN_CABINET)],
         ],
         resize_keyboard=True,
         is_persistent=True,
@@ -356,7 +669,7 @@ def main_menu_kb() -> ReplyKeyboardMarkup:
 
 def back_only_kb() -> ReplyKeyboardMarkup:
     return ReplyKeyboardMarkup(
-        keyboard=[[KeyboardButton(text="В главное меню")]],
+        keyboard=[[KeyboardButton(text=BTN_MAIN_MENU)]],
         resize_keyboard=True,
         is_persistent=True,
     )
@@ -365,9 +678,9 @@ def back_only_kb() -> ReplyKeyboardMarkup:
 def products_menu_kb() -> ReplyKeyboardMarkup:
     return ReplyKeyboardMarkup(
         keyboard=[
-            [KeyboardButton(text="Hadiukov Community")],
-            [KeyboardButton(text="Hadiukov Mentoring")],
-            [KeyboardButton(text="В главное меню")],
+            [KeyboardButton(text=BTN_COMMUNITY)],
+            [KeyboardButton(text=BTN_MENTORING)],
+            [KeyboardButton(text=BTN_MAIN_MENU)],
         ],
         resize_keyboard=True,
         is_persistent=True,
@@ -399,22 +712,40 @@ def kb_payment_methods(product_key: str) -> InlineKeyboardMarkup:
     ])
 
 
-def kb_community_crypto_periods() -> InlineKeyboardMarkup:
-    return InlineKeyboardMarkup(inline_keyboard=[
-        [InlineKeyboardButton(text="1 месяц – 50 USDT", callback_data="sub:community:crypto:1m")],
-        [InlineKeyboardButton(text="3 месяца – 120 USDT", callback_data="sub:community:crypto:3m")],
-        [InlineKeyboardButton(text="Закрыть", callback_data="close")],
-    ])
+def kb_community_periods(method: str) -> InlineKeyboardMarkup:
+    currency, prices = COMMUNITY_PRICES[method]
+    rows = [
+        [InlineKeyboardButton(
+            text=f"{PERIOD_TEXT_RU[key]} – {amount} {currency}",
+            callback_data=f"sub:community:{method}:{key}",
+        )]
+        for key, amount in prices.items()
+    ]
+    rows.append([InlineKeyboardButton(text="Закрыть", callback_data="close")])
+    return InlineKeyboardMarkup(inline_keyboard=rows)
 
 
-def kb_community_fiat_periods() -> InlineKeyboardMarkup:
+def renew_kb() -> InlineKeyboardMarkup:
     return InlineKeyboardMarkup(inline_keyboard=[
-        [InlineKeyboardButton(text="1 месяц – 2200 UAH", callback_data="sub:community:fiat:1m")],
-        [InlineKeyboardButton(text="3 месяца – 5200 UAH", callback_data="sub:community:fiat:3m")],
-        [InlineKeyboardButton(text="Закрыть", callback_data="close")],
+        [InlineKeyboardButton(text="Продлить подписку", callback_data="renew:community")]
     ])
 
 
+def broadcast_kb(b: Broadcast) -> InlineKeyboardMarkup:
+    if b.status == "draft":
+        row = [
+            InlineKeyboardButton(text="Запустить", callback_data=f"bc:start:{b.broadcast_id}"),
+            InlineKeyboardButton(text="Отмена", callback_data=f"bc:cancel:{b.broadcast_id}"),
+        ]
+    elif b.status == "running":
+        row = [InlineKeyboardButton(text="Остановить", callback_data=f"bc:stop:{b.broadcast_id}")]
+    elif b.status == "stopped":
+        row = [InlineKeyboardButton(text="Продолжить", callback_data=f"bc:start:{b.broadcast_id}")]
+    else:
+        row = []
+    return InlineKeyboardMarkup(inline_keyboard=[row] if row else [])
+
+
 def cabinet_refresh_kb() -> InlineKeyboardMarkup:
     return InlineKeyboardMarkup(inline_keyboard=[
         [InlineKeyboardButton(text="Обновить", callback_data="cabinet:refresh")]
@@ -434,11 +765,54 @@ WELCOME_TEXT = (
 
 CABINET_RETRY_TEXT = "⏳ Подожди 10–20 секунд и нажми «Личный кабинет» ещё раз."
 
+EXPIRY_SOON_TEXT = (
+    "Ваша подписка Hadiukov Community заканчивается <b>{date}</b> (осталось дней: {days}).\n"
+    "Продлите её заранее, чтобы не потерять доступ."
+)
+EXPIRY_TODAY_TEXT = (
+    "Сегодня (<b>{date}</b>) заканчивается ваша подписка Hadiukov Community.\n"
+    "Продлите её, чтобы сохранить доступ."
+)
+CABINET_STALE_NOTE = "<i>⚠️ Данные могут быть неактуальны: сервис временно недоступен.</i>"
+
 HELP_TEXT = (
     "Если что-то непонятно при оформлении подписки или оплате – "
     "просто напишите администратору, он поможет разобраться и подскажет, что делать дальше."
 )
 
+INFO_TEXT = """Hadiukov Community – это среда, где результат строится на дисциплине, ясной системе и умении подстраиваться под рынок.
+
+Мы не ищем «секретные кнопки» и не торгуем эмоциями. Здесь фокус на том, что реально повышает качество трейдинга:
+ • понятная логика работы с движением цены и контекстом;
+ • стабильный процесс: планы, правила, исполнение;
+ • регулярный разбор сделок и контроль ошибок;
+ • прокачка мышления и устойчивости под нагрузкой.
+
+Этот подход помогает выстроить профессиональную базу: видеть, что именно приносит деньги, что тянет вниз, и как шаг за шагом усиливать свой перформанс без хаоса и угадываний.
+
+Если тебе близка торговля как работа, а не как азарт – добро пожаловать в Hadiukov Community."""
+
+COMMUNITY_TEXT = """Я ежедневно выполняю свою рутину – торговые планы, аналитика, статистика, сделки.
+В Discord я просто делюсь этим процессом в реальном времени, без задержек и в спокойной обстановке.
+
+Это не обучение и не “инфо-помойка”. Нет десятков веток, методичек и бесконечных уроков. Сервер собран только под практику. Я показываю, как сам работаю.
+
+Внутри – рутинная работа и поддержка среды:
+• анализ графиков
+• бэктесты
+• итоги недели / месяца / квартала
+• стримы с ответами на вопросы
+• разбор рыночных ситуаций
+• развитие сильного майнд-сета
+
+Суть сервера – выстроить рабочий алгоритм и быть в адекватной среде, где все нацелены на результат и процесс."""
+
+RESOURCES_CAPTION = "Подписывайтесь ⬇️⬇️⬇️"
+
+BACK_HINT_TEXT = "Чтобы вернуться, нажмите «В главное меню»."
+
+UNKNOWN_TEXT = "Выберите нужный раздел в меню снизу 👇"
+
 MENTORING_TEXT = """Я открываю формат личного сопровождения 1 на 1.
 
 Это работа для тех, кто готов серьезно вкладываться в процесс и наводить порядок в торговле — без хаоса и угадываний.
@@ -452,34 +826,101 @@ MENTORING_TEXT = """Я открываю формат личного сопров
 Если хочешь понять детали формата, условия и подходит ли тебе — оставь заявку.
 """
 
+# =========================
+# SCREENS (собираются один раз при старте)
+# =========================
+
+SCREENS = ScreenCatalog([
+    Screen("welcome", WELCOME_TEXT, keyboard=main_menu_kb()),
+    Screen("menu", "Главное меню 👇", keyboard=main_menu_kb()),
+    Screen("main_menu", "Главное меню", keyboard=main_menu_kb()),
+    Screen("unknown", UNKNOWN_TEXT, keyboard=main_menu_kb()),
+    Screen("back_hint", BACK_HINT_TEXT, keyboard=back_only_kb()),
+    Screen("info", INFO_TEXT, keyboard=back_only_kb()),
+    Screen("help", HELP_TEXT, image=SUPPORT_IMAGE_PATH, keyboard=admin_contact_kb()),
+    Screen("resources", RESOURCES_CAPTION, image=RESOURCES_IMAGE_PATH, keyboard=resources_links_kb()),
+    Screen("products", image=PRODUCTS_IMAGE_PATH),
+    Screen("products_menu", "Выберите:", keyboard=products_menu_kb()),
+    Screen("community", COMMUNITY_TEXT, image=COMMUNITY_IMAGE_PATH, keyboard=kb_community_buy()),
+    Screen("mentoring", MENTORING_TEXT, image=MENTORING_IMAGE_PATH, keyboard=mentoring_apply_kb()),
+    Screen("community_payment", "Выберите способ оплаты", image=PAYMENT_IMAGE_PATH, keyboard=kb_payment_methods("community")),
+    Screen("community_crypto_periods", "Выберите срок подписки", image=SUBSCRIPTION_IMAGE_PATH, keyboard=kb_community_periods("crypto")),
+    Screen("community_fiat_periods", "Выберите срок подписки", image=SUBSCRIPTION_IMAGE_PATH, keyboard=kb_community_periods("fiat")),
+])
+
+
+async def send_screen(message: Message, key: str):
+    screen = SCREENS[key]
+    if screen.image:
+        await send_photo_safe(
+            message,
+            screen.image,
+            caption=screen.text,
+            reply_markup=screen.keyboard,
+            parse_mode=screen.parse_mode,
+        )
+    else:
+        await safe_answer(message, screen.text, reply_markup=screen.keyboard, parse_mode=screen.parse_mode)
+
+
+async def edit_screen(message: Message, key: str):
+    """
+    Показать экран на месте сообщения бота, под которым нажали инлайн-кнопку.
+    Фото -> фото и текст -> текст правятся одним вызовом; reply-клавиатуру к правке
+    не прикрепить, а тип сообщения правкой не сменить — тогда удаляем и шлём заново.
+    """
+    screen = SCREENS[key]
+    if not isinstance(screen.keyboard, ReplyKeyboardMarkup):
+        if screen.image and message.photo:
+            if await edit_photo_safe(message, screen.image, screen.text, screen.keyboard, screen.parse_mode):
+                return
+        elif not screen.image and message.text:
+            if await safe_edit_text(message, screen.text, reply_markup=screen.keyboard, parse_mode=screen.parse_mode):
+                return
+    try:
+        await outbound.send(message.chat.id, message.delete)
+    except Exception:
+        pass
+    await send_screen(message, key)
+
 # =========================
 # CABINET TEXT BUILDER
 # =========================
 
-async def build_cabinet_text(user_id: int) -> str:
+async def build_cabinet_text(user_id: int, *, force_refresh: bool = False, deadline: float | None = None) -> str:
     discord = "Не указан"
     email = "Не указан"
 
-    page = await get_latest_request_for_user(user_id)
-    if not page:
+    stale_note = ""
+    try:
+        record = await get_latest_request_for_user(user_id, force=force_refresh, deadline=deadline)
+    except CircuitOpenError:
+        # Notion лежит: показываем последнее известное состояние, не дёргая его
+        known, record = last_known_request_for_user(user_id)
+        if not known:
+            raise
+        stale_note = f"\n\n{CABINET_STALE_NOTE}"
+
+    order = pending_order_for_user(user_id, record)
+    order_note = f"\n\nОжидаем подтверждение оплаты: {format_order(order)}" if order else ""
+
+    if not record:
         return (
             f"Discord: {discord}\n"
             f"Email: {email}\n\n"
             "Нет активной подписки"
+            f"{order_note}"
+            f"{stale_note}"
         )
 
-    props = page.get("properties", {})
-    st = _status_name(props, "status")
+    st = record.status
 
-    d = _rt_plain(props, "discord")
-    e = _rt_plain(props, "email")
-    if d:
-        discord = d
-    if e:
-        email = e
+    if record.discord:
+        discord = record.discord
+    if record.email:
+        email = record.email
 
-    expires_raw = _rt_plain(props, "expires_at")
-    expires_dt = _parse_expires(expires_raw)
+    expires_dt = record.expires_at
 
     if st == "pending":
         status_line = "Заявка на проверке"
@@ -500,38 +941,36 @@ async def build_cabinet_text(user_id: int) -> str:
         f"Discord: {discord}\n"
         f"Email: {email}\n\n"
         f"{status_line}"
+        f"{order_note}"
+        f"{stale_note}"
     )
 
 
-async def send_cabinet(message: Message, user_id: int):
+async def send_cabinet(message: Message, user_id: int, *, force_refresh: bool = False, edit: bool = False):
+    """edit=True — обновить уже показанный кабинет на месте (кнопка «Обновить»)."""
+
+    async def reply(text: str, reply_markup=None):
+        if edit and await safe_edit_text(message, text, reply_markup=reply_markup):
+            return
+        await safe_answer(message, text, reply_markup=reply_markup)
+
     try:
         t0 = time.perf_counter()
-        log.info("Cabinet tapped. user_id=%s", user_id)
+        log.info("Cabinet tapped. user_id=%s", user_id, extra={"user_id": user_id})
 
-        text = await build_cabinet_text(user_id)
+        # общий бюджет времени на ответ кабинета: Notion-ретраи не выйдут за него
+        deadline = time.monotonic() + CABINET_DEADLINE
+        text = await build_cabinet_text(user_id, force_refresh=force_refresh, deadline=deadline)
 
         dt_ms = int((time.perf_counter() - t0) * 1000)
-        log.info("Cabinet build OK (%sms). user_id=%s", dt_ms, user_id)
+        log.info("Cabinet build OK (%sms). user_id=%s", dt_ms, user_id, extra={"user_id": user_id, "latency_ms": dt_ms})
 
-        await safe_answer(message, text, reply_markup=cabinet_refresh_kb())
-    except (httpx.TimeoutException, TelegramNetworkError):
-        await safe_answer(message, CABINET_RETRY_TEXT)
+        await reply(text, reply_markup=cabinet_refresh_kb())
+    except (httpx.TimeoutException, TelegramNetworkError, RateLimitExceeded, CircuitOpenError, TimeoutError):
+        await reply(CABINET_RETRY_TEXT)
     except Exception as e:
-        log.exception("Cabinet error user_id=%s", user_id)
-        await safe_answer(message, f"Ошибка кабинета: {e}")
-
-# =========================
-# SHARED SENDER: MENTORING
-# =========================
-
-async def send_mentoring_info(message: Message):
-    # картинка + текст + кнопка "Оставить заявку"
-    await send_photo_safe(
-        message,
-        MENTORING_IMAGE_PATH,
-        caption=MENTORING_TEXT,
-        reply_markup=mentoring_apply_kb(),
-    )
+        log.exception("Cabinet error user_id=%s", user_id, extra={"user_id": user_id})
+        await reply(f"Ошибка кабинета: {e}")
 
 # =========================
 # HANDLERS
@@ -539,137 +978,212 @@ async def send_mentoring_info(message: Message):
 
 @dp.message(CommandStart())
 async def start(message: Message):
-    await safe_answer(message, WELCOME_TEXT, reply_markup=main_menu_kb())
+    await send_screen(message, "welcome")
 
 
 @dp.message(Command("menu"))
 async def menu(message: Message):
-    await safe_answer(message, "Главное меню 👇", reply_markup=main_menu_kb())
+    await send_screen(message, "menu")
 
 
-@dp.message(lambda m: (m.text or "") == "В главное меню")
-async def back_to_main_menu(message: Message):
-    await safe_answer(message, "Главное меню", reply_markup=main_menu_kb())
+@dp.message(Command("stats"))
+async def stats(message: Message):
+    if not is_admin(message.from_user):
+        return
+    sections = {name: stats_fn() for name, stats_fn in STATS_SOURCES.items()}
+    text = "\n\n".join(
+        f"<b>{name}</b>\n" + "\n".join(f"{k}: {v}" for k, v in values.items())
+        for name, values in sections.items()
+    )
+    await safe_answer(message, text)
 
 
-@dp.message(lambda m: "Информация" in (m.text or ""))
-async def info_from_menu(message: Message):
+@dp.message(Command("order"))
+async def order_lookup(message: Message, command: CommandObject):
+    """/order <токен из Tally | tg_id> — заказ из локального журнала, без Notion."""
+    if not is_admin(message.from_user):
+        return
+    arg = (command.args or "").strip()
+    if "." in arg:
+        order = order_ledger.resolve(arg)
+    elif arg.isdigit():
+        order = order_ledger.latest_for(int(arg))
+    else:
+        await safe_answer(message, "Использование: /order &lt;токен заказа или tg_id&gt;")
+        return
+    if order is None:
+        await safe_answer(message, "Заказ не найден (или подпись токена не сходится)")
+        return
+    created = datetime.utcfromtimestamp(order.created_at).strftime("%Y-%m-%d %H:%M UTC")
+    pending = order_awaits_request(order, subscription_index.get(order.tg_id))
     await safe_answer(
         message,
-        """Hadiukov Community – это среда, где результат строится на дисциплине, ясной системе и умении подстраиваться под рынок.
+        f"<b>Заказ {order.order_id}</b>\n"
+        f"tg_id: {order.tg_id} (@{order.tg_username or '-'})\n"
+        f"{format_order(order)}\n"
+        f"Оплата: {order.pay_method}\n"
+        f"Действует до: {order.expires_at or '-'}\n"
+        f"Создан: {created}\n"
+        f"Ждёт заявку в Notion: {'да' if pending else 'нет'}",
+    )
 
-Мы не ищем «секретные кнопки» и не торгуем эмоциями. Здесь фокус на том, что реально повышает качество трейдинга:
- • понятная логика работы с движением цены и контекстом;
- • стабильный процесс: планы, правила, исполнение;
- • регулярный разбор сделок и контроль ошибок;
- • прокачка мышления и устойчивости под нагрузкой.
 
-Этот подход помогает выстроить профессиональную базу: видеть, что именно приносит деньги, что тянет вниз, и как шаг за шагом усиливать свой перформанс без хаоса и угадываний.
+def format_broadcast(b: Broadcast) -> str:
+    kind = "фото" if b.photo else "текст"
+    return (
+        f"<b>Рассылка #{b.broadcast_id}</b> ({kind}, аудитория: {b.audience}, статус: {b.status})\n"
+        f"Доставлено: {b.delivered}\n"
+        f"Бот заблокирован: {b.blocked}\n"
+        f"Ошибки: {b.failed}\n"
+        f"Скорость: {b.rate:.1f} msg/s"
+    )
 
-Если тебе близка торговля как работа, а не как азарт – добро пожаловать в Hadiukov Community.""",
-        reply_markup=back_only_kb(),
+
+@dp.message(Command("broadcast"))
+async def broadcast_create(message: Message, command: CommandObject):
+    """/broadcast [all|active|expired] ответом на сообщение — черновик рассылки с кнопкой запуска."""
+    if not is_admin(message.from_user):
+        return
+    audience = (command.args or "all").strip().lower()
+    src = message.reply_to_message
+    if audience not in AUDIENCES or src is None or not (src.text or src.photo):
+        await safe_answer(
+            message,
+            "Использование: ответьте на текст или фото командой /broadcast [all|active|expired]",
+        )
+        return
+    if src.photo and len(src.caption or "") > 1024:
+        await safe_answer(message, "Подпись к фото длиннее 1024 символов — Telegram её не примет")
+        return
+    # file_id фото из сообщения админа: картинка не перезаливается ни разу
+    b = broadcast_store.create(
+        src.html_text,
+        photo=src.photo[-1].file_id if src.photo else "",
+        audience=audience,
+        admin_chat_id=message.chat.id,
     )
+    recipients = subscription_index.count_audience(audience)
+    await safe_answer(message, f"{format_broadcast(b)}\nПолучателей: {recipients}", reply_markup=broadcast_kb(b))
+
+
+@dp.message(Command("broadcast_status"))
+async def broadcast_status(message: Message):
+    if not is_admin(message.from_user):
+        return
+    b = broadcaster.current() or broadcast_store.latest()
+    if b is None:
+        await safe_answer(message, "Рассылок ещё не было")
+        return
+    await safe_answer(message, format_broadcast(b), reply_markup=broadcast_kb(b))
+
+
+@dp.message(Command("report"))
+async def report_command(message: Message):
+    """/report — сводка по всей базе Notion (в фоне, ответ придёт отдельным сообщением)."""
+    if not is_admin(message.from_user):
+        return
+    await start_report(message, None)
+
+
+@dp.message(Command("export"))
+async def export_command(message: Message, command: CommandObject):
+    """/export [csv|jsonl] — сводка + файл со всеми заявками."""
+    if not is_admin(message.from_user):
+        return
+    fmt = (command.args or "csv").strip().lower()
+    if fmt not in EXPORT_FORMATS:
+        await safe_answer(message, "Использование: /export [csv|jsonl]")
+        return
+    await start_report(message, fmt)
+
+
+async def back_to_main_menu(message: Message):
+    await send_screen(message, "main_menu")
+
+
+async def info_from_menu(message: Message):
+    await send_screen(message, "info")
 
 
-@dp.message(lambda m: "Помощь" in (m.text or ""))
 async def help_from_menu(message: Message):
     # 1) Сообщение с кнопкой "Написать" (инлайн)
-    await send_photo_safe(
-        message,
-        SUPPORT_IMAGE_PATH,
-        caption=HELP_TEXT,
-        reply_markup=admin_contact_kb(),
-    )
+    await send_screen(message, "help")
     # 2) Меняем нижнюю клавиатуру на одну кнопку "В главное меню"
-    await safe_answer(message, "Чтобы вернуться, нажмите «В главное меню».", reply_markup=back_only_kb())
+    await send_screen(message, "back_hint")
 
 
-@dp.message(lambda m: "Мои ресурсы" in (m.text or ""))
 async def resources_from_menu(message: Message):
-    await send_photo_safe(
-        message,
-        RESOURCES_IMAGE_PATH,
-        caption="Подписывайтесь ⬇️⬇️⬇️",
-        reply_markup=resources_links_kb(),
-    )
-    await safe_answer(message, "Чтобы вернуться, нажмите «В главное меню».", reply_markup=back_only_kb())
+    await send_screen(message, "resources")
+    await send_screen(message, "back_hint")
 
 
-@dp.message(lambda m: "Мои продукты" in (m.text or ""))
 async def products_entry(message: Message):
-    await send_photo_safe(message, PRODUCTS_IMAGE_PATH, caption=None)
-    await safe_answer(message, "Выберите:", reply_markup=products_menu_kb())
+    await send_screen(message, "products")
+    await send_screen(message, "products_menu")
 
 
-@dp.message(F.text == "Hadiukov Community")
 async def community_info(message: Message):
-    await send_photo_safe(
-        message,
-        COMMUNITY_IMAGE_PATH,
-        caption="""Я ежедневно выполняю свою рутину – торговые планы, аналитика, статистика, сделки.
-В Discord я просто делюсь этим процессом в реальном времени, без задержек и в спокойной обстановке.
-
-Это не обучение и не “инфо-помойка”. Нет десятков веток, методичек и бесконечных уроков. Сервер собран только под практику. Я показываю, как сам работаю.
-
-Внутри – рутинная работа и поддержка среды:
-• анализ графиков
-• бэктесты
-• итоги недели / месяца / квартала
-• стримы с ответами на вопросы
-• разбор рыночных ситуаций
-• развитие сильного майнд-сета
-
-Суть сервера – выстроить рабочий алгоритм и быть в адекватной среде, где все нацелены на результат и процесс.""",
-        reply_markup=kb_community_buy(),
-    )
+    await send_screen(message, "community")
 
 
-@dp.message(F.text == "Hadiukov Mentoring")
 async def mentoring_info(message: Message):
-    await send_mentoring_info(message)
+    await send_screen(message, "mentoring")
 
 
-@dp.message(lambda m: "Личный кабинет" in (m.text or ""))
 async def cabinet_from_menu(message: Message):
     await send_cabinet(message, message.from_user.id)
 
 
+async def unknown_text(message: Message):
+    await send_screen(message, "unknown")
+
+
+# Кнопка меню -> хендлер. Один dict-lookup вместо цепочки фильтров.
+MENU_ROUTES = {
+    BTN_MAIN_MENU: back_to_main_menu,
+    BTN_INFO: info_from_menu,
+    BTN_HELP: help_from_menu,
+    BTN_RESOURCES: resources_from_menu,
+    BTN_PRODUCTS: products_entry,
+    BTN_COMMUNITY: community_info,
+    BTN_MENTORING: mentoring_info,
+    BTN_CABINET: cabinet_from_menu,
+}
+
+menu_router = TextRouter(MENU_ROUTES, fallback=unknown_text)
+
+
+# регистрируется последним среди message-хендлеров: команды матчатся раньше
+@dp.message(F.text)
+async def menu_text(message: Message):
+    await menu_router.dispatch(message)
+
+
 @dp.callback_query(F.data == "cabinet:refresh")
 async def cabinet_refresh(cb: CallbackQuery):
-    try:
-        await cb.message.delete()
-    except Exception:
-        pass
-
-    await send_cabinet(cb.message, cb.from_user.id)
+    await send_cabinet(cb.message, cb.from_user.id, force_refresh=True, edit=True)
     await safe_cb_answer(cb)
 
 
 # --- Inline: Buy / Acquire ---
 @dp.callback_query(F.data == "buy:community")
 async def buy_community(cb: CallbackQuery):
-    try:
-        await cb.message.delete()
-    except Exception:
-        pass
+    await edit_screen(cb.message, "community_payment")
+    await safe_cb_answer(cb)
 
-    await send_photo_safe(
-        cb.message,
-        PAYMENT_IMAGE_PATH,
-        caption="Выберите способ оплаты",
-        reply_markup=kb_payment_methods("community"),
-    )
+
+# Кнопка из напоминания об окончании: экран покупки новым сообщением,
+# само напоминание с датой окончания остаётся в чате
+@dp.callback_query(F.data == "renew:community")
+async def renew_community(cb: CallbackQuery):
+    await send_screen(cb.message, "community_payment")
     await safe_cb_answer(cb)
 
 
 # Legacy-страховка: если где-то остались старые кнопки buy:mentoring
 @dp.callback_query(F.data == "buy:mentoring")
 async def buy_mentoring_legacy(cb: CallbackQuery):
-    try:
-        await cb.message.delete()
-    except Exception:
-        pass
-    await send_mentoring_info(cb.message)
+    await edit_screen(cb.message, "mentoring")
     await safe_cb_answer(cb)
 
 
@@ -679,14 +1193,12 @@ async def payment_method_choice(cb: CallbackQuery):
 
     # mentoring больше НЕ проходит через оплату/сроки
     if product_key == "mentoring":
-        await send_mentoring_info(cb.message)
+        await edit_screen(cb.message, "mentoring")
         await safe_cb_answer(cb)
         return
 
-    if product_key == "community" and method == "crypto":
-        await send_photo_safe(cb.message, SUBSCRIPTION_IMAGE_PATH, "Выберите срок подписки", kb_community_crypto_periods())
-    elif product_key == "community" and method == "fiat":
-        await send_photo_safe(cb.message, SUBSCRIPTION_IMAGE_PATH, "Выберите срок подписки", kb_community_fiat_periods())
+    if product_key == "community" and method in COMMUNITY_PRICES:
+        await edit_screen(cb.message, f"community_{method}_periods")
 
     await safe_cb_answer(cb)
 
@@ -694,12 +1206,35 @@ async def payment_method_choice(cb: CallbackQuery):
 @dp.callback_query(F.data == "close")
 async def close_message(cb: CallbackQuery):
     try:
-        await cb.message.delete()
+        await outbound.send(cb.message.chat.id, cb.message.delete)
     except Exception:
         pass
     await safe_cb_answer(cb)
 
 
+@dp.callback_query(F.data.startswith("bc:"))
+async def broadcast_action(cb: CallbackQuery):
+    if not is_admin(cb.from_user):
+        await safe_cb_answer(cb)
+        return
+    _, action, broadcast_id = cb.data.split(":")
+    b = broadcaster.current()
+    if b is None or b.broadcast_id != int(broadcast_id):
+        b = broadcast_store.get(int(broadcast_id))
+    if b is None:
+        await safe_cb_answer(cb)
+        return
+    if action == "start" and b.status in ("draft", "stopped"):
+        if not broadcaster.start(b):
+            await safe_answer(cb.message, "Уже идёт другая рассылка: /broadcast_status")
+    elif action == "cancel" and b.status == "draft":
+        broadcast_store.set_status(b, "cancelled")
+    elif action == "stop":
+        broadcaster.stop(b.broadcast_id)
+    await safe_edit_text(cb.message, format_broadcast(b), reply_markup=broadcast_kb(b))
+    await safe_cb_answer(cb)
+
+
 @dp.callback_query(F.data.startswith("sub:"))
 async def subscription_selected(cb: CallbackQuery):
     _, product_key, method, choice = cb.data.split(":")
@@ -709,54 +1244,343 @@ async def subscription_selected(cb: CallbackQuery):
 
     # mentoring больше НЕ проходит через оплату/сроки
     if product_key == "mentoring":
-        await send_mentoring_info(cb.message)
+        await send_screen(cb.message, "mentoring")
         await safe_cb_answer(cb)
         return
 
     if product_key == "community":
-        product_name = "Hadiukov Community"
-        period_key = choice if choice in ("1m", "3m") else ""
-        period_text = PERIOD_TEXT.get(period_key, "")
-        expires_at = expires_from_key(period_key) if period_key else ""
-
-        if method == "crypto":
-            amount = COMMUNITY_USDT_1M if choice == "1m" else COMMUNITY_USDT_3M
-            await send_payment_flow_final(
-                cb.message,
-                tg_id=user_id,
-                tg_username=user_username,
-                product=product_name,
-                pay_method="Crypto (USDT)",
-                currency="USDT",
-                amount=amount,
-                period_key=period_key,
-                period_text=period_text,
-                expires_at=expires_at,
-            )
-        else:
-            amount = COMMUNITY_UAH_1M if choice == "1m" else COMMUNITY_UAH_3M
-            await send_payment_flow_final(
-                cb.message,
-                tg_id=user_id,
-                tg_username=user_username,
-                product=product_name,
-                pay_method="Fiat (UAH)",
-                currency="UAH",
-                amount=amount,
-                period_key=period_key,
-                period_text=period_text,
-                expires_at=expires_at,
-            )
+        if method not in COMMUNITY_PRICES or choice not in COMMUNITY_PRICES[method][1]:
+            await safe_cb_answer(cb)
+            return
+        currency, prices = COMMUNITY_PRICES[method]
+        await send_payment_flow_final(
+            cb.message,
+            tg_id=user_id,
+            tg_username=user_username,
+            product="Hadiukov Community",
+            pay_method=PAY_METHOD_TEXT[method],
+            currency=currency,
+            amount=prices[choice],
+            period_key=choice,
+            period_text=PERIOD_TEXT.get(choice, ""),
+            expires_at=expires_from_key(choice),
+        )
 
     await safe_cb_answer(cb)
 
+# =========================
+# EXPIRY REMINDERS
+# =========================
+
+async def send_expiry_reminder(tg_id: int, days: int, expires_at: date) -> str:
+    template = EXPIRY_TODAY_TEXT if days == 0 else EXPIRY_SOON_TEXT
+    text = template.format(date=expires_at.isoformat(), days=days)
+    outcome = await send_bulk(tg_id, text, reply_markup=renew_kb())
+    if outcome != "delivered":
+        log.info("Expiry reminder not delivered", extra={"tg_id": tg_id, "days": days, "outcome": outcome})
+    return outcome
+
+
+reminder_log = ReminderLog(REMINDER_LOG_PATH)
+expiry_scheduler = ExpiryScheduler(
+    subscription_index,
+    reminder_log,
+    send_expiry_reminder,
+    days_before=EXPIRY_REMINDER_DAYS,
+    hour_utc=EXPIRY_REMINDER_HOUR_UTC,
+    grace=EXPIRY_REMINDER_GRACE_HOURS * 3600,
+    reload_interval=SUBSCRIPTION_SYNC_INTERVAL or 60,
+)
+
+# =========================
+# BROADCASTS
+# =========================
+
+async def send_broadcast_message(chat_id: int, text: str, photo: str) -> str:
+    return await send_bulk(chat_id, text, photo=photo)
+
+
+async def report_broadcast(b: Broadcast):
+    if b.admin_chat_id:
+        await outbound.send(b.admin_chat_id, lambda: bot.send_message(b.admin_chat_id, format_broadcast(b)))
+
+
+broadcast_store = BroadcastStore(BROADCAST_PATH)
+broadcaster = Broadcaster(
+    broadcast_store,
+    subscription_index.tg_ids_after,
+    send_broadcast_message,
+    chunk_size=BROADCAST_CHUNK,
+    on_finish=report_broadcast,
+)
+
+# =========================
+# REPORTS
+# =========================
+
+# одна выгрузка за раз: проход по всей базе идёт в самой низкой полосе лимитера Notion
+report_task: asyncio.Task | None = None
+
+
+async def start_report(message: Message, export_fmt: str | None):
+    global report_task
+    if report_task is not None and not report_task.done():
+        await safe_answer(message, "Отчёт уже собирается, дождитесь его")
+        return
+    report_task = asyncio.create_task(run_report(message.chat.id, export_fmt))
+    await safe_answer(message, "Собираю отчёт по базе Notion, пришлю отдельным сообщением")
+
+
+async def run_report(chat_id: int, export_fmt: str | None):
+    t0 = time.monotonic()
+    report = SubscriberReport()
+    writer = None
+    if export_fmt:
+        name = f"subscribers-{datetime.utcnow():%Y%m%d-%H%M%S}.{export_fmt}"
+        writer = RowWriter(os.path.join(EXPORT_DIR, name), export_fmt)
+    ok = False
+    try:
+        report.missing_properties = await missing_report_properties(notion)
+        if report.missing_properties:
+            log.warning("Report properties missing in Notion schema", extra={"missing": report.missing_properties})
+        async for row in iter_report_rows(notion, order_ledger.resolve):
+            report.add(row)
+            if writer is not None:
+                writer.write(row)
+        ok = True
+    except Exception as e:
+        log.warning("Report failed: %r", e)
+        err = f"Отчёт не собран: {e!r}"
+        await outbound.send(chat_id, lambda: bot.send_message(chat_id, err, parse_mode=None))
+    finally:
+        if writer is not None:
+            writer.close()
+            if not ok:
+                os.remove(writer.path)
+    if not ok:
+        return
+    took = time.monotonic() - t0
+    log.info("Report built", extra={"requests": report.requests, "users": report.users, "took_s": round(took, 1)})
+    text = "<b>Отчёт по базе</b>\n" + "\n".join(report.lines()) + f"\n\nСобран за {took:.1f} с"
+    await outbound.send(chat_id, lambda: bot.send_message(chat_id, text))
+    if writer is not None:
+        try:
+            document = FSInputFile(writer.path)
+            await outbound.send(
+                chat_id,
+                lambda: bot.send_document(chat_id, document, caption=f"{writer.rows} заявок, {writer.fmt}"),
+            )
+        finally:
+            os.remove(writer.path)
+
+# =========================
+# SNAPSHOT
+# =========================
+
+# горячее состояние на диске: после деплоя первые тапы в кабинет не идут в Notion,
+# а паузы Retry-After не нарушаются заново. file_id картинок MediaRegistry хранит сам.
+def _dump_cabinet_cache() -> list:
+    # None в кэше — «заявок нет», это тоже ответ Notion
+    return cabinet_cache.dump(lambda record: record.as_dict() if record else None)
+
+
+def _load_cabinet_cache(state: list) -> int:
+    return cabinet_cache.load(state, lambda data: CabinetRecord.from_dict(data) if data else None)
+
+
+snapshot = Snapshot(
+    SNAPSHOT_PATH,
+    {
+        "cabinet_cache": (_dump_cabinet_cache, _load_cabinet_cache),
+        "notion_limiter": (notion.limiter.dump_state, notion.limiter.load_state),
+        "outbound": (outbound.dump_state, outbound.load_state),
+        "media": (media.dump_state, media.load_state),
+    },
+    max_age=SNAPSHOT_MAX_AGE,
+)
+
+# =========================
+# METRICS
+# =========================
+
+# stats() компонентов: /stats для админа и gauge-метрики на /metrics
+STATS_SOURCES = {
+    "cabinet_cache": cabinet_cache.stats,
+    "notion_singleflight": notion.singleflight.stats,
+    "notion_limiter": notion.limiter.stats,
+    "notion_breaker": notion.breaker.stats,
+    "notion_hedging": notion.hedge_stats,
+    "cabinet_loader": cabinet_loader.stats,
+    "outbound": outbound.stats,
+    "updates": updates.stats,
+    "orders": order_ledger.stats,
+    "expiry": expiry_scheduler.stats,
+    "broadcast": broadcaster.stats,
+    "snapshot": snapshot.stats,
+}
+for _name, _stats_fn in STATS_SOURCES.items():
+    REGISTRY.add_stats(_name, _stats_fn)
+
+
+def _handler_label(event, name: str) -> str:
+    # все кнопки меню идут через один menu_text — в метриках нужен конкретный экран
+    if name == "menu_text":
+        return menu_router.resolve(event.text).__name__
+    return name
+
+
+dp.message.middleware(HandlerMetricsMiddleware(_handler_label))
+dp.callback_query.middleware(HandlerMetricsMiddleware())
+dp.message.middleware(LogContextMiddleware(_handler_label))
+dp.callback_query.middleware(LogContextMiddleware())
+bot.session.middleware(TelegramRequestMetrics())
+
+
+async def start_metrics_server() -> web.AppRunner | None:
+    """
+    Отдельный HTTP-сервер под /metrics в обоих режимах: в webhook-режиме публичный порт
+    отдаёт только вебхук, а очереди, число пользователей и счётчики оплат — на внутреннем.
+    """
+    if not METRICS_PATH or METRICS_PORT <= 0:
+        return None
+    if not METRICS_TOKEN and not is_loopback(METRICS_HOST):
+        log.error("Metrics server not started: non-loopback METRICS_HOST needs METRICS_TOKEN", extra={"host": METRICS_HOST})
+        return None
+    app = web.Application()
+    add_metrics_route(app, METRICS_PATH, token=METRICS_TOKEN)
+    runner = web.AppRunner(app, access_log=None)
+    await runner.setup()
+    await web.TCPSite(runner, METRICS_HOST, METRICS_PORT).start()
+    log.info("Metrics on %s:%s%s", METRICS_HOST, METRICS_PORT, METRICS_PATH)
+    return runner
+
 # =========================
 # RUN
 # =========================
 
-async def main():
+def build_webhook_app() -> web.Application:
+    """
+    aiohttp-приложение для приёма апдейтов.
+    SimpleRequestHandler проверяет X-Telegram-Bot-Api-Secret-Token и отвечает 200, как только
+    апдейт принят в очередь UpdateExecutor; обработка идёт в его воркерах.
+    """
+    app = web.Application()
+    SimpleRequestHandler(
+        dispatcher=dp,
+        bot=bot,
+        secret_token=WEBHOOK_SECRET or None,
+        # ответ Telegram — после постановки в очередь UpdateExecutor: полная очередь тормозит приём
+        handle_in_background=False,
+    ).register(app, path=WEBHOOK_PATH)
+    return app
+
+
+async def run_polling():
+    # getUpdates не работает, пока висит вебхук
+    await bot.delete_webhook(drop_pending_updates=False)
+    metrics_runner = await start_metrics_server()
     log.info("Bot starting polling...")
-    await dp.start_polling(bot)
+    try:
+        # handle_as_tasks=False: параллелизм задаёт UpdateExecutor, polling ждёт места в его очереди
+        # сессию закрывает main(): апдейты в UpdateExecutor ещё дорабатывают и шлют ответы
+        await dp.start_polling(bot, handle_as_tasks=False, allowed_updates=ALLOWED_UPDATES, close_bot_session=False)
+    finally:
+        if metrics_runner is not None:
+            await metrics_runner.cleanup()
+
+
+async def run_webhook():
+    app = build_webhook_app()
+    runner = web.AppRunner(app, access_log=None)
+    await runner.setup()
+    site = web.TCPSite(runner, WEBHOOK_HOST, WEBHOOK_PORT)
+    await site.start()
+    metrics_runner = await start_metrics_server()
+
+    stop = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        try:
+            loop.add_signal_handler(sig, stop.set)
+        except NotImplementedError:
+            pass
+
+    url = f"{WEBHOOK_BASE_URL}{WEBHOOK_PATH}"
+    await dp.emit_startup(bot=bot)
+    try:
+        await bot.set_webhook(
+            url,
+            secret_token=WEBHOOK_SECRET,
+            allowed_updates=ALLOWED_UPDATES,
+        )
+        log.info("Bot starting webhook on %s:%s -> %s", WEBHOOK_HOST, WEBHOOK_PORT, url)
+        await stop.wait()
+    finally:
+        try:
+            await bot.delete_webhook(drop_pending_updates=False)
+        except Exception as e:
+            log.warning("delete_webhook failed: %r", e)
+        await runner.cleanup()
+        if metrics_runner is not None:
+            await metrics_runner.cleanup()
+        await dp.emit_shutdown(bot=bot)
+
+
+def prepare_images():
+    variants = image_variants.prepare(SCREENS.images())
+    for line in image_variants.report():
+        log.info("Image %s", line)
+    return variants
+
+
+async def main():
+    if IMAGE_OPTIMIZE:
+        # готовые варианты на диске только хешируются, так что повторный старт быстрый
+        await asyncio.to_thread(prepare_images)
+    snapshot.load()
+    await notion.start()
+    snapshot_task = None
+    if SNAPSHOT_INTERVAL > 0:
+        snapshot_task = asyncio.create_task(snapshot.run_forever(SNAPSHOT_INTERVAL))
+    sync_task = None
+    if SUBSCRIPTION_SYNC_INTERVAL > 0:
+        sync_task = asyncio.create_task(
+            sync_forever(notion, subscription_index, SUBSCRIPTION_SYNC_INTERVAL, SUBSCRIPTION_FULL_SYNC_INTERVAL)
+        )
+    expiry_task = None
+    if EXPIRY_REMINDER_DAYS:
+        expiry_task = asyncio.create_task(expiry_scheduler.run_forever())
+    # рассылка, прерванная деплоем, продолжается с последнего checkpoint
+    broadcaster.resume()
+    try:
+        if RUN_MODE == "webhook":
+            await run_webhook()
+        else:
+            await run_polling()
+    finally:
+        for task in (sync_task, expiry_task, snapshot_task):
+            if task:
+                task.cancel()
+                await asyncio.gather(task, return_exceptions=True)
+        # даём принятым апдейтам доработать, но не ждём вечно
+        try:
+            await asyncio.wait_for(updates.join(), 10)
+        except asyncio.TimeoutError:
+            log.warning("Shutdown with %s updates still pending", updates.queued + updates.inflight)
+        await updates.close()
+        await broadcaster.close()
+        if report_task is not None:
+            report_task.cancel()
+            await asyncio.gather(report_task, return_exceptions=True)
+        await outbound.close()
+        # последним из исходящего: после него никто уже не откроет новую aiohttp-сессию
+        await bot.session.close()
+        await notion.close()
+        snapshot.save()
+        subscription_index.close()
+        order_ledger.close()
+        reminder_log.close()
+        broadcast_store.close()
 
 
 if __name__ == "__main__":
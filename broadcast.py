@@ -0,0 +1,341 @@
+import os
+import time
+import asyncio
+import logging
+import sqlite3
+from typing import Awaitable, Callable
+
+log = logging.getLogger("bot")
+
+# recipients(after_tg_id, limit, audience) -> следующая страница tg_id по возрастанию
+RecipientPager = Callable[[str, int, str], list[str]]
+# send(chat_id, text, photo_file_id) -> "delivered" | "blocked" | "failed"
+BroadcastSender = Callable[[int, str, str], Awaitable[str]]
+
+
+class Broadcast:
+    """Строка журнала рассылок."""
+
+    __slots__ = (
+        "broadcast_id", "text", "photo", "audience", "status", "cursor",
+        "delivered", "blocked", "failed", "elapsed", "admin_chat_id", "created_at", "finished_at",
+    )
+
+    def __init__(
+        self,
+        broadcast_id: int,
+        text: str = "",
+        photo: str = "",
+        audience: str = "all",
+        status: str = "draft",
+        cursor: str = "",
+        delivered: int = 0,
+        blocked: int = 0,
+        failed: int = 0,
+        elapsed: float = 0.0,
+        admin_chat_id: int = 0,
+        created_at: float = 0.0,
+        finished_at: float = 0.0,
+    ):
+        self.broadcast_id = broadcast_id
+        self.text = text
+        self.photo = photo
+        self.audience = audience
+        self.status = status
+        self.cursor = cursor
+        self.delivered = delivered
+        self.blocked = blocked
+        self.failed = failed
+        self.elapsed = elapsed
+        self.admin_chat_id = admin_chat_id
+        self.created_at = created_at
+        self.finished_at = finished_at
+
+    @property
+    def processed(self) -> int:
+        return self.delivered + self.blocked + self.failed
+
+    @property
+    def rate(self) -> float:
+        """Сообщений в секунду за время активной отправки (без простоя между рестартами)."""
+        return self.processed / self.elapsed if self.elapsed > 0 else 0.0
+
+    def __repr__(self) -> str:
+        return f"Broadcast(broadcast_id={self.broadcast_id}, status={self.status!r}, processed={self.processed})"
+
+
+class BroadcastStore:
+    """
+    Журнал рассылок в SQLite (WAL).
+      - broadcasts: текст, file_id картинки, аудитория, курсор по tg_id и счётчики
+      - deliveries: итог по каждому получателю пишется сразу после отправки —
+        после рестарта повторно уходят только сообщения, которые были в полёте
+    """
+
+    _COLUMNS = (
+        "broadcast_id, text, photo, audience, status, cursor, "
+        "delivered, blocked, failed, elapsed, admin_chat_id, created_at, finished_at"
+    )
+
+    def __init__(self, path: str):
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self.db = sqlite3.connect(path, check_same_thread=False)
+        self.db.execute("PRAGMA journal_mode=WAL")
+        self.db.execute("PRAGMA synchronous=NORMAL")
+        self.db.execute(
+            """
+            CREATE TABLE IF NOT EXISTS broadcasts (
+                broadcast_id INTEGER PRIMARY KEY AUTOINCREMENT,
+                text TEXT NOT NULL DEFAULT '',
+                photo TEXT NOT NULL DEFAULT '',
+                audience TEXT NOT NULL DEFAULT 'all',
+                status TEXT NOT NULL DEFAULT 'draft',
+                cursor TEXT NOT NULL DEFAULT '',
+                delivered INTEGER NOT NULL DEFAULT 0,
+                blocked INTEGER NOT NULL DEFAULT 0,
+                failed INTEGER NOT NULL DEFAULT 0,
+                elapsed REAL NOT NULL DEFAULT 0,
+                admin_chat_id INTEGER NOT NULL DEFAULT 0,
+                created_at REAL NOT NULL,
+                finished_at REAL NOT NULL DEFAULT 0
+            )
+            """
+        )
+        self.db.execute(
+            """
+            CREATE TABLE IF NOT EXISTS deliveries (
+                broadcast_id INTEGER NOT NULL,
+                tg_id TEXT NOT NULL,
+                outcome TEXT NOT NULL DEFAULT 'pending',
+                PRIMARY KEY (broadcast_id, tg_id)
+            )
+            """
+        )
+
+    def close(self):
+        self.db.close()
+
+    def create(self, text: str, *, photo: str = "", audience: str = "all", admin_chat_id: int = 0) -> Broadcast:
+        with self.db:
+            cur = self.db.execute(
+                "INSERT INTO broadcasts (text, photo, audience, admin_chat_id, created_at) VALUES (?, ?, ?, ?, ?)",
+                (text, photo, audience, admin_chat_id, time.time()),
+            )
+        return self.get(cur.lastrowid)
+
+    def get(self, broadcast_id: int) -> Broadcast | None:
+        row = self.db.execute(
+            f"SELECT {self._COLUMNS} FROM broadcasts WHERE broadcast_id = ?", (broadcast_id,)
+        ).fetchone()
+        return Broadcast(*row) if row else None
+
+    def latest(self) -> Broadcast | None:
+        row = self.db.execute(f"SELECT {self._COLUMNS} FROM broadcasts ORDER BY broadcast_id DESC LIMIT 1").fetchone()
+        return Broadcast(*row) if row else None
+
+    def running(self) -> list[Broadcast]:
+        rows = self.db.execute(
+            f"SELECT {self._COLUMNS} FROM broadcasts WHERE status = 'running' ORDER BY broadcast_id"
+        ).fetchall()
+        return [Broadcast(*row) for row in rows]
+
+    def set_status(self, b: Broadcast, status: str):
+        b.status = status
+        if status in ("done", "stopped"):
+            b.finished_at = time.time()
+        with self.db:
+            self.db.execute(
+                "UPDATE broadcasts SET status = ?, finished_at = ? WHERE broadcast_id = ?",
+                (b.status, b.finished_at, b.broadcast_id),
+            )
+
+    def pending(self, b: Broadcast, tg_ids: list[str]) -> list[str]:
+        """Получатели страницы, которым ещё нет итога отправки (новые или прерванные рестартом)."""
+        with self.db:
+            self.db.executemany(
+                "INSERT OR IGNORE INTO deliveries (broadcast_id, tg_id) VALUES (?, ?)",
+                [(b.broadcast_id, tg_id) for tg_id in tg_ids],
+            )
+        done = {
+            row[0]
+            for row in self.db.execute(
+                "SELECT tg_id FROM deliveries WHERE broadcast_id = ? AND tg_id >= ? AND tg_id <= ? "
+                "AND outcome != 'pending'",
+                (b.broadcast_id, tg_ids[0], tg_ids[-1]),
+            )
+        }
+        return [tg_id for tg_id in tg_ids if tg_id not in done]
+
+    def record(self, b: Broadcast, tg_id: str, outcome: str):
+        """Итог одной отправки — сразу на диск: после рестарта этот получатель пропускается."""
+        setattr(b, outcome, getattr(b, outcome) + 1)
+        with self.db:
+            self.db.execute(
+                "UPDATE deliveries SET outcome = ? WHERE broadcast_id = ? AND tg_id = ?",
+                (outcome, b.broadcast_id, tg_id),
+            )
+
+    def checkpoint(self, b: Broadcast, cursor: str, elapsed: float):
+        """Курсор после страницы и счётчики."""
+        b.cursor = cursor
+        b.elapsed += elapsed
+        with self.db:
+            self.db.execute(
+                "UPDATE broadcasts SET cursor = ?, delivered = ?, blocked = ?, failed = ?, elapsed = ? "
+                "WHERE broadcast_id = ?",
+                (b.cursor, b.delivered, b.blocked, b.failed, b.elapsed, b.broadcast_id),
+            )
+
+    def recount(self, b: Broadcast):
+        """Счётчики из deliveries: итоги страницы, прерванной рестартом, в checkpoint не попали."""
+        counts = dict(
+            self.db.execute(
+                "SELECT outcome, COUNT(*) FROM deliveries WHERE broadcast_id = ? GROUP BY outcome",
+                (b.broadcast_id,),
+            ).fetchall()
+        )
+        b.delivered = counts.get("delivered", 0)
+        b.blocked = counts.get("blocked", 0)
+        b.failed = counts.get("failed", 0)
+
+
+class Broadcaster:
+    """
+    Рассылка по всей базе страницами по chunk_size получателей:
+      - получатели берутся курсором (keyset по tg_id), база целиком в память не грузится
+      - страница отправляется параллельно, темп задаёт планировщик исходящих (полоса BULK):
+        глобальный лимит, пауза всей полосы на RetryAfter, приоритет интерактивных ответов
+      - после каждой страницы — checkpoint курсора; после рестарта running-рассылки продолжаются
+        с него, получатели с уже записанным итогом пропускаются
+      - одна рассылка за раз
+    """
+
+    def __init__(
+        self,
+        store: BroadcastStore,
+        recipients: RecipientPager,
+        send: BroadcastSender,
+        *,
+        chunk_size: int = 100,
+        on_finish: Callable[[Broadcast], Awaitable[None]] | None = None,
+    ):
+        self.store = store
+        self.recipients = recipients
+        self.send = send
+        self.chunk_size = chunk_size
+        self.on_finish = on_finish
+        self._task: asyncio.Task | None = None
+        self._current: Broadcast | None = None
+        self._closing = False
+
+    def stats(self) -> dict:
+        b = self._current
+        return {
+            "running": int(self.is_running()),
+            "broadcast_id": b.broadcast_id if b else 0,
+            "delivered": b.delivered if b else 0,
+            "blocked": b.blocked if b else 0,
+            "failed": b.failed if b else 0,
+            "msgs_per_s": round(b.rate, 1) if b else 0.0,
+        }
+
+    def current(self) -> Broadcast | None:
+        """Идущая рассылка (с живыми счётчиками) или None."""
+        return self._current if self.is_running() else None
+
+    def is_running(self) -> bool:
+        return self._task is not None and not self._task.done()
+
+    def start(self, b: Broadcast) -> bool:
+        if self.is_running():
+            return False
+        if b.status != "running":
+            self.store.set_status(b, "running")
+        self.store.recount(b)
+        self._current = b
+        self._task = asyncio.create_task(self._run(b))
+        return True
+
+    def stop(self, broadcast_id: int) -> bool:
+        """Остановить после текущей страницы (уже отправленное учитывается)."""
+        b = self._current
+        if not self.is_running() or b is None or b.broadcast_id != broadcast_id:
+            return False
+        self.store.set_status(b, "stopped")
+        return True
+
+    def resume(self) -> Broadcast | None:
+        """Продолжить рассылку, прерванную рестартом."""
+        for b in self.store.running():
+            if self.start(b):
+                log.info("Broadcast resumed", extra={"broadcast_id": b.broadcast_id, "cursor": b.cursor})
+                return b
+        return None
+
+    async def close(self, timeout: float = 5.0):
+        """
+        Дать дослать текущую страницу (не дольше timeout), статус не меняется:
+        после рестарта рассылка продолжится с последнего checkpoint.
+        """
+        if self._task is None:
+            return
+        self._closing = True
+        try:
+            await asyncio.wait_for(asyncio.shield(self._task), timeout)
+        except asyncio.TimeoutError:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+        except Exception:
+            pass
+        self._task = None
+        self._closing = False
+
+    async def _send_one(self, tg_id: str, b: Broadcast):
+        try:
+            outcome = await self.send(int(tg_id), b.text, b.photo)
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            log.warning("Broadcast send failed tg_id=%s: %r", tg_id, e)
+            outcome = "failed"
+        self.store.record(b, tg_id, outcome)
+
+    async def _run(self, b: Broadcast):
+        try:
+            while b.status == "running" and not self._closing:
+                page = self.recipients(b.cursor, self.chunk_size, b.audience)
+                if not page:
+                    self.store.set_status(b, "done")
+                    break
+                t0 = time.monotonic()
+                await asyncio.gather(*(self._send_one(tg_id, b) for tg_id in self.store.pending(b, page)))
+                self.store.checkpoint(b, page[-1], time.monotonic() - t0)
+                log.info(
+                    "Broadcast progress",
+                    extra={"broadcast_id": b.broadcast_id, "processed": b.processed, "msgs_per_s": round(b.rate, 1)},
+                )
+        except asyncio.CancelledError:
+            raise
+        except Exception:
+            log.exception("Broadcast %s crashed", b.broadcast_id)
+            self.store.set_status(b, "stopped")
+        if b.status == "running":
+            # остановка процесса: продолжим после рестарта, отчёт — когда рассылка закончится
+            log.info("Broadcast suspended", extra={"broadcast_id": b.broadcast_id, "cursor": b.cursor})
+            return
+        log.info(
+            "Broadcast finished",
+            extra={
+                "broadcast_id": b.broadcast_id,
+                "status": b.status,
+                "delivered": b.delivered,
+                "blocked": b.blocked,
+                "failed": b.failed,
+                "msgs_per_s": round(b.rate, 1),
+            },
+        )
+        if self.on_finish is not None:
+            try:
+                await self.on_finish(b)
+            except Exception as e:
+                log.warning("Broadcast report failed: %r", e)
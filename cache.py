@@ -0,0 +1,231 @@
+import asyncio
+import logging
+import time
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Hashable
+
+log = logging.getLogger("bot")
+
+
+class TTLCache:
+    """
+    In-process LRU кэш с TTL и stale-while-revalidate.
+      - age < fresh_ttl: отдаём из кэша (hit)
+      - age < fresh_ttl + stale_ttl: отдаём из кэша сразу и обновляем в фоне (stale)
+      - иначе / нет записи: грузим синхронно (miss)
+    force=True всегда идёт в источник (кнопка «Обновить»).
+    """
+
+    def __init__(self, *, maxsize: int = 5000, fresh_ttl: float = 60.0, stale_ttl: float = 600.0, name: str = "cache"):
+        self.maxsize = maxsize
+        self.fresh_ttl = fresh_ttl
+        self.stale_ttl = stale_ttl
+        self.name = name
+        self._data: OrderedDict[Hashable, tuple[float, Any]] = OrderedDict()
+        self._refreshing: dict[Hashable, asyncio.Task] = {}
+        self.hits = 0
+        self.misses = 0
+        self.stale = 0
+        self.forced = 0
+        self.evictions = 0
+        self.refresh_errors = 0
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses + self.stale
+        return {
+            "size": len(self._data),
+            "maxsize": self.maxsize,
+            "hits": self.hits,
+            "misses": self.misses,
+            "stale": self.stale,
+            "forced": self.forced,
+            "evictions": self.evictions,
+            "refresh_errors": self.refresh_errors,
+            "hit_ratio": round((self.hits + self.stale) / lookups, 4) if lookups else 0.0,
+        }
+
+    def peek(self, key: Hashable) -> tuple[float, Any] | None:
+        """(stored_at, value) без учёта TTL и без обновления LRU."""
+        return self._data.get(key)
+
+    def set(self, key: Hashable, value: Any, stored_at: float | None = None):
+        self._data[key] = (time.time() if stored_at is None else stored_at, value)
+        self._data.move_to_end(key)
+        while len(self._data) > self.maxsize:
+            self._data.popitem(last=False)
+            self.evictions += 1
+
+    def invalidate(self, key: Hashable):
+        self._data.pop(key, None)
+
+    def dump(self, encode: Callable[[Any], Any] = lambda v: v) -> list:
+        """[[key, stored_at, value], ...] от старых к новым — для снапшота при рестарте."""
+        return [[key, stored_at, encode(value)] for key, (stored_at, value) in self._data.items()]
+
+    def load(self, entries: list, decode: Callable[[Any], Any] = lambda v: v, now: float | None = None) -> int:
+        """
+        Восстановить записи из dump() с их исходным stored_at: устаревшие
+        (старше fresh_ttl + stale_ttl) отбрасываются, остальные живут по обычным правилам.
+        """
+        now = time.time() if now is None else now
+        loaded = 0
+        for key, stored_at, value in entries:
+            if now - stored_at >= self.fresh_ttl + self.stale_ttl or key in self._data:
+                continue
+            self.set(key, decode(value), stored_at)
+            loaded += 1
+        return loaded
+
+    async def get_or_load(self, key: Hashable, loader: Callable[[], Awaitable[Any]], *, force: bool = False) -> Any:
+        entry = self._data.get(key)
+        if entry is not None and not force:
+            stored_at, value = entry
+            age = time.time() - stored_at
+            if age < self.fresh_ttl:
+                self.hits += 1
+                self._data.move_to_end(key)
+                return value
+            if age < self.fresh_ttl + self.stale_ttl:
+                self.stale += 1
+                self._data.move_to_end(key)
+                self._refresh_in_background(key, loader)
+                return value
+
+        if force:
+            self.forced += 1
+        else:
+            self.misses += 1
+        value = await loader()
+        self.set(key, value)
+        return value
+
+    def _refresh_in_background(self, key: Hashable, loader: Callable[[], Awaitable[Any]]):
+        if key in self._refreshing:
+            return
+
+        async def _refresh():
+            try:
+                self.set(key, await loader())
+            except Exception as e:
+                self.refresh_errors += 1
+                log.warning("%s background refresh failed key=%s: %r", self.name, key, e)
+            finally:
+                self._refreshing.pop(key, None)
+
+        self._refreshing[key] = asyncio.create_task(_refresh())
+
+
+class SingleFlight:
+    """
+    Склеивает одновременные одинаковые вызовы: пока запрос по ключу в полёте,
+    остальные ждут его и получают тот же результат (или то же исключение).
+    """
+
+    def __init__(self):
+        self._inflight: dict[Hashable, asyncio.Future] = {}
+        self.calls = 0
+        self.coalesced = 0
+
+    def stats(self) -> dict:
+        return {"calls": self.calls, "coalesced": self.coalesced, "inflight": len(self._inflight)}
+
+    async def do(self, key: Hashable, fn: Callable[[], Awaitable[Any]]) -> Any:
+        fut = self._inflight.get(key)
+        if fut is None:
+            self.calls += 1
+            fut = asyncio.ensure_future(fn())
+            self._inflight[key] = fut
+
+            def _done(f: asyncio.Future):
+                if self._inflight.get(key) is f:
+                    del self._inflight[key]
+                if not f.cancelled():
+                    f.exception()  # помечаем исключение как полученное
+
+            fut.add_done_callback(_done)
+        else:
+            self.coalesced += 1
+        # shield: отмена одного ожидающего не должна отменять общий запрос
+        return await asyncio.shield(fut)
+
+
+class BatchLoader:
+    """
+    DataLoader: ключи, запрошенные в течение window секунд (или пока не набралось max_batch),
+    грузятся одним вызовом batch_fn(keys, deadline) -> {key: value}. Отсутствующий ключ -> None.
+    Каждый вызывающий ждёт не дольше своего deadline (time.monotonic()).
+    """
+
+    def __init__(
+        self,
+        batch_fn: Callable[[list, float | None], Awaitable[dict]],
+        *,
+        window: float = 0.005,
+        max_batch: int = 25,
+    ):
+        self.batch_fn = batch_fn
+        self.window = window
+        self.max_batch = max_batch
+        self._pending: dict[Hashable, asyncio.Future] = {}
+        self._deadlines: list[float | None] = []
+        self._timer: asyncio.TimerHandle | None = None
+        self.batches = 0
+        self.keys_loaded = 0
+
+    def stats(self) -> dict:
+        return {
+            "batches": self.batches,
+            "keys": self.keys_loaded,
+            "avg_batch": round(self.keys_loaded / self.batches, 2) if self.batches else 0.0,
+            "pending": len(self._pending),
+        }
+
+    async def load(self, key: Hashable, deadline: float | None = None) -> Any:
+        fut = self._pending.get(key)
+        if fut is None:
+            fut = asyncio.get_running_loop().create_future()
+            self._pending[key] = fut
+            self._deadlines.append(deadline)
+            if len(self._pending) >= self.max_batch:
+                self._dispatch()
+            elif self._timer is None:
+                self._timer = asyncio.get_running_loop().call_later(self.window, self._dispatch)
+        else:
+            self._deadlines.append(deadline)
+
+        if deadline is None:
+            return await asyncio.shield(fut)
+        try:
+            return await asyncio.wait_for(asyncio.shield(fut), max(deadline - time.monotonic(), 0.0))
+        except asyncio.TimeoutError:
+            raise TimeoutError(f"batch load deadline exceeded for {key!r}") from None
+
+    def _dispatch(self):
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        batch, self._pending = self._pending, {}
+        deadlines, self._deadlines = self._deadlines, []
+        if not batch:
+            return
+        # батч живёт до самого позднего дедлайна; короткие дедлайны соблюдают сами ожидающие
+        deadline = None if any(d is None for d in deadlines) else max(deadlines)
+        asyncio.create_task(self._run(batch, deadline))
+
+    async def _run(self, batch: dict[Hashable, asyncio.Future], deadline: float | None):
+        self.batches += 1
+        self.keys_loaded += len(batch)
+        try:
+            results = await self.batch_fn(list(batch), deadline)
+        except Exception as e:
+            for fut in batch.values():
+                if not fut.done():
+                    fut.set_exception(e)
+                    fut.exception()  # ожидающий мог уйти по дедлайну
+            return
+        for key, fut in batch.items():
+            if not fut.done():
+                fut.set_result(results.get(key))
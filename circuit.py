@@ -0,0 +1,128 @@
+import logging
+import time
+from collections import deque
+
+log = logging.getLogger("bot")
+
+
+class CircuitOpenError(Exception):
+    """Сервис считается недоступным — запрос даже не отправляем."""
+
+
+class CircuitBreaker:
+    """
+    closed -> open: в окне последних `window` вызовов (не меньше min_calls) доля ошибок
+                    и медленных ответов (> slow_call_s) достигла failure_rate
+    open -> half_open: через open_seconds пропускаем один пробный вызов
+    half_open -> closed при успехе пробы, -> open при ошибке
+    """
+
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+    def __init__(
+        self,
+        *,
+        name: str = "circuit",
+        window: int = 20,
+        min_calls: int = 5,
+        failure_rate: float = 0.5,
+        slow_call_s: float = 5.0,
+        open_seconds: float = 30.0,
+    ):
+        self.name = name
+        self.min_calls = min_calls
+        self.failure_rate = failure_rate
+        self.slow_call_s = slow_call_s
+        self.open_seconds = open_seconds
+        self._outcomes: deque[bool] = deque(maxlen=window)  # True = плохой вызов
+        self._state = self.CLOSED
+        self._opened_at = 0.0
+        self._probe_started = 0.0
+        self.opened = 0
+        self.rejected = 0
+
+    @property
+    def state(self) -> str:
+        if self._state == self.OPEN and time.monotonic() - self._opened_at >= self.open_seconds:
+            self._state = self.HALF_OPEN
+            self._probe_started = 0.0
+        return self._state
+
+    def stats(self) -> dict:
+        bad = sum(self._outcomes)
+        return {
+            "state": self.state,
+            "window_calls": len(self._outcomes),
+            "window_failures": bad,
+            "opened": self.opened,
+            "rejected": self.rejected,
+        }
+
+    def allow(self) -> bool:
+        state = self.state
+        if state == self.CLOSED:
+            return True
+        if state == self.HALF_OPEN:
+            now = time.monotonic()
+            # одна проба за раз; если проба потерялась (отмена) — через open_seconds пускаем следующую
+            if not self._probe_in_flight(now):
+                self._probe_started = now
+                return True
+        return False
+
+    def _probe_in_flight(self, now: float) -> bool:
+        return bool(self._probe_started) and now - self._probe_started < self.open_seconds
+
+    def fail_fast(self):
+        """
+        CircuitOpenError, если вызов заведомо не пройдёт (open или проба уже идёт),
+        не занимая пробу: её берёт before_call() прямо перед запросом, после очереди лимитера.
+        """
+        state = self.state
+        if state == self.OPEN or (state == self.HALF_OPEN and self._probe_in_flight(time.monotonic())):
+            self.rejected += 1
+            raise CircuitOpenError(f"{self.name} circuit is open")
+
+    def before_call(self):
+        if not self.allow():
+            self.rejected += 1
+            raise CircuitOpenError(f"{self.name} circuit is open")
+
+    def release_probe(self):
+        """Проба закончилась без исхода (429, отмена, чужая ошибка) — следующий вызов может пробовать."""
+        if self._state == self.HALF_OPEN:
+            self._probe_started = 0.0
+
+    def record_success(self, latency_s: float = 0.0):
+        if latency_s > self.slow_call_s:
+            self._record(True)
+            return
+        if self._state == self.HALF_OPEN:
+            log.info("%s circuit closed", self.name)
+            self._state = self.CLOSED
+            self._outcomes.clear()
+        self._record(False)
+
+    def record_failure(self):
+        self._record(True)
+
+    def _record(self, bad: bool):
+        if self._state == self.HALF_OPEN:
+            if bad:
+                self._open()
+            return
+        self._outcomes.append(bad)
+        if (
+            self._state == self.CLOSED
+            and len(self._outcomes) >= self.min_calls
+            and sum(self._outcomes) / len(self._outcomes) >= self.failure_rate
+        ):
+            self._open()
+
+    def _open(self):
+        self._state = self.OPEN
+        self._opened_at = time.monotonic()
+        self.opened += 1
+        log.warning("%s circuit opened for %.0fs", self.name, self.open_seconds)
@@ -1,4 +1,5 @@
 import os
+import hashlib
 from dotenv import load_dotenv
 
 load_dotenv()
@@ -16,3 +17,126 @@ if not NOTION_DATABASE_ID:
     raise RuntimeError("NOTION_DATABASE_ID is empty. Set env NOTION_DATABASE_ID.")
 if not TALLY_FORM_URL:
     raise RuntimeError("TALLY_FORM_URL is empty. Set env TALLY_FORM_URL.")
+
+# Логи: json-строки (или plain для локальной отладки), повторяющиеся INFO — не чаще LOG_INFO_RATE/с на шаблон
+LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO").strip().upper()
+LOG_FORMAT = os.getenv("LOG_FORMAT", "json").strip().lower()
+LOG_INFO_RATE = float(os.getenv("LOG_INFO_RATE", "1"))  # 0 = без ограничения
+LOG_INFO_BURST = float(os.getenv("LOG_INFO_BURST", "5"))
+
+if LOG_FORMAT not in ("json", "plain"):
+    raise RuntimeError("LOG_FORMAT must be 'json' or 'plain'.")
+
+# Локальное состояние бота (кэши, индексы) — не коммитится
+DATA_DIR = os.getenv("DATA_DIR", "data").strip() or "data"
+MEDIA_CACHE_PATH = os.getenv("MEDIA_CACHE_PATH", os.path.join(DATA_DIR, "media_cache.json")).strip()
+
+# Оптимизированные варианты картинок для Telegram (нужен Pillow, иначе шлём исходники)
+IMAGE_OPTIMIZE = os.getenv("IMAGE_OPTIMIZE", "1").strip() not in ("0", "false", "no")
+IMAGE_CACHE_DIR = os.getenv("IMAGE_CACHE_DIR", os.path.join(DATA_DIR, "images")).strip()
+IMAGE_MAX_SIDE = int(os.getenv("IMAGE_MAX_SIDE", "1280"))
+IMAGE_QUALITY = int(os.getenv("IMAGE_QUALITY", "85"))
+IMAGE_FORMAT = os.getenv("IMAGE_FORMAT", "jpeg").strip().lower()
+
+if IMAGE_FORMAT not in ("jpeg", "webp"):
+    raise RuntimeError("IMAGE_FORMAT must be 'jpeg' or 'webp'.")
+
+# Notion HTTP client (пул соединений)
+NOTION_API_BASE = os.getenv("NOTION_API_BASE", "https://api.notion.com/v1").strip()
+NOTION_MAX_CONNECTIONS = int(os.getenv("NOTION_MAX_CONNECTIONS", "10"))
+NOTION_MAX_KEEPALIVE = int(os.getenv("NOTION_MAX_KEEPALIVE", "5"))
+NOTION_KEEPALIVE_EXPIRY = float(os.getenv("NOTION_KEEPALIVE_EXPIRY", "30"))
+
+# Кэш личного кабинета (секунды)
+CABINET_CACHE_SIZE = int(os.getenv("CABINET_CACHE_SIZE", "5000"))
+CABINET_CACHE_TTL = float(os.getenv("CABINET_CACHE_TTL", "60"))
+CABINET_CACHE_STALE = float(os.getenv("CABINET_CACHE_STALE", "600"))
+
+# Локальный индекс подписок (зеркало Notion)
+SUBSCRIPTION_INDEX_PATH = os.getenv("SUBSCRIPTION_INDEX_PATH", os.path.join(DATA_DIR, "subscriptions.sqlite3")).strip()
+SUBSCRIPTION_SYNC_INTERVAL = float(os.getenv("SUBSCRIPTION_SYNC_INTERVAL", "60"))  # 0 = выключено
+# полный проход раз в столько секунд: убирает из индекса страницы, удалённые в Notion
+SUBSCRIPTION_FULL_SYNC_INTERVAL = float(os.getenv("SUBSCRIPTION_FULL_SYNC_INTERVAL", "86400"))
+
+# Напоминания об окончании подписки: за сколько дней (0 = в день окончания), пусто = выключено
+EXPIRY_REMINDER_DAYS = tuple(int(x) for x in os.getenv("EXPIRY_REMINDER_DAYS", "3,0").replace(" ", "").split(",") if x)
+EXPIRY_REMINDER_HOUR_UTC = int(os.getenv("EXPIRY_REMINDER_HOUR_UTC", "10"))
+EXPIRY_REMINDER_GRACE_HOURS = float(os.getenv("EXPIRY_REMINDER_GRACE_HOURS", "24"))  # досылать пропущенные за простой
+REMINDER_LOG_PATH = os.getenv("REMINDER_LOG_PATH", os.path.join(DATA_DIR, "reminders.sqlite3")).strip()
+
+# Рассылки админа: журнал с checkpoint'ами и размер страницы получателей
+BROADCAST_PATH = os.getenv("BROADCAST_PATH", os.path.join(DATA_DIR, "broadcasts.sqlite3")).strip()
+BROADCAST_CHUNK = int(os.getenv("BROADCAST_CHUNK", "100"))
+
+# Снапшот горячего состояния (кэш кабинета, паузы лимитеров, хеши картинок) для тёплого рестарта
+SNAPSHOT_PATH = os.getenv("SNAPSHOT_PATH", os.path.join(DATA_DIR, "snapshot.json.gz")).strip()
+SNAPSHOT_INTERVAL = float(os.getenv("SNAPSHOT_INTERVAL", "60"))  # 0 = только при остановке
+SNAPSHOT_MAX_AGE = float(os.getenv("SNAPSHOT_MAX_AGE", "3600"))  # старше — стартуем холодными
+
+# Выгрузки /export (временные файлы, удаляются после отправки админу)
+EXPORT_DIR = os.getenv("EXPORT_DIR", os.path.join(DATA_DIR, "exports")).strip()
+
+# Журнал заказов и подписанные токены заказа в ссылке Tally
+ORDER_LEDGER_PATH = os.getenv("ORDER_LEDGER_PATH", os.path.join(DATA_DIR, "orders.sqlite3")).strip()
+# по умолчанию ключ выводится из BOT_TOKEN; смена ключа делает старые токены недействительными
+ORDER_TOKEN_SECRET = (
+    os.getenv("ORDER_TOKEN_SECRET", "").strip()
+    or hashlib.sha256(f"order-token:{BOT_TOKEN}".encode()).hexdigest()
+)
+ORDER_PENDING_DAYS = float(os.getenv("ORDER_PENDING_DAYS", "7"))
+# 1 = без username/продукта/текста периода (они в журнале по токену); сумма, период и
+# способ оплаты уходят в Tally всегда
+TALLY_COMPACT_URL = os.getenv("TALLY_COMPACT_URL", "1").strip() not in ("0", "false", "no")
+
+# Режим запуска: polling (по умолчанию) или webhook (aiohttp)
+RUN_MODE = os.getenv("RUN_MODE", "polling").strip().lower()
+WEBHOOK_BASE_URL = os.getenv("WEBHOOK_BASE_URL", "").strip().rstrip("/")  # например: https://my-bot.herokuapp.com
+WEBHOOK_PATH = os.getenv("WEBHOOK_PATH", "/telegram/webhook").strip()
+WEBHOOK_SECRET = os.getenv("WEBHOOK_SECRET", "").strip()
+WEBHOOK_HOST = os.getenv("WEBHOOK_HOST", "0.0.0.0").strip()
+WEBHOOK_PORT = int(os.getenv("PORT", os.getenv("WEBHOOK_PORT", "8080")))
+
+if RUN_MODE not in ("polling", "webhook"):
+    raise RuntimeError("RUN_MODE must be 'polling' or 'webhook'.")
+if RUN_MODE == "webhook" and not WEBHOOK_BASE_URL:
+    raise RuntimeError("WEBHOOK_BASE_URL is empty. Set env WEBHOOK_BASE_URL for RUN_MODE=webhook.")
+if RUN_MODE == "webhook" and not WEBHOOK_SECRET:
+    raise RuntimeError("WEBHOOK_SECRET is empty. Set env WEBHOOK_SECRET for RUN_MODE=webhook.")
+
+# Обработка апдейтов: сколько хендлеров одновременно и сколько апдейтов держим в очереди
+UPDATE_WORKERS = int(os.getenv("UPDATE_WORKERS", "32"))
+UPDATE_MAX_QUEUE = int(os.getenv("UPDATE_MAX_QUEUE", "1000"))
+
+# Prometheus /metrics: всегда отдельный сервер на METRICS_PORT, не на публичном порту вебхука.
+# METRICS_TOKEN — если задан, скрейпер шлёт Authorization: Bearer <token>.
+# По умолчанию слушаем только loopback; на внешнем адресе без токена сервер не поднимется.
+METRICS_PATH = os.getenv("METRICS_PATH", "/metrics").strip()  # пусто = выключено
+METRICS_HOST = os.getenv("METRICS_HOST", "127.0.0.1").strip()
+METRICS_PORT = int(os.getenv("METRICS_PORT", "9100"))
+METRICS_TOKEN = os.getenv("METRICS_TOKEN", "").strip()
+
+# Лимиты исходящих сообщений Telegram
+TG_GLOBAL_RATE = float(os.getenv("TG_GLOBAL_RATE", "30"))  # msg/s на бота
+TG_CHAT_RATE = float(os.getenv("TG_CHAT_RATE", "1"))  # msg/s в один личный чат (рассылка)
+TG_CHAT_BURST = float(os.getenv("TG_CHAT_BURST", "3"))
+TG_GROUP_RATE_PER_MIN = float(os.getenv("TG_GROUP_RATE_PER_MIN", "20"))  # msg/min в группу
+
+# Лимитер запросов к Notion
+NOTION_RATE = float(os.getenv("NOTION_RATE", "3"))  # req/s
+NOTION_BURST = float(os.getenv("NOTION_BURST", "3"))
+NOTION_MAX_QUEUE = int(os.getenv("NOTION_MAX_QUEUE", "200"))
+NOTION_INTERACTIVE_MAX_WAIT = float(os.getenv("NOTION_INTERACTIVE_MAX_WAIT", "5"))  # дольше — CABINET_RETRY_TEXT
+
+# Circuit breaker для Notion
+NOTION_BREAKER_FAILURE_RATE = float(os.getenv("NOTION_BREAKER_FAILURE_RATE", "0.5"))
+NOTION_BREAKER_SLOW_CALL = float(os.getenv("NOTION_BREAKER_SLOW_CALL", "5"))  # секунды
+NOTION_BREAKER_OPEN_SECONDS = float(os.getenv("NOTION_BREAKER_OPEN_SECONDS", "30"))
+
+# Дедлайн кабинета и hedged requests к Notion
+CABINET_DEADLINE = float(os.getenv("CABINET_DEADLINE", "8"))  # секунды на весь ответ кабинета
+NOTION_HEDGE_QUANTILE = float(os.getenv("NOTION_HEDGE_QUANTILE", "0.9"))  # 0 = без хеджирования
+NOTION_HEDGE_BUDGET = float(os.getenv("NOTION_HEDGE_BUDGET", "0.1"))  # доля дополнительных запросов
+
+# Батчинг запросов кабинета в Notion
+CABINET_BATCH_WINDOW_MS = float(os.getenv("CABINET_BATCH_WINDOW_MS", "5"))
+CABINET_BATCH_MAX = int(os.getenv("CABINET_BATCH_MAX", "25"))
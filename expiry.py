@@ -0,0 +1,223 @@
+import os
+import heapq
+import asyncio
+import logging
+import sqlite3
+import time
+from datetime import date, datetime, timedelta, timezone
+from typing import Awaitable, Callable
+
+from notion import parse_date
+from subscriptions import SubscriptionIndex
+
+log = logging.getLogger("bot")
+
+# send(tg_id, дней до окончания, expires_at) -> "delivered" | "blocked" | "failed"
+ReminderSender = Callable[[int, int, date], Awaitable[str]]
+
+
+class ReminderLog:
+    """
+    Какие напоминания уже отправлены: (tg_id, expires_at, за сколько дней).
+    Запись делается ДО отправки — после рестарта напоминание не уйдёт второй раз
+    (в худшем случае, при падении ровно между записью и отправкой, одно потеряется).
+    Не ушло (сеть, флуд-лимит) — запись снимается через release() и напоминание повторяется.
+    """
+
+    def __init__(self, path: str):
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self.db = sqlite3.connect(path, check_same_thread=False)
+        self.db.execute("PRAGMA journal_mode=WAL")
+        self.db.execute("PRAGMA synchronous=NORMAL")
+        self.db.execute(
+            """
+            CREATE TABLE IF NOT EXISTS reminders (
+                tg_id TEXT NOT NULL,
+                expires_at TEXT NOT NULL,
+                days_before INTEGER NOT NULL,
+                sent_at REAL NOT NULL,
+                PRIMARY KEY (tg_id, expires_at, days_before)
+            )
+            """
+        )
+
+    def claim(self, tg_id: str, expires_at: str, days_before: int) -> bool:
+        with self.db:
+            cur = self.db.execute(
+                "INSERT OR IGNORE INTO reminders (tg_id, expires_at, days_before, sent_at) VALUES (?, ?, ?, ?)",
+                (tg_id, expires_at, days_before, time.time()),
+            )
+        return cur.rowcount == 1
+
+    def release(self, tg_id: str, expires_at: str, days_before: int):
+        with self.db:
+            self.db.execute(
+                "DELETE FROM reminders WHERE tg_id = ? AND expires_at = ? AND days_before = ?",
+                (tg_id, expires_at, days_before),
+            )
+
+    def close(self):
+        self.db.close()
+
+
+class ExpiryScheduler:
+    """
+    Напоминания об окончании подписки (за N дней и в день окончания).
+      - куча (fire_at, tg_id, expires_at, days_before): O(log n) на вставку/извлечение,
+        спим до ближайшего срока, а не сканируем всех пользователей
+      - из индекса подписок раз в reload_interval берём только изменившиеся строки (synced_at)
+      - при срабатывании сверяемся с индексом: продлил/отменил — напоминание не шлём
+      - пропущенные за время простоя напоминания досылаются, если опоздали не больше чем на grace
+      - неудачная отправка повторяется через retry_delay, пока не вышел тот же grace;
+        заблокировавшим бота не повторяем
+    """
+
+    def __init__(
+        self,
+        index: SubscriptionIndex,
+        reminder_log: ReminderLog,
+        send: ReminderSender,
+        *,
+        days_before: tuple[int, ...] = (3, 0),
+        hour_utc: int = 10,
+        grace: float = 86400.0,
+        reload_interval: float = 60.0,
+        batch_size: int = 100,
+        retry_delay: float = 900.0,
+    ):
+        self.index = index
+        self.reminder_log = reminder_log
+        self.send = send
+        self.days_before = tuple(sorted(set(days_before), reverse=True))
+        self.hour_utc = hour_utc
+        self.grace = grace
+        self.reload_interval = reload_interval
+        self.batch_size = batch_size
+        self.retry_delay = retry_delay
+        self._heap: list[tuple[float, str, str, int]] = []
+        self._scheduled: dict[str, str] = {}  # tg_id -> expires_at, уже лежащий в куче
+        self._cursor = 0.0
+        self.sent = 0
+        self.skipped = 0
+        self.blocked = 0
+        self.failed = 0
+        self.retried = 0
+
+    def stats(self) -> dict:
+        return {
+            "scheduled": len(self._heap),
+            "subscriptions": len(self._scheduled),
+            "next_in_s": round(self._heap[0][0] - time.time(), 1) if self._heap else None,
+            "sent": self.sent,
+            "skipped": self.skipped,
+            "blocked": self.blocked,
+            "failed": self.failed,
+            "retried": self.retried,
+        }
+
+    def fire_at(self, expires_at: date, days_before: int) -> float:
+        day = expires_at - timedelta(days=days_before)
+        return datetime(day.year, day.month, day.day, self.hour_utc, tzinfo=timezone.utc).timestamp()
+
+    def load(self, now: float | None = None) -> int:
+        """Добавить в кучу подписки, изменившиеся с прошлой загрузки."""
+        now = time.time() if now is None else now
+        added = 0
+        for tg_id, expires_at, synced_at in self.index.approved_since(self._cursor):
+            self._cursor = max(self._cursor, synced_at)
+            if self._scheduled.get(tg_id) == expires_at:
+                continue
+            exp = parse_date(expires_at)
+            if exp is None:
+                continue
+            pushed = 0
+            for days in self.days_before:
+                at = self.fire_at(exp, days)
+                if at >= now - self.grace:
+                    heapq.heappush(self._heap, (at, tg_id, expires_at, days))
+                    pushed += 1
+            if pushed:
+                self._scheduled[tg_id] = expires_at
+                added += pushed
+        return added
+
+    def _pop_due(self, now: float) -> list[tuple[float, str, str, int]]:
+        due = []
+        while self._heap and self._heap[0][0] <= now and len(due) < self.batch_size:
+            due.append(heapq.heappop(self._heap))
+        return due
+
+    def _still_valid(self, tg_id: str, expires_at: str) -> bool:
+        record = self.index.get(tg_id)
+        return bool(
+            record
+            and record.status == "approved"
+            and record.expires_at
+            and record.expires_at.isoformat() == expires_at
+        )
+
+    async def _fire(self, due: list[tuple[float, str, str, int]], now: float):
+        jobs = []
+        claimed = []
+        for at, tg_id, expires_at, days in due:
+            if self._scheduled.get(tg_id) == expires_at and days == min(self.days_before):
+                # последнее напоминание по этой дате — больше в куче её нет
+                del self._scheduled[tg_id]
+            exp = parse_date(expires_at)
+            # опоздание считаем от исходного срока: повторы тоже укладываются в grace
+            if exp is None or self.fire_at(exp, days) < now - self.grace or not self._still_valid(tg_id, expires_at):
+                self.skipped += 1
+                continue
+            if not self.reminder_log.claim(tg_id, expires_at, days):
+                self.skipped += 1
+                continue
+            # досланное после простоя напоминание говорит, сколько осталось на самом деле
+            days_left = max((exp - datetime.fromtimestamp(now, timezone.utc).date()).days, 0)
+            jobs.append(self._send_one(int(tg_id), days_left, exp))
+            claimed.append((tg_id, expires_at, days))
+        # отправка пачкой: темп задаёт общий планировщик исходящих (BULK)
+        outcomes = await asyncio.gather(*jobs, return_exceptions=True)
+        for (tg_id, expires_at, days), outcome in zip(claimed, outcomes):
+            if outcome == "delivered":
+                self.sent += 1
+            elif outcome == "blocked":
+                self.blocked += 1
+            else:
+                self.failed += 1
+                self.reminder_log.release(tg_id, expires_at, days)
+                exp = parse_date(expires_at)
+                retry_at = now + self.retry_delay
+                if self.fire_at(exp, days) + self.grace >= retry_at:
+                    heapq.heappush(self._heap, (retry_at, tg_id, expires_at, days))
+                    self.retried += 1
+
+    async def _send_one(self, tg_id: int, days: int, expires_at: date) -> str:
+        try:
+            return await self.send(tg_id, days, expires_at)
+        except Exception as e:
+            log.warning("Expiry reminder failed tg_id=%s: %r", tg_id, e)
+            return "failed"
+
+    async def run_forever(self):
+        next_reload = 0.0
+        while True:
+            try:
+                now = time.time()
+                if now >= next_reload:
+                    added = self.load(now)
+                    if added:
+                        log.info("Expiry reminders scheduled: +%s (queued=%s)", added, len(self._heap))
+                    next_reload = now + self.reload_interval
+                due = self._pop_due(now)
+                if due:
+                    await self._fire(due, now)
+                    continue
+                wait_s = next_reload - now
+                if self._heap:
+                    wait_s = min(wait_s, self._heap[0][0] - now)
+                await asyncio.sleep(max(wait_s, 0.0))
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                log.warning("Expiry scheduler error: %r", e)
+                await asyncio.sleep(self.reload_interval)
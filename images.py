@@ -0,0 +1,147 @@
+import os
+import sys
+import glob
+import hashlib
+import logging
+import importlib.util
+from dataclasses import dataclass
+from typing import Iterable
+
+log = logging.getLogger("bot.media")
+
+# Telegram всё равно пережимает фото до ~1280px по длинной стороне — больше слать незачем
+TELEGRAM_PHOTO_SIDE = 1280
+FORMATS = {"jpeg": ".jpg", "webp": ".webp"}
+
+
+def pillow_available() -> bool:
+    # без Pillow отправляем исходники как есть
+    return importlib.util.find_spec("PIL") is not None
+
+
+@dataclass(frozen=True, slots=True)
+class OptimizedImage:
+    source: str
+    path: str  # что реально уходит в Telegram (вариант или сам исходник)
+    source_bytes: int
+    output_bytes: int
+
+    @property
+    def saved_bytes(self) -> int:
+        return self.source_bytes - self.output_bytes
+
+
+class ImageOptimizer:
+    """
+    Готовит для pictures/ уменьшенные JPEG/WebP варианты под лимиты Telegram.
+    Имя варианта — <имя>-<sha256(исходник + параметры)>: при старте готовый файл
+    просто переиспользуется, изменённая картинка или другие параметры дают новый файл.
+    Если Pillow нет, конвертация упала или вариант не меньше исходника — шлём исходник.
+    """
+
+    def __init__(self, out_dir: str, *, max_side: int = TELEGRAM_PHOTO_SIDE, quality: int = 85, fmt: str = "jpeg"):
+        if fmt not in FORMATS:
+            raise ValueError(f"Unsupported image format: {fmt}")
+        self.out_dir = out_dir
+        self.max_side = max_side
+        self.quality = quality
+        self.fmt = fmt
+        self._variants: dict[str, OptimizedImage] = {}
+
+    def resolve(self, path: str) -> str:
+        """Путь для загрузки в Telegram: оптимизированный вариант, если он готов."""
+        variant = self._variants.get(path)
+        if variant is not None and os.path.isfile(variant.path):
+            return variant.path
+        return path
+
+    def prepare(self, paths: Iterable[str]) -> list[OptimizedImage]:
+        if not pillow_available():
+            log.warning("Pillow is not installed, images are sent as is")
+            return []
+        done = []
+        for path in paths:
+            try:
+                variant = self._optimize(path)
+            except Exception as e:
+                log.warning("Image optimization failed for %s: %r", path, e)
+                continue
+            self._variants[path] = variant
+            done.append(variant)
+        return done
+
+    def report(self) -> list[str]:
+        lines = []
+        total_src = total_out = 0
+        for v in self._variants.values():
+            total_src += v.source_bytes
+            total_out += v.output_bytes
+            lines.append(
+                f"{v.source}: {v.source_bytes / 1024:.0f} KB -> {v.output_bytes / 1024:.0f} KB "
+                f"(saved {v.saved_bytes / 1024:.0f} KB) {os.path.basename(v.path)}"
+            )
+        if lines:
+            lines.append(f"total: {total_src / 1024:.0f} KB -> {total_out / 1024:.0f} KB (saved {(total_src - total_out) / 1024:.0f} KB)")
+        return lines
+
+    def _variant_path(self, path: str) -> str:
+        h = hashlib.sha256(f"{self.fmt}:{self.max_side}:{self.quality}:".encode())
+        with open(path, "rb") as f:
+            for chunk in iter(lambda: f.read(1 << 16), b""):
+                h.update(chunk)
+        stem = os.path.splitext(os.path.basename(path))[0]
+        return os.path.join(self.out_dir, f"{stem}-{h.hexdigest()[:16]}{FORMATS[self.fmt]}")
+
+    def _optimize(self, path: str) -> OptimizedImage:
+        source_bytes = os.path.getsize(path)
+        out = self._variant_path(path)
+        if not os.path.isfile(out):
+            self._encode(path, out)
+            self._drop_old_variants(out)
+        output_bytes = os.path.getsize(out)
+        if output_bytes >= source_bytes:
+            return OptimizedImage(path, path, source_bytes, source_bytes)
+        return OptimizedImage(path, out, source_bytes, output_bytes)
+
+    def _encode(self, path: str, out: str):
+        from PIL import Image, ImageOps
+
+        os.makedirs(self.out_dir, exist_ok=True)
+        with Image.open(path) as im:
+            im = ImageOps.exif_transpose(im)
+            if im.mode in ("RGBA", "LA") or (im.mode == "P" and "transparency" in im.info):
+                # у JPEG нет прозрачности — кладём на белый фон
+                rgba = im.convert("RGBA")
+                im = Image.new("RGB", rgba.size, (255, 255, 255))
+                im.paste(rgba, mask=rgba.getchannel("A"))
+            elif im.mode != "RGB":
+                im = im.convert("RGB")
+            im.thumbnail((self.max_side, self.max_side), Image.LANCZOS)
+            tmp = f"{out}.tmp"
+            if self.fmt == "jpeg":
+                im.save(tmp, "JPEG", quality=self.quality, optimize=True, progressive=True)
+            else:
+                im.save(tmp, "WEBP", quality=self.quality, method=6)
+        os.replace(tmp, out)
+
+    def _drop_old_variants(self, current: str):
+        stem = os.path.basename(current).rsplit("-", 1)[0]
+        for old in glob.glob(os.path.join(glob.escape(self.out_dir), f"{glob.escape(stem)}-*")):
+            if old != current:
+                try:
+                    os.remove(old)
+                except OSError:
+                    pass
+
+
+if __name__ == "__main__":
+    # сборка вариантов заранее + отчёт: python images.py [pictures/*.png]
+    logging.basicConfig(level=logging.INFO)
+    optimizer = ImageOptimizer(
+        os.getenv("IMAGE_CACHE_DIR", os.path.join(os.getenv("DATA_DIR", "data"), "images")),
+        max_side=int(os.getenv("IMAGE_MAX_SIDE", str(TELEGRAM_PHOTO_SIDE))),
+        quality=int(os.getenv("IMAGE_QUALITY", "85")),
+        fmt=os.getenv("IMAGE_FORMAT", "jpeg").strip().lower(),
+    )
+    optimizer.prepare(sys.argv[1:] or sorted(glob.glob("pictures/*.png")))
+    print("\n".join(optimizer.report()))
@@ -0,0 +1,162 @@
+import sys
+import json
+import time
+import queue
+import atexit
+import logging
+import contextvars
+from datetime import datetime, timezone
+from logging.handlers import QueueHandler, QueueListener
+from typing import Any, Awaitable, Callable
+
+from aiogram import BaseMiddleware
+
+# Поля текущего апдейта (user_id, handler), которые попадают в каждую запись
+_context: contextvars.ContextVar[dict] = contextvars.ContextVar("log_context", default={})
+
+# атрибуты LogRecord, которые не считаем пользовательскими полями из extra=
+_STANDARD_ATTRS = set(vars(logging.LogRecord("", 0, "", 0, "", None, None))) | {"message", "asctime"}
+
+
+class RateLimitFilter(logging.Filter):
+    """
+    INFO и ниже: не больше `rate` записей в секунду на шаблон сообщения (+ burst),
+    лишние отбрасываются и учитываются в поле suppressed следующей пропущенной записи.
+    WARNING и выше проходят всегда.
+    """
+
+    def __init__(self, rate: float = 1.0, burst: float = 5.0):
+        super().__init__()
+        self.rate = rate
+        self.burst = burst
+        # (logger, шаблон) -> [tokens, updated, suppressed]
+        self._buckets: dict[tuple[str, str], list] = {}
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if record.levelno >= logging.WARNING or self.rate <= 0:
+            return True
+        key = (record.name, str(record.msg))
+        now = time.monotonic()
+        b = self._buckets.get(key)
+        if b is None:
+            if len(self._buckets) > 10_000:
+                self._buckets.clear()
+            b = self._buckets[key] = [self.burst, now, 0]
+        b[0] = min(self.burst, b[0] + (now - b[1]) * self.rate)
+        b[1] = now
+        if b[0] < 1.0:
+            b[2] += 1
+            return False
+        b[0] -= 1.0
+        if b[2]:
+            record.suppressed = b[2]
+            b[2] = 0
+        return True
+
+
+class _ContextQueueHandler(QueueHandler):
+    """
+    Всё, что зависит от вызывающего (текст, traceback, контекст апдейта), собираем
+    здесь, в потоке event loop; форматирование и запись — в потоке QueueListener.
+    """
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        record.message = record.getMessage()
+        record.msg = record.message
+        record.args = None
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        for k, v in _context.get().items():
+            if not hasattr(record, k):
+                setattr(record, k, v)
+        return record
+
+
+class JsonFormatter(logging.Formatter):
+    """Одна JSON-строка на запись: ts, level, logger, msg + поля из extra= и контекста апдейта."""
+
+    def format(self, record: logging.LogRecord) -> str:
+        data = {
+            "ts": datetime.fromtimestamp(record.created, timezone.utc).isoformat(timespec="milliseconds"),
+            "level": record.levelname,
+            "logger": record.name,
+            "msg": record.getMessage(),
+        }
+        for k, v in vars(record).items():
+            if k not in _STANDARD_ATTRS and not k.startswith("_"):
+                data[k] = v
+        if record.exc_text:
+            data["exc"] = record.exc_text
+        return json.dumps(data, ensure_ascii=False, default=str)
+
+
+class PlainFormatter(logging.Formatter):
+    def __init__(self):
+        super().__init__("%(asctime)s | %(levelname)s | %(name)s | %(message)s")
+
+    def format(self, record: logging.LogRecord) -> str:
+        line = super().format(record)
+        suppressed = getattr(record, "suppressed", 0)
+        return f"{line} (+{suppressed} suppressed)" if suppressed else line
+
+
+def setup_logging(
+    *,
+    level: str = "INFO",
+    fmt: str = "json",
+    info_rate: float = 1.0,
+    info_burst: float = 5.0,
+) -> QueueListener:
+    """
+    Корневой логгер пишет только в очередь; в stderr пишет фоновый поток QueueListener,
+    так что медленный stdout хоста не тормозит хендлеры.
+    """
+    q: queue.SimpleQueue = queue.SimpleQueue()
+    queue_handler = _ContextQueueHandler(q)
+    queue_handler.addFilter(RateLimitFilter(info_rate, info_burst))
+
+    stream = logging.StreamHandler(sys.stderr)
+    stream.setFormatter(JsonFormatter() if fmt == "json" else PlainFormatter())
+
+    root = logging.getLogger()
+    for h in list(root.handlers):
+        root.removeHandler(h)
+    root.addHandler(queue_handler)
+    root.setLevel(level)
+
+    listener = QueueListener(q, stream, respect_handler_level=True)
+    listener.start()
+    # дописать хвост очереди при выходе
+    atexit.register(listener.stop)
+    return listener
+
+
+class LogContextMiddleware(BaseMiddleware):
+    """
+    Inner-middleware: user_id и имя хендлера во всех записях, сделанных при обработке апдейта.
+    label_fn — как в HandlerMetricsMiddleware, уточняет имя общего хендлера.
+    """
+
+    def __init__(self, label_fn: Callable[[Any, str], str] | None = None):
+        self.label_fn = label_fn
+
+    async def __call__(
+        self,
+        handler: Callable[[Any, dict], Awaitable[Any]],
+        event: Any,
+        data: dict,
+    ) -> Any:
+        user = data.get("event_from_user")
+        handler_obj = data.get("handler")
+        name = getattr(getattr(handler_obj, "callback", None), "__name__", "unknown")
+        if self.label_fn is not None:
+            name = self.label_fn(event, name)
+        fields = {"handler": name}
+        if user is not None:
+            fields["user_id"] = user.id
+        token = _context.set(fields)
+        try:
+            return await handler(event, data)
+        finally:
+            _context.reset(token)
@@ -0,0 +1,95 @@
+import os
+import json
+import hashlib
+import logging
+
+log = logging.getLogger("bot.media")
+
+
+class MediaRegistry:
+    """
+    Кэш Telegram file_id для картинок из pictures/.
+    Каждая картинка загружается один раз, дальше отправляем по file_id.
+    Ключ — путь + sha256 содержимого: изменённый файл будет загружен заново.
+    """
+
+    def __init__(self, store_path: str):
+        self.store_path = store_path
+        self._file_ids: dict[str, str] = {}
+        # path -> (mtime_ns, size, digest), чтобы не хешировать файл на каждый тап
+        self._digests: dict[str, tuple[int, int, str]] = {}
+        self._load()
+
+    def _load(self):
+        try:
+            with open(self.store_path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+            self._file_ids = {str(k): str(v) for k, v in (data or {}).items()}
+        except FileNotFoundError:
+            self._file_ids = {}
+        except Exception as e:
+            log.warning("Media cache unreadable, starting empty: %r", e)
+            self._file_ids = {}
+
+    def _save(self):
+        try:
+            os.makedirs(os.path.dirname(self.store_path) or ".", exist_ok=True)
+            tmp = f"{self.store_path}.tmp"
+            with open(tmp, "w", encoding="utf-8") as f:
+                json.dump(self._file_ids, f, ensure_ascii=False, indent=1)
+            os.replace(tmp, self.store_path)
+        except Exception as e:
+            log.warning("Media cache save failed: %r", e)
+
+    def _digest(self, path: str) -> str:
+        st = os.stat(path)
+        cached = self._digests.get(path)
+        if cached and cached[0] == st.st_mtime_ns and cached[1] == st.st_size:
+            return cached[2]
+        h = hashlib.sha256()
+        with open(path, "rb") as f:
+            for chunk in iter(lambda: f.read(1 << 16), b""):
+                h.update(chunk)
+        digest = h.hexdigest()
+        self._digests[path] = (st.st_mtime_ns, st.st_size, digest)
+        return digest
+
+    def dump_state(self) -> dict:
+        """Хеши картинок (file_id уже лежат в store_path): первый тап после рестарта не читает файл."""
+        return {path: list(v) for path, v in self._digests.items()}
+
+    def load_state(self, state: dict):
+        # mtime/size сверяются в _digest, так что изменённый за время простоя файл перехешируется
+        for path, (mtime_ns, size, digest) in state.items():
+            self._digests.setdefault(path, (int(mtime_ns), int(size), str(digest)))
+
+    def key(self, path: str) -> str:
+        return f"{path}:{self._digest(path)}"
+
+    def get(self, path: str) -> str | None:
+        try:
+            return self._file_ids.get(self.key(path))
+        except OSError:
+            return None
+
+    def put(self, path: str, file_id: str):
+        try:
+            key = self.key(path)
+        except OSError:
+            return
+        # старые версии той же картинки больше не нужны
+        prefix = f"{path}:"
+        for k in [k for k in self._file_ids if k.startswith(prefix) and k != key]:
+            del self._file_ids[k]
+        if self._file_ids.get(key) == file_id:
+            return
+        self._file_ids[key] = file_id
+        self._save()
+
+    def forget(self, path: str):
+        prefix = f"{path}:"
+        stale = [k for k in self._file_ids if k.startswith(prefix)]
+        for k in stale:
+            del self._file_ids[k]
+        if stale:
+            self._save()
@@ -0,0 +1,249 @@
+import re
+import hmac
+import ipaddress
+import time
+import bisect
+from typing import Any, Awaitable, Callable
+
+from aiogram import BaseMiddleware
+from aiogram.client.session.middlewares.base import BaseRequestMiddleware
+from aiogram.exceptions import TelegramRetryAfter
+from aiohttp import web
+
+# секунды: от быстрых кэш-хитов до Notion-таймаутов
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+_NAME_RE = re.compile(r"[^a-zA-Z0-9_]")
+
+
+def _escape(value: str) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _labels(names: tuple[str, ...], values: tuple, extra: str = "") -> str:
+    parts = [f'{n}="{_escape(v)}"' for n, v in zip(names, values)]
+    if extra:
+        parts.append(extra)
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+
+def _fmt(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Counter:
+    def __init__(self, name: str, help_text: str, labelnames: tuple[str, ...] = ()):
+        self.name = name
+        self.help = help_text
+        self.labelnames = labelnames
+        self._values: dict[tuple, float] = {}
+
+    def inc(self, amount: float = 1.0, **labels):
+        key = tuple(str(labels.get(n, "")) for n in self.labelnames)
+        self._values[key] = self._values.get(key, 0.0) + amount
+
+    def render(self) -> list[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} counter"]
+        for key, value in sorted(self._values.items()):
+            lines.append(f"{self.name}_total{_labels(self.labelnames, key)} {_fmt(value)}")
+        return lines
+
+
+class Histogram:
+    """
+    Prometheus-гистограмма: кумулятивные бакеты считаются только при выдаче /metrics,
+    observe() — один bisect и два сложения.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        help_text: str,
+        labelnames: tuple[str, ...] = (),
+        buckets: tuple[float, ...] = DEFAULT_BUCKETS,
+    ):
+        self.name = name
+        self.help = help_text
+        self.labelnames = labelnames
+        self.buckets = tuple(sorted(buckets))
+        # labels -> [counts по бакетам (+Inf последним), sum]
+        self._series: dict[tuple, list] = {}
+
+    def observe(self, value: float, **labels):
+        key = tuple(str(labels.get(n, "")) for n in self.labelnames)
+        series = self._series.get(key)
+        if series is None:
+            series = self._series[key] = [[0] * (len(self.buckets) + 1), 0.0]
+        series[0][bisect.bisect_left(self.buckets, value)] += 1
+        series[1] += value
+
+    def render(self) -> list[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        for key, (counts, total) in sorted(self._series.items()):
+            acc = 0
+            for bound, count in zip(self.buckets + (float("inf"),), counts):
+                acc += count
+                le = 'le="%s"' % _fmt(bound)
+                lines.append(f"{self.name}_bucket{_labels(self.labelnames, key, le)} {acc}")
+            lines.append(f"{self.name}_sum{_labels(self.labelnames, key)} {_fmt(total)}")
+            lines.append(f"{self.name}_count{_labels(self.labelnames, key)} {acc}")
+        return lines
+
+
+class Registry:
+    """
+    Метрики процесса + снимки stats() компонентов (кэш, лимитеры, breaker), которые
+    снимаются в момент запроса /metrics и отдаются как gauge: bot_<component>_<key>.
+    """
+
+    def __init__(self):
+        self._metrics: list = []
+        self._stats: dict[str, Callable[[], dict]] = {}
+
+    def register(self, metric):
+        self._metrics.append(metric)
+        return metric
+
+    def add_stats(self, component: str, stats_fn: Callable[[], dict]):
+        self._stats[component] = stats_fn
+
+    def _render_stats(self) -> list[str]:
+        lines = []
+        for component, stats_fn in self._stats.items():
+            try:
+                stats = stats_fn()
+            except Exception:
+                continue
+            for key, value in stats.items():
+                name = _NAME_RE.sub("_", f"bot_{component}_{key}")
+                if isinstance(value, bool):
+                    value = int(value)
+                if isinstance(value, (int, float)):
+                    lines.append(f"# TYPE {name} gauge")
+                    lines.append(f"{name} {_fmt(value)}")
+                elif isinstance(value, (list, tuple)) and all(isinstance(v, (int, float)) for v in value):
+                    # очереди по полосам приоритета
+                    lines.append(f"# TYPE {name} gauge")
+                    lines.extend(f'{name}{{lane="{i}"}} {_fmt(v)}' for i, v in enumerate(value))
+                elif isinstance(value, str):
+                    # состояние (breaker closed/open/half_open) как info-метрика
+                    lines.append(f"# TYPE {name} gauge")
+                    lines.append(f'{name}{{value="{_escape(value)}"}} 1')
+        return lines
+
+    def render(self) -> str:
+        lines = []
+        for metric in self._metrics:
+            lines.extend(metric.render())
+        lines.extend(self._render_stats())
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = Registry()
+
+HANDLER_SECONDS = REGISTRY.register(Histogram(
+    "bot_handler_seconds", "Update handler latency", ("handler", "outcome"),
+))
+NOTION_REQUEST_SECONDS = REGISTRY.register(Histogram(
+    "bot_notion_request_seconds", "Single Notion HTTP call latency", ("status",),
+))
+NOTION_QUERY_ATTEMPTS = REGISTRY.register(Histogram(
+    "bot_notion_query_attempts", "Attempts per Notion query", ("outcome",), buckets=(1, 2, 3, 4, 6, 8),
+))
+TELEGRAM_REQUEST_SECONDS = REGISTRY.register(Histogram(
+    "bot_telegram_request_seconds", "Bot API call latency", ("method", "outcome"),
+))
+TELEGRAM_QUEUE_SECONDS = REGISTRY.register(Histogram(
+    "bot_telegram_queue_seconds", "Wait in the outbound queue before a Bot API call", ("priority",),
+))
+TELEGRAM_RETRY_AFTER_SECONDS = REGISTRY.register(Histogram(
+    "bot_telegram_retry_after_seconds", "Flood control waits requested by Telegram", ("method",),
+    buckets=(1, 2, 5, 10, 30, 60, 300),
+))
+UPDATES = REGISTRY.register(Counter("bot_updates", "Processed updates", ("type",)))
+UPDATE_QUEUE_SECONDS = REGISTRY.register(Histogram(
+    "bot_update_queue_seconds", "Wait of an update in the executor queue before its handler starts",
+))
+
+
+class HandlerMetricsMiddleware(BaseMiddleware):
+    """
+    Inner-middleware dispatcher'а: время хендлера по его имени.
+    label_fn позволяет уточнить имя (например, кнопка меню внутри общего хендлера текста).
+    """
+
+    def __init__(self, label_fn: Callable[[Any, str], str] | None = None):
+        self.label_fn = label_fn
+
+    async def __call__(
+        self,
+        handler: Callable[[Any, dict], Awaitable[Any]],
+        event: Any,
+        data: dict,
+    ) -> Any:
+        handler_obj = data.get("handler")
+        name = getattr(getattr(handler_obj, "callback", None), "__name__", "unknown")
+        if self.label_fn is not None:
+            name = self.label_fn(event, name)
+        UPDATES.inc(type=type(event).__name__)
+        t0 = time.perf_counter()
+        outcome = "ok"
+        try:
+            return await handler(event, data)
+        except Exception:
+            outcome = "error"
+            raise
+        finally:
+            HANDLER_SECONDS.observe(time.perf_counter() - t0, handler=name, outcome=outcome)
+
+
+class TelegramRequestMetrics(BaseRequestMiddleware):
+    """Middleware сессии aiogram: задержка каждого вызова Bot API и запрошенные Flood-паузы."""
+
+    async def __call__(self, make_request, bot, method):
+        api_method = getattr(method, "__api_method__", type(method).__name__)
+        t0 = time.perf_counter()
+        outcome = "ok"
+        try:
+            return await make_request(bot, method)
+        except TelegramRetryAfter as e:
+            outcome = "retry_after"
+            TELEGRAM_RETRY_AFTER_SECONDS.observe(float(e.retry_after), method=api_method)
+            raise
+        except Exception as e:
+            outcome = type(e).__name__
+            raise
+        finally:
+            TELEGRAM_REQUEST_SECONDS.observe(time.perf_counter() - t0, method=api_method, outcome=outcome)
+
+
+def metrics_handler(registry: Registry = REGISTRY, token: str = ""):
+    """token — если задан, нужен заголовок Authorization: Bearer <token>, иначе 401."""
+    expected = f"Bearer {token}".encode()
+
+    async def handle(request: web.Request) -> web.Response:
+        # байты: compare_digest на str с не-ASCII падает TypeError (500 вместо 401)
+        if token and not hmac.compare_digest(request.headers.get("Authorization", "").encode(), expected):
+            return web.Response(status=401)
+        return web.Response(body=registry.render().encode(), headers={"Content-Type": CONTENT_TYPE})
+
+    return handle
+
+
+def is_loopback(host: str) -> bool:
+    """Адрес слушает только локальные подключения (127.0.0.0/8, ::1, localhost)."""
+    if host.lower() == "localhost":
+        return True
+    try:
+        return ipaddress.ip_address(host).is_loopback
+    except ValueError:
+        return False
+
+
+def add_metrics_route(app: web.Application, path: str = "/metrics", registry: Registry = REGISTRY, token: str = ""):
+    app.router.add_get(path, metrics_handler(registry, token))
+
@@ -0,0 +1,640 @@
+import json
+import asyncio
+import logging
+import time
+import importlib.util
+from collections import deque
+from datetime import date, datetime
+from typing import AsyncIterator
+
+import httpx
+
+from cache import SingleFlight
+from circuit import CircuitBreaker, CircuitOpenError
+from metrics import NOTION_QUERY_ATTEMPTS, NOTION_REQUEST_SECONDS
+from ratelimit import AdaptiveRateLimiter, RateLimitExceeded
+
+log = logging.getLogger("bot")
+
+NOTION_API_BASE = "https://api.notion.com/v1"
+NOTION_VERSION = "2022-06-28"
+
+# Полосы приоритета лимитера: кабинет раньше фоновой синхронизации и отчётов
+PRIORITY_INTERACTIVE = 0
+PRIORITY_SYNC = 1
+PRIORITY_REPORT = 2
+
+
+class DeadlineExceeded(TimeoutError):
+    """Бюджет времени запроса исчерпан — дальше не ретраим."""
+
+
+def remaining(deadline: float | None) -> float | None:
+    return None if deadline is None else deadline - time.monotonic()
+
+
+class LatencyTracker:
+    """Скользящее окно задержек для квантилей (порог хеджирования)."""
+
+    def __init__(self, window: int = 200):
+        self._samples: deque[float] = deque(maxlen=window)
+
+    def __len__(self) -> int:
+        return len(self._samples)
+
+    def add(self, seconds: float):
+        self._samples.append(seconds)
+
+    def quantile(self, q: float) -> float:
+        values = sorted(self._samples)
+        return values[min(len(values) - 1, int(q * len(values)))]
+
+
+def http2_available() -> bool:
+    # httpx умеет HTTP/2 только если установлен пакет h2 (httpx[http2])
+    return importlib.util.find_spec("h2") is not None
+
+
+class NotionClient:
+    """
+    Долгоживущий клиент Notion: один httpx.AsyncClient на всё время работы бота.
+    Keep-alive пул соединений + HTTP/2 (если доступен) + заранее собранные заголовки,
+    чтобы не платить DNS/TCP/TLS на каждый тап «Личный кабинет».
+    """
+
+    def __init__(
+        self,
+        token: str,
+        database_id: str,
+        *,
+        base_url: str = NOTION_API_BASE,
+        max_connections: int = 10,
+        max_keepalive_connections: int = 5,
+        keepalive_expiry: float = 30.0,
+        timeout: httpx.Timeout | None = None,
+        http2: bool | None = None,
+        limiter: AdaptiveRateLimiter | None = None,
+        breaker: CircuitBreaker | None = None,
+        hedge_quantile: float | None = 0.9,
+        hedge_budget: float = 0.1,
+        hedge_min_samples: int = 20,
+    ):
+        self.database_id = database_id
+        self.base_url = base_url.rstrip("/")
+        self.headers = {
+            "Authorization": f"Bearer {token}",
+            "Notion-Version": NOTION_VERSION,
+            "Content-Type": "application/json",
+        }
+        self.limits = httpx.Limits(
+            max_connections=max_connections,
+            max_keepalive_connections=max_keepalive_connections,
+            keepalive_expiry=keepalive_expiry,
+        )
+        self.timeout = timeout or httpx.Timeout(30.0, connect=10.0)
+        self.http2 = http2_available() if http2 is None else http2
+        self._client: httpx.AsyncClient | None = None
+        self.singleflight = SingleFlight()
+        # Notion: в среднем ~3 запроса/сек на интеграцию
+        self.limiter = limiter or AdaptiveRateLimiter(rate=3.0, burst=3.0)
+        self.breaker = breaker or CircuitBreaker(name="notion")
+        # hedged requests: второй такой же запрос, если первый не ответил к p90;
+        # только для кабинета (PRIORITY_INTERACTIVE), не больше hedge_budget от его запросов.
+        # hedge_quantile=None — выключено. Задержки — отдельно по полосам: страница
+        # синхронизации на 100 записей и поиск одного tg_id живут в разных масштабах.
+        self.latency: dict[int, LatencyTracker] = {
+            p: LatencyTracker() for p in (PRIORITY_INTERACTIVE, PRIORITY_SYNC, PRIORITY_REPORT)
+        }
+        self.hedge_quantile = hedge_quantile
+        self.hedge_budget = hedge_budget
+        self.hedge_min_samples = hedge_min_samples
+        self.requests = 0
+        self.interactive_requests = 0
+        self.hedged = 0
+        self.hedge_wins = 0
+        # имя свойства -> id (для filter_properties); грузится один раз из схемы базы
+        self._property_ids: dict[str, str] | None = None
+        self._schema_retry_at = 0.0
+
+    def hedge_stats(self) -> dict:
+        interactive = self.latency[PRIORITY_INTERACTIVE]
+        return {
+            "requests": self.requests,
+            "interactive_requests": self.interactive_requests,
+            "hedged": self.hedged,
+            "hedge_wins": self.hedge_wins,
+            "p90_ms": int(interactive.quantile(0.9) * 1000) if len(interactive) else None,
+        }
+
+    def _latency(self, priority: int) -> LatencyTracker:
+        tracker = self.latency.get(priority)
+        if tracker is None:
+            tracker = self.latency[priority] = LatencyTracker()
+        return tracker
+
+    async def start(self):
+        if self._client is None:
+            self._client = httpx.AsyncClient(
+                base_url=self.base_url,
+                headers=self.headers,
+                limits=self.limits,
+                timeout=self.timeout,
+                http2=self.http2,
+            )
+            log.info("Notion client started (http2=%s, max_connections=%s)", self.http2, self.limits.max_connections)
+
+    async def close(self):
+        if self._client is not None:
+            client, self._client = self._client, None
+            await client.aclose()
+
+    @property
+    def client(self) -> httpx.AsyncClient:
+        if self._client is None:
+            raise RuntimeError("NotionClient is not started. Call await notion.start() first.")
+        return self._client
+
+    async def query_database(
+        self,
+        filter_obj: dict | None,
+        page_size: int = 10,
+        max_attempts: int = 4,
+        *,
+        start_cursor: str | None = None,
+        sorts: list[dict] | None = None,
+        priority: int = PRIORITY_INTERACTIVE,
+        max_wait: float | None = None,
+        deadline: float | None = None,
+        filter_properties: tuple[str, ...] | None = None,
+    ) -> dict:
+        """
+        Одинаковые одновременные запросы (тот же tg_id + фильтр) уходят в Notion один раз.
+        filter_properties — имена свойств, которые нужны в ответе (остальные Notion не пришлёт).
+        Каждая попытка проходит через общий лимитер; max_wait — сколько готовы ждать очередь
+        (иначе RateLimitExceeded).
+        deadline (time.monotonic()) — общий бюджет: после него ретраев нет, DeadlineExceeded.
+        """
+        payload = {
+            "page_size": page_size,
+            "sorts": sorts or [{"timestamp": "created_time", "direction": "descending"}],
+        }
+        if filter_obj:
+            payload["filter"] = filter_obj
+        if start_cursor:
+            payload["start_cursor"] = start_cursor
+        params = None
+        if filter_properties:
+            ids = await self.property_ids(priority, deadline=deadline)
+            if ids and all(name in ids for name in filter_properties):
+                params = [("filter_properties", ids[name]) for name in filter_properties]
+        key = json.dumps([payload, params], sort_keys=True, ensure_ascii=False)
+        shared = self.singleflight.do(
+            key,
+            lambda: self._query_database(
+                payload, max_attempts, priority=priority, max_wait=max_wait, deadline=deadline, params=params
+            ),
+        )
+        left = remaining(deadline)
+        if left is None:
+            return await shared
+        # склеенный запрос мог прийти с более длинным дедлайном — свой соблюдаем сами
+        try:
+            return await asyncio.wait_for(shared, max(left, 0.0))
+        except asyncio.TimeoutError:
+            raise DeadlineExceeded("Notion query deadline exceeded") from None
+
+    async def _query_database(
+        self,
+        payload: dict,
+        max_attempts: int = 4,
+        *,
+        priority: int = PRIORITY_INTERACTIVE,
+        max_wait: float | None = None,
+        deadline: float | None = None,
+        params: list[tuple[str, str]] | None = None,
+    ) -> dict:
+        """
+        Query Notion DB с ретраями + backoff в пределах deadline.
+        Ретраим:
+          - timeout / transport errors
+          - 429 (rate limit) — ждём паузу общего лимитера, а не каждый сам по себе
+          - 5xx
+        Пока circuit breaker открыт — сразу CircuitOpenError, без запроса.
+        """
+        if self._client is None:
+            await self.start()
+
+        path = f"/databases/{self.database_id}/query"
+
+        base_delay = 0.7
+
+        last_err = None
+        for attempt in range(1, max_attempts + 1):
+            left = remaining(deadline)
+            if left is not None and left <= 0:
+                raise DeadlineExceeded(f"Notion query deadline exceeded after {attempt - 1} attempts") from last_err
+            self.breaker.fail_fast()
+            wait_budget = max_wait
+            if left is not None:
+                wait_budget = left if max_wait is None else min(max_wait, left)
+            await self.limiter.acquire(priority, wait_budget)
+            # пробу half_open берём только с токеном на руках: отказ лимитера её не тратит
+            self.breaker.before_call()
+            t0 = time.perf_counter()
+            try:
+                r = await self._post(path, payload, params=params, priority=priority, deadline=deadline)
+
+                dt = time.perf_counter() - t0
+                dt_ms = int(dt * 1000)
+                self._latency(priority).add(dt)
+                NOTION_REQUEST_SECONDS.observe(dt, status=r.status_code)
+
+                if r.status_code == 429 or 500 <= r.status_code <= 599:
+                    retry_after = r.headers.get("Retry-After")
+                    if retry_after:
+                        sleep_s = float(retry_after)
+                    else:
+                        sleep_s = base_delay * (2 ** (attempt - 1))
+                    if r.status_code == 429:
+                        # пауза общая: следующий acquire() подождёт её вместе со всеми;
+                        # о здоровье Notion 429 ничего не говорит — проба свободна для повтора
+                        self.limiter.on_throttle(sleep_s)
+                        self.breaker.release_probe()
+                    else:
+                        self.breaker.record_failure()
+                    log.warning(
+                        "Notion query retryable status=%s (%sms) attempt=%s/%s sleep=%.2fs",
+                        r.status_code, dt_ms, attempt, max_attempts, sleep_s,
+                        extra={"status": r.status_code, "latency_ms": dt_ms, "attempt": attempt},
+                    )
+                    last_err = httpx.HTTPStatusError(
+                        f"Notion retryable status {r.status_code}", request=r.request, response=r
+                    )
+                    if r.status_code != 429:
+                        await self._backoff(sleep_s, deadline, last_err)
+                    continue
+
+                # 4xx — Notion жив, ошибка наша
+                self.breaker.record_success(dt_ms / 1000)
+                r.raise_for_status()
+
+                self.limiter.on_success()
+                NOTION_QUERY_ATTEMPTS.observe(attempt, outcome="ok")
+                log.info(
+                    "Notion query OK (%sms) attempt=%s/%s", dt_ms, attempt, max_attempts,
+                    extra={"latency_ms": dt_ms, "attempt": attempt},
+                )
+                return r.json()
+
+            except (httpx.TimeoutException, httpx.TransportError) as e:
+                last_err = e
+                self.breaker.record_failure()
+                NOTION_REQUEST_SECONDS.observe(
+                    time.perf_counter() - t0,
+                    status="timeout" if isinstance(e, httpx.TimeoutException) else "transport_error",
+                )
+                sleep_s = base_delay * (2 ** (attempt - 1))
+                log.warning("Notion query network/timeout: %r attempt=%s/%s sleep=%.2fs", e, attempt, max_attempts, sleep_s)
+                await self._backoff(sleep_s, deadline, last_err)
+            except httpx.HTTPStatusError as e:
+                last_err = e
+                NOTION_QUERY_ATTEMPTS.observe(attempt, outcome="error")
+                log.error("Notion query HTTPStatusError: %s", str(e))
+                raise
+            except DeadlineExceeded:
+                # из _backoff() после 5xx — бюджет кончился, это не «неизвестная ошибка»
+                raise
+            except Exception as e:
+                last_err = e
+                self.breaker.release_probe()
+                log.error("Notion query unknown error: %r", e)
+                raise
+
+        NOTION_QUERY_ATTEMPTS.observe(max_attempts, outcome="failed")
+        log.error("Notion query failed after %s attempts: %r", max_attempts, last_err)
+        raise last_err
+
+    async def _backoff(self, sleep_s: float, deadline: float | None, last_err: Exception | None):
+        left = remaining(deadline)
+        if left is not None and left <= sleep_s:
+            raise DeadlineExceeded("Notion query deadline exceeded during backoff") from last_err
+        await asyncio.sleep(sleep_s)
+
+    def _request_timeout(self, deadline: float | None) -> httpx.Timeout:
+        left = remaining(deadline)
+        if left is None:
+            return self.timeout
+        left = max(left, 0.001)
+        return httpx.Timeout(min(self.timeout.read or left, left), connect=min(self.timeout.connect or left, left))
+
+    async def iter_batches(
+        self,
+        filter_obj: dict | None = None,
+        *,
+        page_size: int = 100,
+        sorts: list[dict] | None = None,
+        priority: int = PRIORITY_REPORT,
+        filter_properties: tuple[str, ...] | None = None,
+        prefetch: bool = True,
+        max_stalls: int = 10,
+    ) -> AsyncIterator[list[dict]]:
+        """
+        Все результаты запроса пачками по page_size, по has_more/next_cursor.
+          - prefetch: следующая пачка запрашивается, пока вызывающий обрабатывает текущую;
+            в памяти не больше двух ответов Notion
+          - запросы идут через общий лимитер с приоритетом priority: кабинет их обгоняет
+          - переполненная очередь лимитера или открытый breaker — пауза и повтор той же
+            пачки (не больше max_stalls раз подряд), а не ошибка посреди выгрузки
+        """
+
+        async def fetch(cursor: str | None) -> dict:
+            for stall in range(max_stalls + 1):
+                try:
+                    return await self.query_database(
+                        filter_obj,
+                        page_size=page_size,
+                        start_cursor=cursor,
+                        sorts=sorts,
+                        priority=priority,
+                        filter_properties=filter_properties,
+                    )
+                except RateLimitExceeded as e:
+                    if stall == max_stalls:
+                        raise
+                    await asyncio.sleep(max(e.wait_s, 1.0))
+                except CircuitOpenError:
+                    if stall == max_stalls:
+                        raise
+                    await asyncio.sleep(self.breaker.open_seconds)
+
+        task: asyncio.Task | None = asyncio.create_task(fetch(None))
+        try:
+            while task is not None:
+                data = await task
+                task = None
+                cursor = data.get("next_cursor")
+                more = bool(data.get("has_more") and cursor)
+                if more and prefetch:
+                    task = asyncio.create_task(fetch(cursor))
+                yield data.get("results", [])
+                if more and not prefetch:
+                    task = asyncio.create_task(fetch(cursor))
+        finally:
+            # вызывающий остановился раньше (break / ошибка) — лишний запрос не нужен
+            if task is not None and not task.done():
+                task.cancel()
+                await asyncio.gather(task, return_exceptions=True)
+
+    async def iter_pages(self, filter_obj: dict | None = None, **kwargs) -> AsyncIterator[dict]:
+        """По одной странице базы; параметры — как у iter_batches."""
+        async for batch in self.iter_batches(filter_obj, **kwargs):
+            for page in batch:
+                yield page
+
+    async def property_ids(self, priority: int = PRIORITY_INTERACTIVE, *, deadline: float | None = None) -> dict[str, str]:
+        """
+        name -> property id из схемы базы (GET /databases/{id}), кэшируется навсегда.
+        Одновременные вызовы ждут один GET; каждый — не дольше своего deadline.
+        Если схема недоступна — {} (запросы пойдут без filter_properties), повтор через 5 минут.
+        """
+        if self._property_ids is not None:
+            return self._property_ids
+        # только при закрытом breaker: allow() в half_open занял бы единственную пробу,
+        # и настоящий запрос получил бы CircuitOpenError
+        if time.monotonic() < self._schema_retry_at or self.breaker.state != CircuitBreaker.CLOSED:
+            return {}
+        shared = self.singleflight.do("schema", lambda: self._fetch_schema(priority, deadline))
+        left = remaining(deadline)
+        if left is None:
+            return await shared
+        try:
+            return await asyncio.wait_for(shared, max(left, 0.0))
+        except asyncio.TimeoutError:
+            return {}
+
+    async def _fetch_schema(self, priority: int, deadline: float | None) -> dict[str, str]:
+        if self._client is None:
+            await self.start()
+        try:
+            await self.limiter.acquire(priority, max_wait=remaining(deadline))
+            r = await self.client.get(f"/databases/{self.database_id}", timeout=self._request_timeout(deadline))
+            r.raise_for_status()
+            props = r.json().get("properties", {})
+            self._property_ids = {name: p["id"] for name, p in props.items() if p.get("id")}
+            return self._property_ids
+        except (RateLimitExceeded, httpx.TimeoutException) as e:
+            # очередь или таймаут под чужим дедлайном — со схемой всё в порядке, следующий вызов попробует снова
+            log.debug("Notion schema fetch skipped: %r", e)
+            return {}
+        except (httpx.HTTPError, ValueError, TypeError, AttributeError, KeyError) as e:
+            self._schema_retry_at = time.monotonic() + 300
+            log.warning("Notion schema unavailable, querying without filter_properties: %r", e)
+            return {}
+
+    async def _post(
+        self,
+        path: str,
+        payload: dict,
+        *,
+        params: list[tuple[str, str]] | None,
+        priority: int,
+        deadline: float | None,
+    ) -> httpx.Response:
+        """
+        POST с опциональным хеджированием (только PRIORITY_INTERACTIVE): если ответа нет
+        к p90 задержки кабинетных запросов, отправляем такой же второй запрос и берём тот,
+        что ответит первым. Фоновые страницы не хеджируются — им не нужна скорость,
+        а дубли съедали бы общий лимит Notion.
+        """
+        self.requests += 1
+        timeout = self._request_timeout(deadline)
+        if priority != PRIORITY_INTERACTIVE:
+            return await self.client.post(path, json=payload, params=params, timeout=timeout)
+        self.interactive_requests += 1
+        latency = self.latency[PRIORITY_INTERACTIVE]
+        if self.hedge_quantile is None or len(latency) < self.hedge_min_samples:
+            return await self.client.post(path, json=payload, params=params, timeout=timeout)
+
+        primary = asyncio.ensure_future(self.client.post(path, json=payload, params=params, timeout=timeout))
+        hedge = None
+        try:
+            done, _ = await asyncio.wait({primary}, timeout=latency.quantile(self.hedge_quantile))
+            if done or self.hedged >= self.hedge_budget * self.interactive_requests:
+                return await primary
+            try:
+                # на хедж не ждём очередь: нет свободного токена — просто ждём первый
+                await self.limiter.acquire(priority, max_wait=0)
+            except RateLimitExceeded:
+                return await primary
+            self.hedged += 1
+            self.requests += 1
+            self.interactive_requests += 1
+            hedge = asyncio.ensure_future(
+                self.client.post(path, json=payload, params=params, timeout=self._request_timeout(deadline))
+            )
+            done, pending = await asyncio.wait({primary, hedge}, return_when=asyncio.FIRST_COMPLETED)
+            ok = [t for t in done if t.exception() is None]
+            if ok:
+                winner = ok[0]
+            elif pending:
+                # первый упал — ждём второго
+                winner = pending.pop()
+                await asyncio.wait({winner})
+            else:
+                winner = done.pop()
+            if winner is hedge:
+                self.hedge_wins += 1
+            return winner.result()
+        finally:
+            for task in (primary, hedge):
+                if task is not None and not task.done():
+                    task.cancel()
+
+
+# =========================
+# PAGE PROPERTIES
+# =========================
+
+def rt_plain(props: dict, prop_name: str) -> str:
+    p = (props or {}).get(prop_name)
+    if not p:
+        return ""
+    if p.get("type") != "rich_text":
+        return ""
+    arr = p.get("rich_text") or []
+    if not arr:
+        return ""
+    return arr[0].get("plain_text", "") or ""
+
+
+def _scalar(value) -> str:
+    if value is None:
+        return ""
+    if isinstance(value, float) and value.is_integer():
+        value = int(value)
+    if isinstance(value, dict):
+        # date: {"start": ..., "end": ...}
+        value = value.get("start") or ""
+    return str(value)
+
+
+def prop_plain(props: dict, prop_name: str) -> str:
+    """
+    Значение свойства строкой независимо от типа колонки: rich_text/title, number,
+    formula (string/number/date), select, date. Для остальных типов — "".
+    """
+    p = (props or {}).get(prop_name)
+    if not p:
+        return ""
+    t = p.get("type")
+    if t == "rich_text":
+        return rt_plain(props, prop_name)
+    if t == "title":
+        arr = p.get("title") or []
+        return arr[0].get("plain_text", "") or "" if arr else ""
+    if t == "number":
+        return _scalar(p.get("number"))
+    if t == "formula":
+        f = p.get("formula") or {}
+        return _scalar(f.get(f.get("type")))
+    if t == "select":
+        return (p.get("select") or {}).get("name") or ""
+    if t == "date":
+        return _scalar(p.get("date"))
+    return ""
+
+
+def status_name(props: dict, prop_name: str = "status") -> str:
+    p = (props or {}).get(prop_name)
+    if not p:
+        return ""
+    t = p.get("type")
+    if t == "status":
+        s = p.get("status") or {}
+        return (s.get("name") or "").strip().lower()
+    if t == "rich_text":
+        return (rt_plain(props, prop_name) or "").strip().lower()
+    if t == "select":
+        s = p.get("select") or {}
+        return (s.get("name") or "").strip().lower()
+    return ""
+
+
+def parse_date(value: str) -> date | None:
+    if not value:
+        return None
+    try:
+        return datetime.strptime(value.strip()[:10], "%Y-%m-%d").date()
+    except Exception:
+        return None
+
+
+# Свойства, которые реально читает кабинет (для filter_properties)
+CABINET_PROPERTIES = ("status", "discord", "email", "expires_at")
+SYNC_PROPERTIES = ("tg_id",) + CABINET_PROPERTIES
+
+
+class CabinetRecord:
+    """
+    Компактная запись кабинета вместо полного JSON страницы Notion.
+    expires_at уже распарсен в date.
+    """
+
+    __slots__ = ("tg_id", "status", "discord", "email", "expires_at", "created_time", "last_edited_time")
+
+    def __init__(
+        self,
+        tg_id: str = "",
+        status: str = "",
+        discord: str = "",
+        email: str = "",
+        expires_at: date | None = None,
+        created_time: str = "",
+        last_edited_time: str = "",
+    ):
+        self.tg_id = tg_id
+        self.status = status
+        self.discord = discord
+        self.email = email
+        self.expires_at = expires_at
+        self.created_time = created_time
+        self.last_edited_time = last_edited_time
+
+    def __repr__(self) -> str:
+        return f"CabinetRecord(tg_id={self.tg_id!r}, status={self.status!r}, expires_at={self.expires_at})"
+
+    @classmethod
+    def from_page(cls, page: dict) -> "CabinetRecord":
+        props = page.get("properties", {})
+        return cls(
+            tg_id=rt_plain(props, "tg_id").strip(),
+            status=status_name(props, "status"),
+            discord=rt_plain(props, "discord"),
+            email=rt_plain(props, "email"),
+            expires_at=parse_date(rt_plain(props, "expires_at")),
+            created_time=page.get("created_time", "") or "",
+            last_edited_time=page.get("last_edited_time", "") or "",
+        )
+
+    def as_dict(self) -> dict:
+        return {
+            "tg_id": self.tg_id,
+            "status": self.status,
+            "discord": self.discord,
+            "email": self.email,
+            "expires_at": self.expires_at.isoformat() if self.expires_at else "",
+            "created_time": self.created_time,
+            "last_edited_time": self.last_edited_time,
+        }
+
+    @classmethod
+    def from_dict(cls, data: dict) -> "CabinetRecord":
+        return cls(
+            tg_id=data.get("tg_id", ""),
+            status=data.get("status", ""),
+            discord=data.get("discord", ""),
+            email=data.get("email", ""),
+            expires_at=parse_date(data.get("expires_at", "")),
+            created_time=data.get("created_time", ""),
+            last_edited_time=data.get("last_edited_time", ""),
+        )
@@ -0,0 +1,175 @@
+import os
+import hmac
+import time
+import base64
+import hashlib
+import logging
+import secrets
+import sqlite3
+
+log = logging.getLogger("bot")
+
+# длина HMAC-подписи в токене (байт): 8 байт = 11 символов base64url
+TAG_BYTES = 8
+
+
+def _b64(data: bytes) -> str:
+    return base64.urlsafe_b64encode(data).rstrip(b"=").decode()
+
+
+class Order:
+    """Строка журнала заказов."""
+
+    __slots__ = (
+        "order_id", "tg_id", "tg_username", "product", "period_key", "period_text",
+        "pay_method", "currency", "amount", "expires_at", "created_at",
+    )
+
+    def __init__(
+        self,
+        order_id: str,
+        tg_id: int,
+        tg_username: str = "",
+        product: str = "",
+        period_key: str = "",
+        period_text: str = "",
+        pay_method: str = "",
+        currency: str = "",
+        amount: int = 0,
+        expires_at: str = "",
+        created_at: float = 0.0,
+    ):
+        self.order_id = order_id
+        self.tg_id = tg_id
+        self.tg_username = tg_username
+        self.product = product
+        self.period_key = period_key
+        self.period_text = period_text
+        self.pay_method = pay_method
+        self.currency = currency
+        self.amount = amount
+        self.expires_at = expires_at
+        self.created_at = created_at
+
+    def __repr__(self) -> str:
+        return f"Order(order_id={self.order_id!r}, tg_id={self.tg_id}, product={self.product!r}, amount={self.amount} {self.currency})"
+
+
+class OrderLedger:
+    """
+    Журнал сгенерированных заказов в SQLite (WAL), только INSERT.
+    В Tally уходит короткий токен <order_id>.<hmac>: по нему заказ находится локально,
+    а подделанный или чужой токен не проходит проверку подписи.
+    """
+
+    _COLUMNS = (
+        "order_id, tg_id, tg_username, product, period_key, period_text, "
+        "pay_method, currency, amount, expires_at, created_at"
+    )
+
+    def __init__(self, path: str, secret: bytes):
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self.path = path
+        self.secret = secret
+        self.db = sqlite3.connect(path, check_same_thread=False)
+        self.db.execute("PRAGMA journal_mode=WAL")
+        self.db.execute("PRAGMA synchronous=NORMAL")
+        self.db.execute(
+            """
+            CREATE TABLE IF NOT EXISTS orders (
+                order_id TEXT PRIMARY KEY,
+                tg_id INTEGER NOT NULL,
+                tg_username TEXT NOT NULL DEFAULT '',
+                product TEXT NOT NULL DEFAULT '',
+                period_key TEXT NOT NULL DEFAULT '',
+                period_text TEXT NOT NULL DEFAULT '',
+                pay_method TEXT NOT NULL DEFAULT '',
+                currency TEXT NOT NULL DEFAULT '',
+                amount INTEGER NOT NULL DEFAULT 0,
+                expires_at TEXT NOT NULL DEFAULT '',
+                created_at REAL NOT NULL
+            )
+            """
+        )
+        self.db.execute("CREATE INDEX IF NOT EXISTS orders_by_user ON orders (tg_id, created_at)")
+        self.created = 0
+
+    def close(self):
+        self.db.close()
+
+    def stats(self) -> dict:
+        return {"orders": self.count(), "created": self.created}
+
+    # --- токены ---
+
+    def _tag(self, order_id: str) -> str:
+        return _b64(hmac.new(self.secret, order_id.encode(), hashlib.sha256).digest()[:TAG_BYTES])
+
+    def token(self, order_id: str) -> str:
+        return f"{order_id}.{self._tag(order_id)}"
+
+    def verify(self, token: str) -> str | None:
+        """order_id из токена или None, если подпись не сходится."""
+        order_id, _, tag = (token or "").strip().partition(".")
+        # токен приходит из Tally/Notion и правится руками: сравниваем байты,
+        # compare_digest на str с не-ASCII падает TypeError
+        if not order_id or not tag or not hmac.compare_digest(tag.encode(), self._tag(order_id).encode()):
+            return None
+        return order_id
+
+    # --- журнал ---
+
+    def create(
+        self,
+        tg_id: int,
+        *,
+        tg_username: str = "",
+        product: str = "",
+        period_key: str = "",
+        period_text: str = "",
+        pay_method: str = "",
+        currency: str = "",
+        amount: int = 0,
+        expires_at: str = "",
+    ) -> Order:
+        order = Order(
+            # 9 случайных байт = 12 символов: коротко, но не перебирается
+            order_id=_b64(secrets.token_bytes(9)),
+            tg_id=int(tg_id),
+            tg_username=tg_username or "",
+            product=product,
+            period_key=period_key,
+            period_text=period_text,
+            pay_method=pay_method,
+            currency=currency,
+            amount=int(amount),
+            expires_at=expires_at,
+            created_at=time.time(),
+        )
+        with self.db:
+            self.db.execute(
+                f"INSERT INTO orders ({self._COLUMNS}) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                tuple(getattr(order, name) for name in Order.__slots__),
+            )
+        self.created += 1
+        return order
+
+    def get(self, order_id: str) -> Order | None:
+        row = self.db.execute(f"SELECT {self._COLUMNS} FROM orders WHERE order_id = ?", (order_id,)).fetchone()
+        return Order(*row) if row else None
+
+    def resolve(self, token: str) -> Order | None:
+        order_id = self.verify(token)
+        return self.get(order_id) if order_id else None
+
+    def latest_for(self, tg_id: int, *, since: float = 0.0, before: float | None = None) -> Order | None:
+        """Последний заказ пользователя в [since, before)."""
+        row = self.db.execute(
+            f"SELECT {self._COLUMNS} FROM orders WHERE tg_id = ? AND created_at >= ? AND created_at < ? "
+            "ORDER BY created_at DESC LIMIT 1",
+            (int(tg_id), since, float("inf") if before is None else before),
+        ).fetchone()
+        return Order(*row) if row else None
+
+    def count(self) -> int:
+        return self.db.execute("SELECT COUNT(*) FROM orders").fetchone()[0]
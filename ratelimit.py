@@ -0,0 +1,186 @@
+import asyncio
+import time
+from collections import deque
+
+
+class TokenBucket:
+    """
+    Классический token bucket: rate токенов в секунду, не больше capacity в запасе.
+    """
+
+    __slots__ = ("rate", "capacity", "tokens", "updated")
+
+    def __init__(self, rate: float, capacity: float):
+        self.rate = float(rate)
+        self.capacity = float(capacity)
+        self.tokens = float(capacity)
+        self.updated = time.monotonic()
+
+    def _refill(self, now: float):
+        if now > self.updated:
+            self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+
+    def delay(self, now: float | None = None) -> float:
+        """Через сколько секунд будет доступен один токен (0 — уже есть)."""
+        now = time.monotonic() if now is None else now
+        self._refill(now)
+        if self.tokens >= 1.0:
+            return 0.0
+        return (1.0 - self.tokens) / self.rate
+
+    def consume(self, now: float | None = None):
+        now = time.monotonic() if now is None else now
+        self._refill(now)
+        self.tokens -= 1.0
+
+    def set_rate(self, rate: float, now: float | None = None):
+        now = time.monotonic() if now is None else now
+        self._refill(now)
+        self.rate = float(rate)
+
+    def is_full(self, now: float | None = None) -> bool:
+        now = time.monotonic() if now is None else now
+        self._refill(now)
+        return self.tokens >= self.capacity
+
+    async def acquire(self):
+        while True:
+            wait_s = self.delay()
+            if wait_s <= 0:
+                self.consume()
+                return
+            await asyncio.sleep(wait_s)
+
+
+class RateLimitExceeded(Exception):
+    """Ожидание в очереди дольше, чем готов ждать вызывающий (или очередь переполнена)."""
+
+    def __init__(self, wait_s: float):
+        super().__init__(f"rate limit queue wait {wait_s:.2f}s")
+        self.wait_s = wait_s
+
+
+class AdaptiveRateLimiter:
+    """
+    Общий лимитер для внешнего API с полосами приоритета (0 — самый срочный).
+      - token bucket на rate запросов/сек
+      - 429 / Retry-After: пауза для всех + rate * 0.5 (не ниже min_rate)
+      - успешные ответы понемногу возвращают rate к max_rate (AIMD)
+      - если ожидаемое ожидание > max_wait или очередь полна — сразу RateLimitExceeded
+    """
+
+    def __init__(
+        self,
+        *,
+        rate: float = 3.0,
+        burst: float = 3.0,
+        min_rate: float = 0.3,
+        increase_step: float = 0.05,
+        max_queue: int = 200,
+        lanes: int = 3,
+    ):
+        self.max_rate = float(rate)
+        self.min_rate = float(min_rate)
+        self.increase_step = float(increase_step)
+        self.max_queue = max_queue
+        self.bucket = TokenBucket(rate, burst)
+        self._queues: list[deque] = [deque() for _ in range(lanes)]
+        self._paused_until = 0.0
+        self._pump: asyncio.Task | None = None
+        self.granted = 0
+        self.rejected = 0
+        self.throttled = 0
+
+    def stats(self) -> dict:
+        return {
+            "rate": round(self.bucket.rate, 3),
+            "queued": [len(q) for q in self._queues],
+            "paused_for": round(max(0.0, self._paused_until - time.monotonic()), 2),
+            "granted": self.granted,
+            "rejected": self.rejected,
+            "throttled": self.throttled,
+        }
+
+    def dump_state(self) -> dict:
+        """Текущий rate после AIMD и пауза по Retry-After (в wall-clock) — для снапшота."""
+        return {
+            "rate": self.bucket.rate,
+            "paused_until": time.time() + max(0.0, self._paused_until - time.monotonic()),
+        }
+
+    def load_state(self, state: dict):
+        rate = float(state.get("rate", self.max_rate))
+        self.bucket.set_rate(min(self.max_rate, max(self.min_rate, rate)))
+        pause = float(state.get("paused_until", 0.0)) - time.time()
+        if pause > 0:
+            self._paused_until = max(self._paused_until, time.monotonic() + pause)
+
+    def estimate_wait(self, priority: int) -> float:
+        now = time.monotonic()
+        ahead = sum(len(q) for q in self._queues[: priority + 1])
+        pause = max(0.0, self._paused_until - now)
+        self.bucket._refill(now)
+        missing = ahead + 1 - self.bucket.tokens
+        return pause + max(0.0, missing) / self.bucket.rate
+
+    async def acquire(self, priority: int = 0, max_wait: float | None = None):
+        priority = min(max(priority, 0), len(self._queues) - 1)
+        now = time.monotonic()
+        if not any(self._queues) and now >= self._paused_until and self.bucket.delay(now) <= 0:
+            self.bucket.consume(now)
+            self.granted += 1
+            return
+
+        wait_s = self.estimate_wait(priority)
+        if (max_wait is not None and wait_s > max_wait) or sum(len(q) for q in self._queues) >= self.max_queue:
+            self.rejected += 1
+            raise RateLimitExceeded(wait_s)
+
+        fut = asyncio.get_running_loop().create_future()
+        self._queues[priority].append(fut)
+        if self._pump is None or self._pump.done():
+            self._pump = asyncio.create_task(self._run())
+        try:
+            await fut
+        except asyncio.CancelledError:
+            try:
+                self._queues[priority].remove(fut)
+            except ValueError:
+                pass
+            raise
+
+    def on_success(self):
+        if self.bucket.rate < self.max_rate:
+            self.bucket.set_rate(min(self.max_rate, self.bucket.rate + self.increase_step))
+
+    def on_throttle(self, retry_after: float | None = None):
+        self.throttled += 1
+        self.bucket.set_rate(max(self.min_rate, self.bucket.rate * 0.5))
+        if retry_after:
+            self._paused_until = max(self._paused_until, time.monotonic() + retry_after)
+
+    def _next_waiter(self) -> asyncio.Future | None:
+        for q in self._queues:
+            while q:
+                fut = q.popleft()
+                if not fut.done():
+                    return fut
+        return None
+
+    async def _run(self):
+        while any(self._queues):
+            now = time.monotonic()
+            if now < self._paused_until:
+                await asyncio.sleep(self._paused_until - now)
+                continue
+            d = self.bucket.delay(now)
+            if d > 0:
+                await asyncio.sleep(d)
+                continue
+            fut = self._next_waiter()
+            if fut is None:
+                break
+            self.bucket.consume(now)
+            self.granted += 1
+            fut.set_result(None)
@@ -0,0 +1,219 @@
+import os
+import csv
+import json
+import logging
+from datetime import date
+from typing import AsyncIterator, Callable
+
+from notion import PRIORITY_REPORT, NotionClient, parse_date, prop_plain, status_name
+from orders import Order
+
+log = logging.getLogger("bot")
+
+# Свойства базы заявок, которые нужны отчёту и выгрузке (для filter_properties).
+# Суммы и order_id приходят из скрытых полей Tally; колонки могут быть текстом,
+# числом или формулой. Каких нет в схеме — см. missing_report_properties()
+REPORT_PROPERTIES = ("tg_id", "status", "expires_at", "period_key", "amount_usdt", "amount_uah", "order_id")
+
+# Заявки пользователя идут подряд, последняя — первой: «текущая» заявка пользователя
+# определяется без словаря на всю базу
+REPORT_SORTS = [
+    {"property": "tg_id", "direction": "ascending"},
+    {"timestamp": "created_time", "direction": "descending"},
+]
+
+EXPORT_FORMATS = ("csv", "jsonl")
+
+
+def _amount(value: str) -> int:
+    try:
+        return int(float(value.replace(" ", "").replace(",", ".")))
+    except ValueError:
+        return 0
+
+
+class ReportRow:
+    """Одна заявка из Notion в объёме, нужном отчёту."""
+
+    __slots__ = ("tg_id", "status", "expires_at", "period_key", "currency", "amount", "created_time")
+
+    def __init__(
+        self,
+        tg_id: str = "",
+        status: str = "",
+        expires_at: date | None = None,
+        period_key: str = "",
+        currency: str = "",
+        amount: int = 0,
+        created_time: str = "",
+    ):
+        self.tg_id = tg_id
+        self.status = status
+        self.expires_at = expires_at
+        self.period_key = period_key
+        self.currency = currency
+        self.amount = amount
+        self.created_time = created_time
+
+    @classmethod
+    def from_page(cls, page: dict, resolve_order: Callable[[str], Order | None] | None = None) -> "ReportRow":
+        props = page.get("properties", {})
+        row = cls(
+            tg_id=prop_plain(props, "tg_id").strip(),
+            status=status_name(props, "status"),
+            expires_at=parse_date(prop_plain(props, "expires_at")),
+            period_key=prop_plain(props, "period_key").strip(),
+            created_time=page.get("created_time", "") or "",
+        )
+        usdt = _amount(prop_plain(props, "amount_usdt"))
+        uah = _amount(prop_plain(props, "amount_uah"))
+        if usdt:
+            row.currency, row.amount = "USDT", usdt
+        elif uah:
+            row.currency, row.amount = "UAH", uah
+        elif resolve_order is not None:
+            # компактная ссылка Tally: сумма и период — в журнале заказов по токену.
+            # order_id в Notion правится руками: сбой поиска — строка остаётся с полями из Notion
+            token = prop_plain(props, "order_id").strip()
+            try:
+                order = resolve_order(token)
+            except Exception as e:
+                log.warning(
+                    "Report row order lookup failed",
+                    extra={"tg_id": row.tg_id, "order_id": token, "page_id": page.get("id", ""), "error": repr(e)},
+                )
+                order = None
+            if order is not None:
+                row.currency, row.amount = order.currency, order.amount
+                row.period_key = row.period_key or order.period_key
+        return row
+
+    def as_dict(self) -> dict:
+        return {
+            "tg_id": self.tg_id,
+            "status": self.status,
+            "expires_at": self.expires_at.isoformat() if self.expires_at else "",
+            "period_key": self.period_key,
+            "currency": self.currency,
+            "amount": self.amount,
+            "created_time": self.created_time,
+        }
+
+
+async def iter_report_rows(
+    notion: NotionClient,
+    resolve_order: Callable[[str], Order | None] | None = None,
+    *,
+    page_size: int = 100,
+) -> AsyncIterator[ReportRow]:
+    """Все заявки базы потоком (tg_id по возрастанию, новые заявки пользователя первыми)."""
+    async for page in notion.iter_pages(
+        None,
+        page_size=page_size,
+        sorts=REPORT_SORTS,
+        priority=PRIORITY_REPORT,
+        filter_properties=REPORT_PROPERTIES,
+    ):
+        try:
+            row = ReportRow.from_page(page, resolve_order)
+        except Exception as e:
+            # одна битая страница не должна обрывать весь /report или /export
+            log.warning("Report row skipped", extra={"page_id": page.get("id", ""), "error": repr(e)})
+            continue
+        yield row
+
+
+async def missing_report_properties(notion: NotionClient) -> list[str]:
+    """
+    Свойства REPORT_PROPERTIES, которых нет в схеме базы: без них суммы в отчёте
+    молча были бы нулями. [] — если схема сейчас недоступна (проверить нечем).
+    """
+    ids = await notion.property_ids(PRIORITY_REPORT)
+    if not ids:
+        return []
+    return [name for name in REPORT_PROPERTIES if name not in ids]
+
+
+class SubscriberReport:
+    """
+    Сводка за один проход по заявкам, память не зависит от размера базы:
+      - пользователи по последней заявке: active / expired / pending / rejected
+      - выручка по одобренным заявкам: (период, валюта) -> число оплат и сумма
+    Строки должны идти в порядке REPORT_SORTS.
+    """
+
+    def __init__(self, today: date | None = None):
+        self.today = today or date.today()
+        self.requests = 0
+        self.users = 0
+        self.active = 0
+        self.expired = 0
+        self.pending = 0
+        self.rejected = 0
+        self.revenue: dict[tuple[str, str], list[int]] = {}
+        self.missing_properties: list[str] = []
+        self._last_tg_id: str | None = None
+
+    def add(self, row: ReportRow):
+        self.requests += 1
+        if row.status == "approved" and row.amount:
+            bucket = self.revenue.setdefault((row.period_key or "-", row.currency), [0, 0])
+            bucket[0] += 1
+            bucket[1] += row.amount
+        if not row.tg_id or row.tg_id == self._last_tg_id:
+            return
+        # первая строка нового tg_id — его последняя заявка
+        self._last_tg_id = row.tg_id
+        self.users += 1
+        if row.status == "approved":
+            if row.expires_at is None or row.expires_at >= self.today:
+                self.active += 1
+            else:
+                self.expired += 1
+        elif row.status == "rejected":
+            self.rejected += 1
+        else:
+            self.pending += 1
+
+    def lines(self) -> list[str]:
+        out = [
+            f"Заявок: {self.requests}, пользователей: {self.users}",
+            f"Активные: {self.active}",
+            f"Истекшие: {self.expired}",
+            f"На проверке: {self.pending}",
+            f"Отклонённые: {self.rejected}",
+        ]
+        if self.revenue:
+            out.append("Выручка (период, валюта: оплат / сумма):")
+            for (period, currency), (count, total) in sorted(self.revenue.items()):
+                out.append(f"  {period}, {currency}: {count} / {total}")
+        if self.missing_properties:
+            out.append(f"Нет в базе Notion: {', '.join(self.missing_properties)} — эти данные в отчёте пустые")
+        return out
+
+
+class RowWriter:
+    """Построчная запись выгрузки в CSV или JSONL: в памяти только текущая строка."""
+
+    def __init__(self, path: str, fmt: str = "csv"):
+        if fmt not in EXPORT_FORMATS:
+            raise ValueError(f"Unknown export format: {fmt}")
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self.path = path
+        self.fmt = fmt
+        self.rows = 0
+        self._f = open(path, "w", encoding="utf-8", newline="")
+        self._csv = None
+        if fmt == "csv":
+            self._csv = csv.DictWriter(self._f, fieldnames=ReportRow.__slots__)
+            self._csv.writeheader()
+
+    def write(self, row: ReportRow):
+        if self._csv is not None:
+            self._csv.writerow(row.as_dict())
+        else:
+            self._f.write(json.dumps(row.as_dict(), ensure_ascii=False) + "\n")
+        self.rows += 1
+
+    def close(self):
+        self._f.close()
@@ -0,0 +1,35 @@
+import re
+from typing import Any, Awaitable, Callable
+
+from aiogram.types import Message
+
+Handler = Callable[[Message], Awaitable[Any]]
+
+# эмодзи/значки и пробелы в начале кнопки: "ℹ️ Информация" -> "информация"
+_LEADING_NOISE = re.compile(r"^[^0-9A-Za-zА-Яа-яЁёІіЇїЄєҐґ]+")
+
+
+def normalize_label(text: str | None) -> str:
+    return _LEADING_NOISE.sub("", (text or "").strip()).strip().casefold()
+
+
+class TextRouter:
+    """
+    Текст кнопки reply-клавиатуры -> хендлер за один lookup в dict.
+    Всё, что не является кнопкой меню, уходит в fallback.
+    """
+
+    def __init__(self, routes: dict[str, Handler], fallback: Handler):
+        self.routes: dict[str, Handler] = {}
+        for label, handler in routes.items():
+            key = normalize_label(label)
+            if key in self.routes:
+                raise ValueError(f"Duplicate menu label after normalization: {label!r}")
+            self.routes[key] = handler
+        self.fallback = fallback
+
+    def resolve(self, text: str | None) -> Handler:
+        return self.routes.get(normalize_label(text), self.fallback)
+
+    async def dispatch(self, message: Message) -> Any:
+        return await self.resolve(message.text)(message)
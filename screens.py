@@ -0,0 +1,55 @@
+import os
+from dataclasses import dataclass
+from types import MappingProxyType
+from typing import Iterable
+
+from aiogram.types import InlineKeyboardMarkup, ReplyKeyboardMarkup
+from aiogram.types.base import UNSET_PARSE_MODE
+
+
+@dataclass(frozen=True, slots=True)
+class Screen:
+    """
+    Статичный экран: текст/подпись, картинка, клавиатура, parse mode.
+    Собирается один раз при старте, хендлеры только отправляют.
+    """
+    key: str
+    text: str | None = None
+    image: str | None = None
+    keyboard: InlineKeyboardMarkup | ReplyKeyboardMarkup | None = None
+    parse_mode: object = UNSET_PARSE_MODE  # UNSET = parse_mode бота (HTML)
+
+
+class ScreenCatalog:
+    """
+    Неизменяемый каталог экранов. При создании проверяет, что все картинки на месте —
+    битый путь роняет бота на старте, а не превращается молча в текст в send_photo_safe.
+    """
+
+    def __init__(self, screens: Iterable[Screen]):
+        data: dict[str, Screen] = {}
+        for screen in screens:
+            if screen.key in data:
+                raise RuntimeError(f"Duplicate screen key: {screen.key}")
+            if screen.text is None and screen.image is None:
+                raise RuntimeError(f"Screen {screen.key} has neither text nor image")
+            data[screen.key] = screen
+        self._screens = MappingProxyType(data)
+        self.validate()
+
+    def validate(self):
+        missing = sorted({s.image for s in self._screens.values() if s.image and not os.path.isfile(s.image)})
+        if missing:
+            raise RuntimeError(f"Screen images not found: {', '.join(missing)}")
+
+    def __getitem__(self, key: str) -> Screen:
+        return self._screens[key]
+
+    def __contains__(self, key: str) -> bool:
+        return key in self._screens
+
+    def __iter__(self):
+        return iter(self._screens.values())
+
+    def images(self) -> list[str]:
+        return sorted({s.image for s in self._screens.values() if s.image})
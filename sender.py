@@ -0,0 +1,238 @@
+import asyncio
+import logging
+import time
+from collections import OrderedDict, deque
+from typing import Any, Awaitable, Callable
+
+from aiogram.exceptions import TelegramRetryAfter
+
+from metrics import TELEGRAM_QUEUE_SECONDS
+from ratelimit import TokenBucket
+
+log = logging.getLogger("bot")
+
+# Приоритеты: интерактивные ответы всегда раньше массовых рассылок
+INTERACTIVE = 0
+BULK = 1
+
+
+class _Job:
+    __slots__ = ("chat_id", "fn", "fut", "priority", "queued_at")
+
+    def __init__(self, chat_id: int | None, fn: Callable[[], Awaitable[Any]], fut: asyncio.Future, priority: int):
+        self.chat_id = chat_id
+        self.fn = fn
+        self.fut = fut
+        self.priority = priority
+        self.queued_at = time.monotonic()
+
+
+class OutboundScheduler:
+    """
+    Единая очередь исходящих вызовов Bot API.
+      - глобальный token bucket (~30 msg/s)
+      - свой bucket на каждый чат (личка / группа — разные лимиты): для BULK всегда,
+        для INTERACTIVE только в группах — ответы, правки и колбэки в личке не ждут его
+      - в чате строго по одному вызову за раз, порядок сохраняется
+      - round-robin между чатами внутри приоритета, INTERACTIVE раньше BULK
+      - TelegramRetryAfter ставит на паузу чат (или всё, если чата нет) и
+        пробрасывается вызывающему: повтор встанет в очередь после паузы
+      - RetryAfter на BULK-вызове — это общий flood-лимит рассылки: на паузу встаёт
+        вся полоса BULK, а не один чат, интерактивные ответы идут дальше
+    chat_id=None — вызовы без чата (answerCallbackQuery): только глобальный лимит.
+    """
+
+    def __init__(
+        self,
+        *,
+        global_rate: float = 30.0,
+        global_burst: float = 30.0,
+        chat_rate: float = 1.0,
+        chat_burst: float = 3.0,
+        group_rate: float = 20.0 / 60.0,
+        group_burst: float = 3.0,
+    ):
+        self.global_bucket = TokenBucket(global_rate, global_burst)
+        self.chat_rate = chat_rate
+        self.chat_burst = chat_burst
+        self.group_rate = group_rate
+        self.group_burst = group_burst
+        self._lanes: dict[int, OrderedDict] = {INTERACTIVE: OrderedDict(), BULK: OrderedDict()}
+        self._chat_buckets: dict[int, TokenBucket] = {}
+        self._paused_until: dict[int | None, float] = {}
+        self._lane_paused_until: dict[int, float] = {}
+        self._busy: set = set()
+        self._wakeup = asyncio.Event()
+        self._task: asyncio.Task | None = None
+        self.sent = 0
+        self.retry_after_hits = 0
+
+    def stats(self) -> dict:
+        return {
+            "queued_interactive": sum(len(q) for q in self._lanes[INTERACTIVE].values()),
+            "queued_bulk": sum(len(q) for q in self._lanes[BULK].values()),
+            "inflight": len(self._busy),
+            "sent": self.sent,
+            "retry_after_hits": self.retry_after_hits,
+            "bulk_paused_s": round(max(self._lane_paused_until.get(BULK, 0.0) - time.monotonic(), 0.0), 1),
+        }
+
+    def dump_state(self) -> dict:
+        """Действующие паузы по RetryAfter (wall-clock): после рестарта Telegram их всё ещё помнит."""
+        now = time.monotonic()
+        wall = time.time()
+        return {
+            "chats": [[chat_id, wall + t - now] for chat_id, t in self._paused_until.items() if t > now],
+            "lanes": [[priority, wall + t - now] for priority, t in self._lane_paused_until.items() if t > now],
+        }
+
+    def load_state(self, state: dict):
+        wall = time.time()
+        for chat_id, until in state.get("chats", ()):
+            if until > wall:
+                self.pause(chat_id, until - wall)
+        for priority, until in state.get("lanes", ()):
+            if until > wall and priority in self._lanes:
+                self.pause_lane(priority, until - wall)
+
+    def _bucket(self, chat_id: int) -> TokenBucket:
+        b = self._chat_buckets.get(chat_id)
+        if b is None:
+            if chat_id < 0:
+                b = TokenBucket(self.group_rate, self.group_burst)
+            else:
+                b = TokenBucket(self.chat_rate, self.chat_burst)
+            self._chat_buckets[chat_id] = b
+        return b
+
+    def pause(self, chat_id: int | None, seconds: float):
+        until = time.monotonic() + seconds
+        if self._paused_until.get(chat_id, 0.0) < until:
+            self._paused_until[chat_id] = until
+        self._wakeup.set()
+
+    def pause_lane(self, priority: int, seconds: float):
+        until = time.monotonic() + seconds
+        if self._lane_paused_until.get(priority, 0.0) < until:
+            self._lane_paused_until[priority] = until
+        self._wakeup.set()
+
+    async def send(self, chat_id: int | None, fn: Callable[[], Awaitable[Any]], *, priority: int = INTERACTIVE) -> Any:
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run())
+        fut = asyncio.get_running_loop().create_future()
+        self._lanes[priority].setdefault(chat_id, deque()).append(_Job(chat_id, fn, fut, priority))
+        self._wakeup.set()
+        return await fut
+
+    async def close(self):
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+        for lane in self._lanes.values():
+            for q in lane.values():
+                for job in q:
+                    if not job.fut.done():
+                        job.fut.cancel()
+            lane.clear()
+
+    def _pick(self, now: float) -> tuple[_Job | None, float]:
+        """Следующий готовый вызов или сколько ждать до ближайшего."""
+        wait_s = float("inf")
+        global_pause = self._paused_until.get(None, 0.0) - now
+        for priority, lane in self._lanes.items():
+            if lane:
+                lane_pause = self._lane_paused_until.get(priority, 0.0) - now
+                if lane_pause > 0:
+                    wait_s = min(wait_s, lane_pause)
+                    continue
+            for chat_id, q in lane.items():
+                if chat_id in self._busy:
+                    continue
+                pause = self._paused_until.get(chat_id, 0.0) - now
+                if chat_id is not None and global_pause > pause:
+                    pause = global_pause
+                if pause > 0:
+                    wait_s = min(wait_s, pause)
+                    continue
+                # ответы в личке не дросселируем: пользователь сам задаёт темп, а serial-очередь
+                # чата и пауза по RetryAfter и так защищают; лимит на чат — для рассылки и групп
+                if chat_id is not None and (priority == BULK or chat_id < 0):
+                    d = self._bucket(chat_id).delay(now)
+                    if d > 0:
+                        wait_s = min(wait_s, d)
+                        continue
+                    self._bucket(chat_id).consume(now)
+                job = q.popleft()
+                # round-robin: чат уходит в конец очереди своего приоритета
+                del lane[chat_id]
+                if q:
+                    lane[chat_id] = q
+                return job, 0.0
+        return None, wait_s
+
+    async def _run(self):
+        while True:
+            now = time.monotonic()
+            d = self.global_bucket.delay(now)
+            if d > 0:
+                await asyncio.sleep(d)
+                continue
+
+            job, wait_s = self._pick(now)
+            if job is None:
+                self._wakeup.clear()
+                timeout = None if wait_s == float("inf") else wait_s
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), timeout)
+                except asyncio.TimeoutError:
+                    pass
+                self._prune(time.monotonic())
+                continue
+
+            self.global_bucket.consume(now)
+            if job.chat_id is not None:
+                self._busy.add(job.chat_id)
+            asyncio.create_task(self._execute(job))
+
+    async def _execute(self, job: _Job):
+        if job.fut.done():
+            # вызывающий уже отменил ожидание
+            self._busy.discard(job.chat_id)
+            self._wakeup.set()
+            return
+        TELEGRAM_QUEUE_SECONDS.observe(time.monotonic() - job.queued_at, priority=job.priority)
+        try:
+            result = await job.fn()
+        except TelegramRetryAfter as e:
+            self.retry_after_hits += 1
+            retry_after = float(getattr(e, "retry_after", 2.0))
+            if job.priority == BULK:
+                self.pause_lane(BULK, retry_after)
+            else:
+                self.pause(job.chat_id, retry_after)
+            if not job.fut.done():
+                job.fut.set_exception(e)
+        except asyncio.CancelledError:
+            job.fut.cancel()
+            raise
+        except Exception as e:
+            if not job.fut.done():
+                job.fut.set_exception(e)
+        else:
+            self.sent += 1
+            if not job.fut.done():
+                job.fut.set_result(result)
+        finally:
+            self._busy.discard(job.chat_id)
+            self._wakeup.set()
+
+    def _prune(self, now: float):
+        if len(self._chat_buckets) > 10_000:
+            for chat_id in [c for c, b in self._chat_buckets.items() if b.is_full(now) and c not in self._busy]:
+                del self._chat_buckets[chat_id]
+        for chat_id in [c for c, t in self._paused_until.items() if t <= now]:
+            del self._paused_until[chat_id]
+        for priority in [p for p, t in self._lane_paused_until.items() if t <= now]:
+            del self._lane_paused_until[priority]
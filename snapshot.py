@@ -0,0 +1,123 @@
+import os
+import gzip
+import json
+import time
+import asyncio
+import logging
+import tempfile
+from typing import Any, Callable
+
+log = logging.getLogger("bot")
+
+SNAPSHOT_VERSION = 1
+
+# имя -> (dump() -> JSON-совместимое состояние, load(state))
+SnapshotSource = tuple[Callable[[], Any], Callable[[Any], Any]]
+
+
+class Snapshot:
+    """
+    Горячее состояние процесса в одном сжатом файле для тёплого рестарта:
+    пишется периодически и при штатной остановке, читается при старте.
+    Время в снапшоте — wall-clock, так что каждая часть сама отбрасывает
+    устаревшее (TTL кэша, истёкшие паузы) с учётом простоя между процессами.
+    Файл — только кэш: битый или чужой версии просто игнорируется.
+    """
+
+    def __init__(self, path: str, sources: dict[str, SnapshotSource], *, max_age: float = 3600.0):
+        self.path = path
+        self.sources = sources
+        self.max_age = max_age
+        self.saves = 0
+        self.save_errors = 0
+        self.last_save_ms = 0.0
+        self.last_size = 0
+        self.loaded_age_s: float | None = None
+
+    def stats(self) -> dict:
+        return {
+            "saves": self.saves,
+            "save_errors": self.save_errors,
+            "last_save_ms": round(self.last_save_ms, 1),
+            "bytes": self.last_size,
+            "loaded_age_s": round(self.loaded_age_s, 1) if self.loaded_age_s is not None else -1,
+        }
+
+    def collect(self) -> dict:
+        """Состояние всех частей; вызывать из event loop — структуры меняются только в нём."""
+        data = {"version": SNAPSHOT_VERSION, "saved_at": time.time(), "sources": {}}
+        for name, (dump, _) in self.sources.items():
+            try:
+                data["sources"][name] = dump()
+            except Exception as e:
+                log.warning("Snapshot dump failed", extra={"source": name, "error": repr(e)})
+        return data
+
+    def write(self, data: dict) -> bool:
+        """Сжать и атомарно записать (tmp + os.replace) — можно из потока."""
+        t0 = time.perf_counter()
+        tmp = None
+        try:
+            directory = os.path.dirname(self.path) or "."
+            os.makedirs(directory, exist_ok=True)
+            raw = gzip.compress(json.dumps(data, ensure_ascii=False, separators=(",", ":")).encode("utf-8"), 6)
+            # свой tmp на каждую запись: периодическая в потоке и финальная не пишут в один файл
+            fd, tmp = tempfile.mkstemp(dir=directory, prefix=os.path.basename(self.path) + ".", suffix=".tmp")
+            with os.fdopen(fd, "wb") as f:
+                f.write(raw)
+            os.replace(tmp, self.path)
+        except Exception as e:
+            if tmp is not None and os.path.exists(tmp):
+                os.remove(tmp)
+            self.save_errors += 1
+            log.warning("Snapshot save failed", extra={"error": repr(e)})
+            return False
+        self.saves += 1
+        self.last_size = len(raw)
+        self.last_save_ms = (time.perf_counter() - t0) * 1000
+        return True
+
+    def save(self) -> bool:
+        return self.write(self.collect())
+
+    def load(self) -> bool:
+        try:
+            with open(self.path, "rb") as f:
+                data = json.loads(gzip.decompress(f.read()))
+        except FileNotFoundError:
+            return False
+        except Exception as e:
+            log.warning("Snapshot unreadable, starting cold", extra={"error": repr(e)})
+            return False
+        version = data.get("version") if isinstance(data, dict) else None
+        if version != SNAPSHOT_VERSION:
+            log.warning("Snapshot version mismatch, starting cold", extra={"version": version})
+            return False
+        age = time.time() - float(data.get("saved_at", 0.0))
+        if age > self.max_age:
+            log.info("Snapshot too old, starting cold", extra={"age_s": round(age, 1)})
+            return False
+        self.loaded_age_s = age
+        loaded = {}
+        for name, state in (data.get("sources") or {}).items():
+            source = self.sources.get(name)
+            if source is None:
+                continue
+            try:
+                loaded[name] = source[1](state)
+            except Exception as e:
+                log.warning("Snapshot load failed", extra={"source": name, "error": repr(e)})
+        log.info("Snapshot loaded", extra={"age_s": round(age, 1), "loaded": loaded})
+        return True
+
+    async def run_forever(self, interval: float):
+        while True:
+            await asyncio.sleep(interval)
+            # снимаем состояние в loop, а JSON + gzip + запись — в потоке
+            write = asyncio.ensure_future(asyncio.to_thread(self.write, self.collect()))
+            try:
+                await asyncio.shield(write)
+            except asyncio.CancelledError:
+                # поток отменой не остановить: дожидаемся записи, чтобы финальный save() был последним
+                await write
+                raise
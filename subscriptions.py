@@ -0,0 +1,236 @@
+import os
+import asyncio
+import logging
+import sqlite3
+import time
+from datetime import date
+
+from notion import PRIORITY_SYNC, SYNC_PROPERTIES, CabinetRecord, NotionClient, parse_date
+
+log = logging.getLogger("bot")
+
+SYNC_PAGE_SIZE = 100
+
+
+# Аудитории рассылки: all | active (одобрена и не истекла) | expired
+AUDIENCES = ("all", "active", "expired")
+
+
+def _audience_filter(audience: str) -> tuple[str, tuple]:
+    today = date.today().isoformat()
+    if audience == "active":
+        return " AND status = 'approved' AND (expires_at = '' OR expires_at >= ?)", (today,)
+    if audience == "expired":
+        return " AND status = 'approved' AND expires_at != '' AND expires_at < ?", (today,)
+    return "", ()
+
+
+class SubscriptionIndex:
+    """
+    Локальное зеркало базы Notion в SQLite (WAL): последняя заявка на каждый tg_id.
+    Кабинет читает отсюда, а не из Notion.
+    """
+
+    def __init__(self, path: str):
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self.path = path
+        self.db = sqlite3.connect(path, check_same_thread=False)
+        self.db.row_factory = sqlite3.Row
+        self.db.execute("PRAGMA journal_mode=WAL")
+        self.db.execute("PRAGMA synchronous=NORMAL")
+        self.db.execute(
+            """
+            CREATE TABLE IF NOT EXISTS subscriptions (
+                tg_id TEXT PRIMARY KEY,
+                status TEXT NOT NULL DEFAULT '',
+                discord TEXT NOT NULL DEFAULT '',
+                email TEXT NOT NULL DEFAULT '',
+                expires_at TEXT NOT NULL DEFAULT '',
+                created_time TEXT NOT NULL DEFAULT '',
+                last_edited_time TEXT NOT NULL DEFAULT ''
+            )
+            """
+        )
+        self.db.execute("CREATE TABLE IF NOT EXISTS sync_state (key TEXT PRIMARY KEY, value TEXT NOT NULL)")
+        # synced_at — локальное время последнего upsert строки: по нему фоновые задачи
+        # (напоминания об окончании) забирают только изменившиеся подписки
+        columns = {row["name"] for row in self.db.execute("PRAGMA table_info(subscriptions)")}
+        if "synced_at" not in columns:
+            self.db.execute("ALTER TABLE subscriptions ADD COLUMN synced_at REAL NOT NULL DEFAULT 0")
+        self.db.execute("CREATE INDEX IF NOT EXISTS subscriptions_by_sync ON subscriptions (synced_at)")
+
+    def close(self):
+        self.db.close()
+
+    def get(self, tg_id: int | str) -> CabinetRecord | None:
+        row = self.db.execute(
+            "SELECT tg_id, status, discord, email, expires_at, created_time, last_edited_time "
+            "FROM subscriptions WHERE tg_id = ?",
+            (str(tg_id),),
+        ).fetchone()
+        if not row:
+            return None
+        return CabinetRecord(
+            tg_id=row["tg_id"],
+            status=row["status"],
+            discord=row["discord"],
+            email=row["email"],
+            expires_at=parse_date(row["expires_at"]),
+            created_time=row["created_time"],
+            last_edited_time=row["last_edited_time"],
+        )
+
+    def upsert(self, records: list[CabinetRecord]) -> int:
+        now = time.time()
+        rows = [
+            (
+                r.tg_id,
+                r.status,
+                r.discord,
+                r.email,
+                r.expires_at.isoformat() if r.expires_at else "",
+                r.created_time,
+                r.last_edited_time,
+                now,
+            )
+            for r in records
+            if r.tg_id
+        ]
+        if not rows:
+            return 0
+        # на один tg_id может быть несколько заявок — оставляем самую свежую по created_time
+        with self.db:
+            self.db.executemany(
+                """
+                INSERT INTO subscriptions (tg_id, status, discord, email, expires_at, created_time, last_edited_time, synced_at)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+                ON CONFLICT(tg_id) DO UPDATE SET
+                    status = excluded.status,
+                    discord = excluded.discord,
+                    email = excluded.email,
+                    expires_at = excluded.expires_at,
+                    created_time = excluded.created_time,
+                    last_edited_time = excluded.last_edited_time,
+                    synced_at = excluded.synced_at
+                WHERE excluded.created_time >= subscriptions.created_time
+                """,
+                rows,
+            )
+        return len(rows)
+
+    def delete_missing(self, seen: set[str], synced_before: float) -> int:
+        """
+        Удалить строки, которых не было в полном проходе по Notion (страницу удалили).
+        Строки, записанные после начала прохода (кабинет сам сходил в Notion), не трогаем.
+        """
+        with self.db:
+            self.db.execute("CREATE TEMP TABLE IF NOT EXISTS seen_tg_ids (tg_id TEXT PRIMARY KEY)")
+            self.db.execute("DELETE FROM seen_tg_ids")
+            self.db.executemany("INSERT OR IGNORE INTO seen_tg_ids (tg_id) VALUES (?)", [(t,) for t in seen])
+            deleted = self.db.execute(
+                "DELETE FROM subscriptions WHERE synced_at < ? AND tg_id NOT IN (SELECT tg_id FROM seen_tg_ids)",
+                (synced_before,),
+            ).rowcount
+            self.db.execute("DELETE FROM seen_tg_ids")
+        return deleted
+
+    def get_state(self, key: str) -> str | None:
+        row = self.db.execute("SELECT value FROM sync_state WHERE key = ?", (key,)).fetchone()
+        return row["value"] if row else None
+
+    def set_state(self, key: str, value: str):
+        with self.db:
+            self.db.execute(
+                "INSERT INTO sync_state (key, value) VALUES (?, ?) "
+                "ON CONFLICT(key) DO UPDATE SET value = excluded.value",
+                (key, value),
+            )
+
+    def count(self) -> int:
+        return self.db.execute("SELECT COUNT(*) FROM subscriptions").fetchone()[0]
+
+    def tg_ids_after(self, after: str, limit: int, audience: str = "all") -> list[str]:
+        """
+        Страница tg_id по возрастанию, строго после after (keyset по первичному ключу):
+        рассылка идёт по базе курсором, не загружая её целиком.
+        """
+        where, params = _audience_filter(audience)
+        rows = self.db.execute(
+            f"SELECT tg_id FROM subscriptions WHERE tg_id > ?{where} ORDER BY tg_id LIMIT ?",
+            (after, *params, limit),
+        ).fetchall()
+        return [r["tg_id"] for r in rows]
+
+    def count_audience(self, audience: str = "all") -> int:
+        where, params = _audience_filter(audience)
+        return self.db.execute(f"SELECT COUNT(*) FROM subscriptions WHERE 1{where}", params).fetchone()[0]
+
+    def approved_since(self, synced_after: float) -> list[tuple[str, str, float]]:
+        """(tg_id, expires_at, synced_at) одобренных подписок с датой окончания, изменённых после synced_after."""
+        rows = self.db.execute(
+            "SELECT tg_id, expires_at, synced_at FROM subscriptions "
+            "WHERE synced_at > ? AND status = 'approved' AND expires_at != '' ORDER BY synced_at",
+            (synced_after,),
+        ).fetchall()
+        return [(r["tg_id"], r["expires_at"], r["synced_at"]) for r in rows]
+
+
+async def sync_once(notion: NotionClient, index: SubscriptionIndex, *, full: bool = False) -> int:
+    """
+    Инкрементальная синхронизация: тянем страницы с last_edited_time >= курсора.
+    У Notion last_edited_time с точностью до минуты, поэтому on_or_after + идемпотентный upsert.
+    Полный проход (full=True или курсора ещё нет) читает всю базу и удаляет из индекса
+    tg_id, которых в ней больше нет — удаление страницы инкрементально не увидеть.
+    """
+    cursor = index.get_state("last_edited_time")
+    full = full or not cursor
+    started = time.time()
+    seen: set[str] = set()
+    filter_obj = None
+    if not full:
+        filter_obj = {"timestamp": "last_edited_time", "last_edited_time": {"on_or_after": cursor}}
+    sorts = [{"timestamp": "last_edited_time", "direction": "ascending"}]
+
+    total = 0
+    newest = cursor or ""
+    async for batch in notion.iter_batches(
+        filter_obj,
+        page_size=SYNC_PAGE_SIZE,
+        sorts=sorts,
+        priority=PRIORITY_SYNC,
+        filter_properties=SYNC_PROPERTIES,
+    ):
+        records = [CabinetRecord.from_page(p) for p in batch]
+        total += index.upsert(records)
+        for r in records:
+            if r.tg_id:
+                seen.add(r.tg_id)
+            if r.last_edited_time > newest:
+                newest = r.last_edited_time
+
+    if full and seen:
+        # сюда доходим только после всех страниц: оборванный проход ничего не удаляет,
+        # а пустой ответ скорее ошибка доступа, чем пустая база — индекс не стираем
+        deleted = index.delete_missing(seen, started)
+        if deleted:
+            log.info("Subscription index: removed %s users deleted in Notion", deleted)
+    if newest and newest != cursor:
+        index.set_state("last_edited_time", newest)
+    return total
+
+
+async def sync_forever(notion: NotionClient, index: SubscriptionIndex, interval: float, full_interval: float = 86400.0):
+    last_full = time.monotonic()
+    while True:
+        try:
+            full = full_interval > 0 and time.monotonic() - last_full >= full_interval
+            n = await sync_once(notion, index, full=full)
+            if full:
+                last_full = time.monotonic()
+            if n:
+                log.info("Subscription index synced: %s pages (total users=%s)", n, index.count())
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            log.warning("Subscription index sync failed: %r", e)
+        await asyncio.sleep(interval)
@@ -0,0 +1,83 @@
+import asyncio
+
+from broadcast import Broadcaster, BroadcastStore
+
+RECIPIENTS = [str(1000 + i) for i in range(1, 11)]
+
+
+def recipients(after: str, limit: int, audience: str) -> list[str]:
+    return [tg_id for tg_id in RECIPIENTS if tg_id > after][:limit]
+
+
+class Sender:
+    def __init__(self, hang_on: str = ""):
+        self.hang_on = hang_on
+        self.sent = []
+
+    async def __call__(self, chat_id: int, text: str, photo: str) -> str:
+        if str(chat_id) == self.hang_on:
+            await asyncio.Event().wait()  # «процесс упал» посреди страницы
+        self.sent.append(str(chat_id))
+        return "blocked" if chat_id == 1003 else "delivered"
+
+
+def test_resume_after_restart_continues_from_checkpoint_without_duplicates(tmp_path):
+    path = str(tmp_path / "broadcasts.sqlite3")
+    first = Sender(hang_on="1006")
+
+    async def before_restart():
+        store = BroadcastStore(path)
+        broadcaster = Broadcaster(store, recipients, first, chunk_size=4)
+        b = store.create("hello", admin_chat_id=1)
+        broadcaster.start(b)
+        while len(first.sent) < 7:
+            await asyncio.sleep(0.001)
+        await broadcaster.close(timeout=0.01)
+        store.close()
+        return b.broadcast_id
+
+    broadcast_id = asyncio.run(before_restart())
+    assert first.sent == ["1001", "1002", "1003", "1004", "1005", "1007", "1008"]
+
+    second = Sender()
+    finished = []
+
+    async def on_finish(b):
+        finished.append(b)
+
+    async def after_restart():
+        store = BroadcastStore(path)
+        broadcaster = Broadcaster(store, recipients, second, chunk_size=4, on_finish=on_finish)
+        b = broadcaster.resume()
+        assert b is not None and b.broadcast_id == broadcast_id
+        assert b.cursor == "1004"
+        await asyncio.wait_for(broadcaster._task, 1.0)
+        stored = store.get(broadcast_id)
+        store.close()
+        return stored
+
+    stored = asyncio.run(after_restart())
+    # повторно ушло только сообщение, бывшее в полёте при остановке
+    assert second.sent == ["1006", "1009", "1010"]
+    assert stored.status == "done"
+    assert (stored.delivered, stored.blocked, stored.failed) == (9, 1, 0)
+    assert len(finished) == 1
+
+
+def test_stopped_broadcast_is_not_resumed(tmp_path):
+    store = BroadcastStore(str(tmp_path / "broadcasts.sqlite3"))
+    send = Sender()
+
+    async def run():
+        broadcaster = Broadcaster(store, recipients, send, chunk_size=4)
+        b = store.create("hello")
+        broadcaster.start(b)
+        assert broadcaster.stop(b.broadcast_id)
+        await asyncio.wait_for(broadcaster._task, 1.0)
+        return b, Broadcaster(store, recipients, send).resume()
+
+    b, resumed = asyncio.run(run())
+    store.close()
+    assert b.status == "stopped"
+    assert resumed is None
+    assert len(send.sent) < len(RECIPIENTS)
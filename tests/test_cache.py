@@ -0,0 +1,214 @@
+import asyncio
+import time
+
+import pytest
+
+from cache import BatchLoader, SingleFlight, TTLCache
+
+
+class Loader:
+    def __init__(self, *values):
+        self.values = list(values)
+        self.calls = 0
+
+    async def __call__(self):
+        self.calls += 1
+        value = self.values.pop(0)
+        if isinstance(value, Exception):
+            raise value
+        return value
+
+
+def test_fresh_hit_does_not_call_the_loader():
+    async def run():
+        cache = TTLCache(fresh_ttl=60, stale_ttl=600)
+        load = Loader("a", "b")
+        assert await cache.get_or_load(1, load) == "a"
+        assert await cache.get_or_load(1, load) == "a"
+        return cache, load
+
+    cache, load = asyncio.run(run())
+    assert load.calls == 1
+    assert (cache.misses, cache.hits) == (1, 1)
+
+
+def test_stale_entry_is_served_and_refreshed_in_background():
+    async def run():
+        cache = TTLCache(fresh_ttl=60, stale_ttl=600)
+        cache.set(1, "old", stored_at=time.time() - 120)
+        load = Loader("new")
+        assert await cache.get_or_load(1, load) == "old"
+        await asyncio.sleep(0)
+        await asyncio.sleep(0)
+        return cache, load
+
+    cache, load = asyncio.run(run())
+    assert load.calls == 1
+    assert cache.stale == 1
+    assert cache.peek(1)[1] == "new"
+
+
+def test_failed_background_refresh_keeps_the_stale_value():
+    async def run():
+        cache = TTLCache(fresh_ttl=60, stale_ttl=600)
+        cache.set(1, "old", stored_at=time.time() - 120)
+        assert await cache.get_or_load(1, Loader(RuntimeError("notion down"))) == "old"
+        await asyncio.sleep(0)
+        await asyncio.sleep(0)
+        return cache
+
+    cache = asyncio.run(run())
+    assert cache.refresh_errors == 1
+    assert cache.peek(1)[1] == "old"
+
+
+def test_expired_entry_and_force_load_synchronously():
+    async def run():
+        cache = TTLCache(fresh_ttl=60, stale_ttl=600)
+        cache.set(1, "ancient", stored_at=time.time() - 3600)
+        cache.set(2, "fresh")
+        assert await cache.get_or_load(1, Loader("reloaded")) == "reloaded"
+        assert await cache.get_or_load(2, Loader("forced"), force=True) == "forced"
+        return cache
+
+    cache = asyncio.run(run())
+    assert (cache.misses, cache.forced) == (1, 1)
+
+
+def test_lru_eviction_keeps_recently_used():
+    async def run():
+        cache = TTLCache(maxsize=2)
+        cache.set(1, "a")
+        cache.set(2, "b")
+        await cache.get_or_load(1, Loader("unused"))  # 1 становится самым свежим
+        cache.set(3, "c")
+        return cache
+
+    cache = asyncio.run(run())
+    assert cache.peek(2) is None
+    assert cache.peek(1) is not None and cache.peek(3) is not None
+    assert cache.evictions == 1
+
+
+def test_dump_load_drops_expired_entries():
+    cache = TTLCache(fresh_ttl=60, stale_ttl=600)
+    now = time.time()
+    cache.set("live", 1, stored_at=now - 30)
+    cache.set("dead", 2, stored_at=now - 700)
+    restored = TTLCache(fresh_ttl=60, stale_ttl=600)
+    assert restored.load(cache.dump(), now=now) == 1
+    assert restored.peek("live") == (now - 30, 1)
+    assert restored.peek("dead") is None
+
+
+def test_singleflight_coalesces_concurrent_calls():
+    calls = []
+
+    async def fetch(key):
+        calls.append(key)
+        await asyncio.sleep(0.01)
+        return f"value-{key}"
+
+    async def run():
+        sf = SingleFlight()
+        results = await asyncio.gather(*(sf.do(k, lambda k=k: fetch(k)) for k in ("a", "a", "a", "b")))
+        again = await sf.do("a", lambda: fetch("a"))
+        return sf, results, again
+
+    sf, results, again = asyncio.run(run())
+    assert results == ["value-a", "value-a", "value-a", "value-b"]
+    assert again == "value-a"
+    assert calls == ["a", "b", "a"]
+    assert sf.stats() == {"calls": 3, "coalesced": 2, "inflight": 0}
+
+
+def test_singleflight_shares_the_exception():
+    async def fail():
+        await asyncio.sleep(0.01)
+        raise ValueError("boom")
+
+    async def run():
+        sf = SingleFlight()
+        return await asyncio.gather(sf.do("k", fail), sf.do("k", fail), return_exceptions=True)
+
+    results = asyncio.run(run())
+    assert [type(r) for r in results] == [ValueError, ValueError]
+
+
+def test_singleflight_cancelled_waiter_does_not_cancel_the_call():
+    async def fetch():
+        await asyncio.sleep(0.02)
+        return "done"
+
+    async def run():
+        sf = SingleFlight()
+        impatient = asyncio.create_task(sf.do("k", fetch))
+        patient = asyncio.create_task(sf.do("k", fetch))
+        await asyncio.sleep(0.005)
+        impatient.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await impatient
+        return await patient
+
+    assert asyncio.run(run()) == "done"
+
+
+class Batches:
+    def __init__(self, delay: float = 0.0, error: Exception | None = None):
+        self.calls = []
+        self.delay = delay
+        self.error = error
+
+    async def __call__(self, keys: list, deadline: float | None) -> dict:
+        self.calls.append((sorted(keys), deadline))
+        await asyncio.sleep(self.delay)
+        if self.error:
+            raise self.error
+        return {k: k * 10 for k in keys if k != 404}
+
+
+def test_batch_loader_groups_keys_in_one_call():
+    batch_fn = Batches()
+
+    async def run():
+        loader = BatchLoader(batch_fn, window=0.01)
+        return await asyncio.gather(*(loader.load(k) for k in (1, 2, 2, 404)))
+
+    assert asyncio.run(run()) == [10, 20, 20, None]
+    assert batch_fn.calls == [([1, 2, 404], None)]
+
+
+def test_batch_loader_dispatches_at_max_batch():
+    batch_fn = Batches()
+
+    async def run():
+        loader = BatchLoader(batch_fn, window=10.0, max_batch=2)
+        return await asyncio.wait_for(asyncio.gather(*(loader.load(k) for k in (1, 2, 3, 4))), 1.0)
+
+    assert asyncio.run(run()) == [10, 20, 30, 40]
+    assert [keys for keys, _ in batch_fn.calls] == [[1, 2], [3, 4]]
+
+
+def test_batch_loader_short_deadline_leaves_the_batch_running():
+    batch_fn = Batches(delay=0.05)
+
+    async def run():
+        loader = BatchLoader(batch_fn, window=0.001)
+        now = time.monotonic()
+        short = loader.load(1, now + 0.01)
+        long = loader.load(2, now + 1.0)
+        return await asyncio.gather(short, long, return_exceptions=True), now
+
+    (short, long), now = asyncio.run(run())
+    assert isinstance(short, TimeoutError)
+    assert long == 20
+    # батч получает самый поздний дедлайн
+    assert batch_fn.calls[0][1] == now + 1.0
+
+
+def test_batch_loader_error_reaches_every_caller():
+    async def run():
+        loader = BatchLoader(Batches(error=RuntimeError("notion down")), window=0.001)
+        return await asyncio.gather(loader.load(1), loader.load(2), return_exceptions=True)
+
+    assert [type(r) for r in asyncio.run(run())] == [RuntimeError, RuntimeError]
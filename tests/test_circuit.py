@@ -0,0 +1,141 @@
+import asyncio
+
+import httpx
+import pytest
+
+import circuit
+from circuit import CircuitBreaker, CircuitOpenError
+from notion import NotionClient
+from ratelimit import AdaptiveRateLimiter, RateLimitExceeded
+
+
+class Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    c = Clock()
+    monkeypatch.setattr(circuit.time, "monotonic", c)
+    return c
+
+
+def tripped(clock: Clock, open_seconds: float = 30.0) -> CircuitBreaker:
+    breaker = CircuitBreaker(name="test", min_calls=2, failure_rate=0.5, open_seconds=open_seconds)
+    breaker.record_failure()
+    breaker.record_failure()
+    assert breaker.state == CircuitBreaker.OPEN
+    return breaker
+
+
+def test_opens_on_failure_rate_and_rejects(clock):
+    breaker = tripped(clock)
+    with pytest.raises(CircuitOpenError):
+        breaker.before_call()
+    assert breaker.rejected == 1
+
+
+def test_slow_calls_count_as_failures(clock):
+    breaker = CircuitBreaker(name="test", min_calls=2, failure_rate=0.5, slow_call_s=1.0)
+    breaker.record_success(5.0)
+    breaker.record_success(5.0)
+    assert breaker.state == CircuitBreaker.OPEN
+
+
+def test_half_open_lets_exactly_one_probe(clock):
+    breaker = tripped(clock)
+    clock.now += 30
+    assert breaker.state == CircuitBreaker.HALF_OPEN
+    assert breaker.allow()
+    assert not breaker.allow()
+
+
+def test_probe_success_closes(clock):
+    breaker = tripped(clock)
+    clock.now += 30
+    breaker.before_call()
+    breaker.record_success(0.1)
+    assert breaker.state == CircuitBreaker.CLOSED
+    assert breaker.allow()
+
+
+def test_probe_failure_reopens_for_full_period(clock):
+    breaker = tripped(clock)
+    clock.now += 30
+    breaker.before_call()
+    breaker.record_failure()
+    assert breaker.state == CircuitBreaker.OPEN
+    clock.now += 29
+    assert not breaker.allow()
+    clock.now += 1
+    assert breaker.allow()
+
+
+def test_lost_probe_is_replaced_after_open_seconds(clock):
+    breaker = tripped(clock)
+    clock.now += 30
+    assert breaker.allow()
+    clock.now += 30
+    assert breaker.allow()
+
+
+
+def test_fail_fast_does_not_take_the_probe(clock):
+    breaker = tripped(clock)
+    with pytest.raises(CircuitOpenError):
+        breaker.fail_fast()
+    clock.now += 30
+    breaker.fail_fast()
+    assert breaker.allow()
+    with pytest.raises(CircuitOpenError):
+        breaker.fail_fast()
+
+
+def notion_client(breaker: CircuitBreaker, responses: list[httpx.Response], limiter=None) -> NotionClient:
+    client = NotionClient("token", "db", breaker=breaker, limiter=limiter, hedge_quantile=None)
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        return responses.pop(0)
+
+    client._client = httpx.AsyncClient(base_url="https://notion.test/v1", transport=httpx.MockTransport(handler))
+    return client
+
+
+def test_rate_limited_half_open_query_keeps_the_probe(clock):
+    breaker = tripped(clock)
+    clock.now += 30
+    limiter = AdaptiveRateLimiter(rate=0.5, burst=1)
+
+    async def run():
+        await limiter.acquire(0)  # токенов нет: отказ лимитера до запроса
+        client = notion_client(breaker, [], limiter=limiter)
+        with pytest.raises(RateLimitExceeded):
+            await client.query_database({"property": "tg_id"}, max_wait=0)
+        await client.close()
+
+    asyncio.run(run())
+    assert breaker.allow()
+
+
+def test_429_during_half_open_probe_is_retried_and_closes():
+    breaker = CircuitBreaker(name="test", min_calls=2, failure_rate=0.5, open_seconds=0.05)
+    breaker.record_failure()
+    breaker.record_failure()
+    responses = [
+        httpx.Response(429, headers={"Retry-After": "0.01"}),
+        httpx.Response(200, json={"object": "list", "results": []}),
+    ]
+
+    async def run():
+        await asyncio.sleep(0.06)
+        client = notion_client(breaker, responses, limiter=AdaptiveRateLimiter(rate=100, burst=100))
+        data = await client.query_database({"property": "tg_id"})
+        await client.close()
+        return data
+
+    assert asyncio.run(run())["results"] == []
+    assert breaker.state == CircuitBreaker.CLOSED
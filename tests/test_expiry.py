@@ -0,0 +1,100 @@
+import asyncio
+from datetime import date
+
+import pytest
+
+from expiry import ExpiryScheduler, ReminderLog
+from notion import CabinetRecord
+from subscriptions import SubscriptionIndex
+
+EXPIRES = date(2026, 3, 10)
+
+
+class Sender:
+    def __init__(self, *outcomes: str):
+        self.outcomes = list(outcomes)
+        self.calls = []
+
+    async def __call__(self, tg_id: int, days: int, expires_at: date) -> str:
+        self.calls.append((tg_id, days, expires_at))
+        return self.outcomes.pop(0) if self.outcomes else "delivered"
+
+
+@pytest.fixture
+def index(tmp_path):
+    idx = SubscriptionIndex(str(tmp_path / "subscriptions.sqlite3"))
+    idx.upsert([CabinetRecord(tg_id="42", status="approved", expires_at=EXPIRES)])
+    yield idx
+    idx.close()
+
+
+@pytest.fixture
+def reminder_log(tmp_path):
+    rl = ReminderLog(str(tmp_path / "reminders.sqlite3"))
+    yield rl
+    rl.close()
+
+
+def scheduler(index, reminder_log, send) -> ExpiryScheduler:
+    return ExpiryScheduler(index, reminder_log, send, days_before=(3, 0), hour_utc=10, grace=3600, retry_delay=60)
+
+
+def tick(s: ExpiryScheduler, now: float):
+    s.load(now)
+    asyncio.run(s._fire(s._pop_due(now), now))
+
+
+def test_reminder_is_sent_once_even_after_restart(index, reminder_log):
+    send = Sender()
+    s = scheduler(index, reminder_log, send)
+    now = s.fire_at(EXPIRES, 3) + 1
+    tick(s, now)
+    assert send.calls == [(42, 3, EXPIRES)]
+
+    restarted = scheduler(index, reminder_log, send)
+    tick(restarted, now + 5)
+    assert len(send.calls) == 1
+    assert restarted.skipped == 1
+
+
+def test_renewed_subscription_is_not_reminded(index, reminder_log):
+    send = Sender()
+    s = scheduler(index, reminder_log, send)
+    s.load(s.fire_at(EXPIRES, 3) - 100)
+    index.upsert([CabinetRecord(tg_id="42", status="approved", expires_at=date(2026, 4, 10))])
+    tick(s, s.fire_at(EXPIRES, 3) + 1)
+    assert send.calls == []
+    assert s.skipped == 1
+
+
+def test_failed_send_is_retried_within_grace(index, reminder_log):
+    send = Sender("failed", "delivered")
+    s = scheduler(index, reminder_log, send)
+    now = s.fire_at(EXPIRES, 3) + 1
+    tick(s, now)
+    assert (s.failed, s.retried) == (1, 1)
+    tick(s, now + 60)
+    assert send.calls == [(42, 3, EXPIRES), (42, 3, EXPIRES)]
+    assert s.sent == 1
+
+
+def test_blocked_user_is_not_retried(index, reminder_log):
+    send = Sender("blocked")
+    s = scheduler(index, reminder_log, send)
+    now = s.fire_at(EXPIRES, 3) + 1
+    tick(s, now)
+    tick(s, now + 60)
+    assert len(send.calls) == 1
+    assert (s.blocked, s.retried) == (1, 0)
+
+
+def test_reminders_missed_beyond_grace_are_dropped(index, reminder_log):
+    send = Sender()
+    s = scheduler(index, reminder_log, send)
+    # первое напоминание опоздало больше чем на grace, в день окончания — ещё нет
+    now = s.fire_at(EXPIRES, 3) + 7200
+    assert s.load(now) == 1
+    asyncio.run(s._fire(s._pop_due(now), now))
+    assert send.calls == []
+    tick(s, s.fire_at(EXPIRES, 0) + 1)
+    assert send.calls == [(42, 0, EXPIRES)]
@@ -0,0 +1,38 @@
+import asyncio
+
+from aiohttp import web
+from aiohttp.test_utils import TestClient, TestServer
+
+from metrics import Counter, Registry, add_metrics_route, is_loopback
+
+
+def scrape(headers: dict) -> int:
+    async def run():
+        registry = Registry()
+        registry.register(Counter("bot_test_total", "test")).inc()
+        app = web.Application()
+        add_metrics_route(app, "/metrics", registry=registry, token="s3cret")
+        async with TestClient(TestServer(app)) as client:
+            r = await client.get("/metrics", headers=headers)
+            return r.status
+
+    return asyncio.run(run())
+
+
+def test_token_required():
+    assert scrape({"Authorization": "Bearer s3cret"}) == 200
+    assert scrape({}) == 401
+    assert scrape({"Authorization": "Bearer wrong"}) == 401
+
+
+def test_non_ascii_authorization_is_401():
+    assert scrape({"Authorization": "Bearer сЕкрет".encode().decode("latin-1")}) == 401
+
+
+def test_is_loopback():
+    assert is_loopback("127.0.0.1")
+    assert is_loopback("::1")
+    assert is_loopback("localhost")
+    assert not is_loopback("0.0.0.0")
+    assert not is_loopback("10.0.0.5")
+    assert not is_loopback("metrics.internal")
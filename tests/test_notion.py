@@ -0,0 +1,107 @@
+import asyncio
+import time
+
+import httpx
+
+from circuit import CircuitBreaker
+from notion import NotionClient
+from ratelimit import AdaptiveRateLimiter
+
+SCHEMA = {"object": "database", "properties": {"tg_id": {"id": "a%3D"}, "status": {"id": "b%3D"}}}
+
+
+def notion_client(handler, *, breaker=None, limiter=None) -> NotionClient:
+    client = NotionClient("token", "db", breaker=breaker, limiter=limiter, hedge_quantile=None)
+    client._client = httpx.AsyncClient(base_url="https://notion.test/v1", transport=httpx.MockTransport(handler))
+    return client
+
+
+def test_schema_lookup_does_not_take_the_probe():
+    # property_ids() в half_open не должен занимать пробу: её ждёт сам запрос к базе
+    breaker = CircuitBreaker(name="test", min_calls=2, failure_rate=0.5, open_seconds=0.01)
+    breaker.record_failure()
+    breaker.record_failure()
+    time.sleep(0.02)
+    assert breaker.state == CircuitBreaker.HALF_OPEN
+    client = NotionClient("token", "db", breaker=breaker)
+    assert asyncio.run(client.property_ids()) == {}
+    assert breaker.allow()
+
+
+def test_concurrent_callers_share_one_schema_fetch():
+    calls = []
+
+    async def handler(request: httpx.Request) -> httpx.Response:
+        calls.append(request.url.path)
+        await asyncio.sleep(0.02)
+        return httpx.Response(200, json=SCHEMA)
+
+    async def run():
+        client = notion_client(handler)
+        results = await asyncio.gather(*(client.property_ids() for _ in range(5)))
+        await client.close()
+        return results
+
+    results = asyncio.run(run())
+    assert calls == ["/v1/databases/db"]
+    assert all(r == {"tg_id": "a%3D", "status": "b%3D"} for r in results)
+
+
+def test_schema_fetch_respects_the_callers_deadline():
+    async def handler(request: httpx.Request) -> httpx.Response:
+        await asyncio.sleep(1.0)
+        return httpx.Response(200, json=SCHEMA)
+
+    async def run():
+        client = notion_client(handler)
+        t0 = time.monotonic()
+        ids = await client.property_ids(deadline=t0 + 0.05)
+        elapsed = time.monotonic() - t0
+        await client.close()
+        return ids, elapsed, client._schema_retry_at
+
+    ids, elapsed, retry_at = asyncio.run(run())
+    assert ids == {}
+    assert elapsed < 0.5
+    assert retry_at == 0.0  # медленный ответ — не повод считать схему недоступной
+
+
+def test_limiter_rejection_is_not_schema_unavailable():
+    calls = []
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        calls.append(request.url.path)
+        return httpx.Response(200, json=SCHEMA)
+
+    async def run():
+        limiter = AdaptiveRateLimiter(rate=0.5, burst=1)
+        await limiter.acquire(0)  # токенов нет
+        client = notion_client(handler, limiter=limiter)
+        first = await client.property_ids(deadline=time.monotonic() + 0.05)
+        limiter.bucket.set_rate(100)
+        limiter.bucket.tokens = 1
+        second = await client.property_ids()
+        await client.close()
+        return first, second
+
+    first, second = asyncio.run(run())
+    assert first == {}
+    assert second == {"tg_id": "a%3D", "status": "b%3D"}
+    assert calls == ["/v1/databases/db"]
+
+
+def test_http_error_backs_off_schema_lookups():
+    calls = []
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        calls.append(request.url.path)
+        return httpx.Response(500, json={"object": "error"})
+
+    async def run():
+        client = notion_client(handler, limiter=AdaptiveRateLimiter(rate=100, burst=100))
+        assert await client.property_ids() == {}
+        assert await client.property_ids() == {}
+        await client.close()
+
+    asyncio.run(run())
+    assert len(calls) == 1
@@ -0,0 +1,50 @@
+import pytest
+
+from orders import OrderLedger
+
+
+@pytest.fixture
+def ledger(tmp_path):
+    ledger = OrderLedger(str(tmp_path / "orders.sqlite3"), b"secret")
+    yield ledger
+    ledger.close()
+
+
+def test_token_round_trip(ledger):
+    order = ledger.create(42, period_key="1m", currency="USDT", amount=50)
+    token = ledger.token(order.order_id)
+    assert ledger.verify(token) == order.order_id
+    assert ledger.resolve(token).amount == 50
+
+
+def test_tampered_tag_is_rejected(ledger):
+    token = ledger.token("abc123")
+    order_id, tag = token.split(".")
+    forged = f"{order_id}.{'A' if tag[0] != 'A' else 'B'}{tag[1:]}"
+    assert ledger.verify(forged) is None
+
+
+def test_tag_of_another_order_is_rejected(ledger):
+    tag = ledger.token("abc123").split(".")[1]
+    assert ledger.verify(f"xyz789.{tag}") is None
+
+
+def test_token_signed_with_another_secret_is_rejected(ledger, tmp_path):
+    other = OrderLedger(str(tmp_path / "other.sqlite3"), b"another")
+    try:
+        assert ledger.verify(other.token("abc123")) is None
+    finally:
+        other.close()
+
+
+@pytest.mark.parametrize("token", ["", "abc123", "abc123.", ".tag", None, "abc.ы", "заказ.tag"])
+def test_malformed_tokens(ledger, token):
+    assert ledger.verify(token) is None
+
+
+def test_resolve_unknown_order(ledger):
+    assert ledger.resolve(ledger.token("never-created")) is None
+
+
+def test_resolve_hand_edited_token(ledger):
+    assert ledger.resolve("abc.ы") is None
@@ -0,0 +1,45 @@
+import asyncio
+
+import pytest
+
+from ratelimit import AdaptiveRateLimiter, RateLimitExceeded
+
+
+def test_queued_waiters_are_granted_by_priority():
+    async def run() -> list[int]:
+        limiter = AdaptiveRateLimiter(rate=50, burst=1, lanes=3)
+        await limiter.acquire(0)  # забрали единственный токен — дальше все в очереди
+        order: list[int] = []
+
+        async def waiter(priority: int):
+            await limiter.acquire(priority)
+            order.append(priority)
+
+        tasks = [asyncio.create_task(waiter(p)) for p in (2, 1, 2, 0, 1, 0)]
+        await asyncio.gather(*tasks)
+        return order
+
+    assert asyncio.run(run()) == [0, 0, 1, 1, 2, 2]
+
+
+def test_max_wait_rejects_instead_of_queueing():
+    async def run():
+        limiter = AdaptiveRateLimiter(rate=1, burst=1)
+        await limiter.acquire(0)
+        with pytest.raises(RateLimitExceeded):
+            await limiter.acquire(0, max_wait=0.1)
+        assert limiter.rejected == 1
+
+    asyncio.run(run())
+
+
+def test_throttle_halves_rate_and_success_restores_it():
+    limiter = AdaptiveRateLimiter(rate=4, burst=4, min_rate=1, increase_step=1)
+    limiter.on_throttle()
+    assert limiter.bucket.rate == 2
+    limiter.on_throttle()
+    limiter.on_throttle()
+    assert limiter.bucket.rate == 1
+    for _ in range(10):
+        limiter.on_success()
+    assert limiter.bucket.rate == 4
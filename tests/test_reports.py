@@ -0,0 +1,100 @@
+import asyncio
+import csv
+import json
+from datetime import date
+
+from reports import ReportRow, RowWriter, SubscriberReport, iter_report_rows
+
+
+def rt(value: str) -> dict:
+    return {"type": "rich_text", "rich_text": [{"plain_text": value}] if value else []}
+
+
+def page(tg_id: str, status: str, *, expires: str = "", usdt: str = "", order_id: str = "", created: str = "") -> dict:
+    return {
+        "id": f"page-{tg_id}-{created}",
+        "created_time": created,
+        "properties": {
+            "tg_id": rt(tg_id),
+            "status": {"type": "status", "status": {"name": status}},
+            "expires_at": rt(expires),
+            "period_key": rt("1m"),
+            "amount_usdt": rt(usdt),
+            "amount_uah": rt(""),
+            "order_id": rt(order_id),
+        },
+    }
+
+
+class Pages:
+    """Вместо NotionClient: iter_pages() по готовому списку."""
+
+    def __init__(self, pages: list[dict]):
+        self.pages = pages
+
+    async def iter_pages(self, filter_obj=None, **kwargs):
+        for p in self.pages:
+            yield p
+
+
+def collect(pages: list[dict], resolve=None) -> list[ReportRow]:
+    async def run():
+        return [row async for row in iter_report_rows(Pages(pages), resolve)]
+
+    return asyncio.run(run())
+
+
+def test_malformed_row_does_not_stop_the_stream():
+    def resolve(token: str):
+        if token == "abc.ы":
+            raise TypeError("hand-edited token")
+        return None
+
+    pages = [
+        page("1", "approved", usdt="50"),
+        page("2", "approved", order_id="abc.ы"),
+        {"id": "broken", "properties": "not an object", "created_time": None},
+        page("3", "pending"),
+    ]
+    rows = collect(pages, resolve)
+    assert [r.tg_id for r in rows] == ["1", "2", "3"]
+    # строка с битым order_id — с полями из Notion, без суммы из журнала
+    assert rows[1].status == "approved" and rows[1].amount == 0
+
+
+def test_number_and_formula_amounts():
+    p = page("1", "approved")
+    p["properties"]["amount_usdt"] = {"type": "number", "number": 50.0}
+    p["properties"]["amount_uah"] = {"type": "formula", "formula": {"type": "number", "number": 1200}}
+    row = ReportRow.from_page(p)
+    assert (row.currency, row.amount) == ("USDT", 50)
+
+
+def test_summary_counts_latest_request_per_user():
+    report = SubscriberReport(today=date(2026, 1, 1))
+    rows = [
+        ReportRow(tg_id="1", status="approved", expires_at=date(2026, 2, 1), period_key="1m", currency="USDT", amount=50),
+        ReportRow(tg_id="1", status="approved", expires_at=date(2025, 1, 1), period_key="1m", currency="USDT", amount=50),
+        ReportRow(tg_id="2", status="approved", expires_at=date(2025, 6, 1), period_key="3m", currency="UAH", amount=5200),
+        ReportRow(tg_id="3", status="rejected"),
+        ReportRow(tg_id="4", status="pending"),
+    ]
+    for row in rows:
+        report.add(row)
+    assert (report.requests, report.users) == (5, 4)
+    assert (report.active, report.expired, report.rejected, report.pending) == (1, 1, 1, 1)
+    assert report.revenue == {("1m", "USDT"): [2, 100], ("3m", "UAH"): [1, 5200]}
+
+
+def test_row_writer_csv_and_jsonl(tmp_path):
+    row = ReportRow(tg_id="1", status="approved", expires_at=date(2026, 2, 1), currency="USDT", amount=50)
+    for fmt in ("csv", "jsonl"):
+        writer = RowWriter(str(tmp_path / f"out.{fmt}"), fmt)
+        writer.write(row)
+        writer.close()
+        with open(writer.path, encoding="utf-8") as f:
+            if fmt == "csv":
+                (data,) = list(csv.DictReader(f))
+            else:
+                data = json.loads(f.readline())
+        assert data["tg_id"] == "1" and data["expires_at"] == "2026-02-01" and str(data["amount"]) == "50"
@@ -0,0 +1,80 @@
+import asyncio
+import time
+
+import pytest
+from aiogram.exceptions import TelegramRetryAfter
+from aiogram.methods import SendMessage
+
+from sender import BULK, INTERACTIVE, OutboundScheduler
+
+
+def test_calls_in_one_chat_run_one_at_a_time_in_order():
+    log = []
+
+    def call(i: int):
+        async def fn():
+            log.append(("start", i))
+            await asyncio.sleep(0.005)
+            log.append(("end", i))
+            return i
+
+        return fn
+
+    async def run():
+        outbound = OutboundScheduler(global_rate=1000, global_burst=1000)
+        results = await asyncio.gather(*(outbound.send(42, call(i)) for i in range(5)))
+        await outbound.close()
+        return results
+
+    assert asyncio.run(run()) == [0, 1, 2, 3, 4]
+    assert log == [(kind, i) for i in range(5) for kind in ("start", "end")]
+
+
+def test_interactive_goes_before_queued_bulk():
+    started = []
+
+    def call(tag: str):
+        async def fn():
+            started.append(tag)
+
+        return fn
+
+    async def run():
+        outbound = OutboundScheduler(global_rate=1000, global_burst=1000)
+        bulk = [outbound.send(100 + i, call(f"bulk{i}"), priority=BULK) for i in range(3)]
+        interactive = [outbound.send(200 + i, call(f"ui{i}"), priority=INTERACTIVE) for i in range(2)]
+        await asyncio.gather(*bulk, *interactive)
+        await outbound.close()
+
+    asyncio.run(run())
+    assert started == ["ui0", "ui1", "bulk0", "bulk1", "bulk2"]
+
+
+def test_bulk_retry_after_pauses_the_bulk_lane_only():
+    done_at = {}
+
+    def call(tag: str, fail: bool = False):
+        async def fn():
+            if fail:
+                raise TelegramRetryAfter(SendMessage(chat_id=1, text="x"), "Flood control exceeded", 0.2)
+            done_at[tag] = time.monotonic()
+
+        return fn
+
+    async def run():
+        outbound = OutboundScheduler(global_rate=1000, global_burst=1000)
+        t0 = time.monotonic()
+        with pytest.raises(TelegramRetryAfter):
+            await outbound.send(1, call("flood", fail=True), priority=BULK)
+        await asyncio.gather(
+            outbound.send(2, call("bulk"), priority=BULK),
+            outbound.send(3, call("ui"), priority=INTERACTIVE),
+        )
+        stats = outbound.stats()
+        await outbound.close()
+        return t0, stats
+
+    t0, stats = asyncio.run(run())
+    assert done_at["ui"] - t0 < 0.1
+    assert done_at["bulk"] - t0 >= 0.2
+    assert stats["retry_after_hits"] == 1
@@ -0,0 +1,92 @@
+import asyncio
+import gzip
+import json
+import os
+import threading
+import time
+
+from cache import TTLCache
+from snapshot import Snapshot
+
+
+def cache_snapshot(path: str, cache: TTLCache, **kwargs) -> Snapshot:
+    return Snapshot(path, {"cache": (cache.dump, cache.load)}, **kwargs)
+
+
+def test_round_trip_restores_live_entries_only(tmp_path):
+    path = str(tmp_path / "state" / "snapshot.json.gz")
+    cache = TTLCache(fresh_ttl=60, stale_ttl=600)
+    cache.set("fresh", {"n": 1})
+    cache.set("expired", {"n": 2}, stored_at=time.time() - 3600)
+    assert cache_snapshot(path, cache).save()
+    assert os.listdir(tmp_path / "state") == ["snapshot.json.gz"]
+
+    restored = TTLCache(fresh_ttl=60, stale_ttl=600)
+    snap = cache_snapshot(path, restored)
+    assert snap.load()
+    assert restored.peek("fresh")[1] == {"n": 1}
+    assert restored.peek("expired") is None
+    assert snap.loaded_age_s < 5
+
+
+def test_missing_corrupt_old_or_foreign_file_starts_cold(tmp_path):
+    path = str(tmp_path / "snapshot.json.gz")
+    cache = TTLCache()
+    snap = cache_snapshot(path, cache, max_age=60)
+    assert not snap.load()
+
+    with open(path, "wb") as f:
+        f.write(b"not gzip")
+    assert not snap.load()
+
+    for data in (
+        {"version": 999, "saved_at": time.time(), "sources": {"cache": [["k", time.time(), 1]]}},
+        {"version": 1, "saved_at": time.time() - 120, "sources": {"cache": [["k", time.time(), 1]]}},
+    ):
+        with open(path, "wb") as f:
+            f.write(gzip.compress(json.dumps(data).encode()))
+        assert not snap.load()
+    assert len(cache) == 0
+
+
+def test_broken_source_does_not_block_the_others(tmp_path):
+    path = str(tmp_path / "snapshot.json.gz")
+    cache = TTLCache()
+    cache.set("k", 1)
+
+    def broken():
+        raise RuntimeError("boom")
+
+    snap = Snapshot(path, {"cache": (cache.dump, cache.load), "broken": (broken, lambda state: None)})
+    assert snap.save()
+    restored = TTLCache()
+    assert cache_snapshot(path, restored).load()
+    assert restored.peek("k")[1] == 1
+
+
+def test_cancelled_periodic_write_finishes_before_returning(tmp_path):
+    path = str(tmp_path / "snapshot.json.gz")
+    snap = cache_snapshot(path, TTLCache())
+    started = threading.Event()
+    finished = []
+    write = snap.write
+
+    def slow_write(data: dict) -> bool:
+        started.set()
+        time.sleep(0.1)
+        ok = write(data)
+        finished.append(ok)
+        return ok
+
+    snap.write = slow_write
+
+    async def run():
+        task = asyncio.create_task(snap.run_forever(0.01))
+        while not started.is_set():
+            await asyncio.sleep(0.005)
+        task.cancel()
+        await asyncio.gather(task, return_exceptions=True)
+        return list(finished)
+
+    # после отмены задачи запись в потоке уже завершена: финальный save() её не перегонит
+    assert asyncio.run(run()) == [True]
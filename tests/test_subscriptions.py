@@ -0,0 +1,80 @@
+import asyncio
+import time
+
+import httpx
+import pytest
+
+from notion import CabinetRecord
+from subscriptions import SubscriptionIndex, sync_once
+
+
+def page(tg_id: str, edited: str) -> dict:
+    return {
+        "id": f"page-{tg_id}",
+        "created_time": "2026-01-01T00:00:00.000Z",
+        "last_edited_time": edited,
+        "properties": {
+            "tg_id": {"type": "rich_text", "rich_text": [{"plain_text": tg_id}]},
+            "status": {"type": "status", "status": {"name": "approved"}},
+        },
+    }
+
+
+class Batches:
+    """Вместо NotionClient: iter_batches() по готовому списку, запоминает фильтры."""
+
+    def __init__(self, pages: list[dict], fail: bool = False):
+        self.pages = pages
+        self.fail = fail
+        self.filters = []
+
+    async def iter_batches(self, filter_obj=None, **kwargs):
+        self.filters.append(filter_obj)
+        yield self.pages
+        if self.fail:
+            raise httpx.ConnectError("notion down")
+
+
+@pytest.fixture
+def index(tmp_path):
+    idx = SubscriptionIndex(str(tmp_path / "subscriptions.sqlite3"))
+    yield idx
+    idx.close()
+
+
+def test_first_sync_is_full_and_removes_deleted_pages(index):
+    index.upsert([CabinetRecord(tg_id="1"), CabinetRecord(tg_id="2"), CabinetRecord(tg_id="3")])
+    notion = Batches([page("1", "2026-03-01T10:00:00.000Z"), page("3", "2026-03-02T10:00:00.000Z")])
+    assert asyncio.run(sync_once(notion, index)) == 2
+    assert notion.filters == [None]
+    assert index.get("2") is None
+    assert index.count() == 2
+    assert index.get_state("last_edited_time") == "2026-03-02T10:00:00.000Z"
+
+
+def test_incremental_sync_deletes_nothing(index):
+    index.upsert([CabinetRecord(tg_id="1"), CabinetRecord(tg_id="2")])
+    index.set_state("last_edited_time", "2026-03-01T10:00:00.000Z")
+    notion = Batches([page("1", "2026-03-02T10:00:00.000Z")])
+    asyncio.run(sync_once(notion, index))
+    assert notion.filters[0]["last_edited_time"] == {"on_or_after": "2026-03-01T10:00:00.000Z"}
+    assert index.count() == 2
+
+    asyncio.run(sync_once(notion, index, full=True))
+    assert notion.filters[1] is None
+    assert index.get("2") is None
+
+
+def test_interrupted_full_sync_deletes_nothing(index):
+    index.upsert([CabinetRecord(tg_id="1"), CabinetRecord(tg_id="2")])
+    with pytest.raises(httpx.ConnectError):
+        asyncio.run(sync_once(Batches([page("1", "2026-03-01T10:00:00.000Z")], fail=True), index))
+    assert index.count() == 2
+
+
+def test_rows_written_during_full_sync_are_kept(index):
+    started = time.time()
+    index.upsert([CabinetRecord(tg_id="1"), CabinetRecord(tg_id="2")])
+    assert index.delete_missing({"1"}, started) == 0
+    assert index.delete_missing({"1"}, time.time() + 1) == 1
+    assert index.get("2") is None
@@ -0,0 +1,88 @@
+import asyncio
+
+from updates import UpdateExecutor
+
+
+def test_updates_of_one_chat_run_in_order_chats_run_in_parallel():
+    log = []
+    running = set()
+    overlap = []
+
+    def update(chat: int, n: int):
+        async def fn():
+            if chat in running:
+                overlap.append(chat)
+            running.add(chat)
+            log.append((chat, n))
+            await asyncio.sleep(0.01)
+            running.discard(chat)
+
+        return fn
+
+    async def run():
+        executor = UpdateExecutor(workers=4)
+        loop = asyncio.get_running_loop()
+        t0 = loop.time()
+        for n in range(3):
+            for chat in (1, 2, 3):
+                await executor.submit(chat, update(chat, n))
+        await asyncio.wait_for(executor.join(), 1.0)
+        took = loop.time() - t0
+        await executor.close()
+        return executor, took
+
+    executor, took = asyncio.run(run())
+    assert overlap == []
+    for chat in (1, 2, 3):
+        assert [n for c, n in log if c == chat] == [0, 1, 2]
+    assert took < 0.08  # 3 чата параллельно: ~3 шага по 10 мс, а не 9
+    assert executor.processed == 9
+
+
+def test_failed_update_does_not_block_the_chat():
+    done = []
+
+    async def boom():
+        raise RuntimeError("handler bug")
+
+    async def ok():
+        done.append("ok")
+
+    async def run():
+        executor = UpdateExecutor(workers=2)
+        await executor.submit(7, boom)
+        await executor.submit(7, ok)
+        await asyncio.wait_for(executor.join(), 1.0)
+        await executor.close()
+        return executor
+
+    executor = asyncio.run(run())
+    assert done == ["ok"]
+    assert (executor.processed, executor.failed) == (1, 1)
+
+
+def test_submit_waits_when_max_queue_is_reached():
+    release = None
+
+    async def blocked():
+        await release.wait()
+
+    async def run():
+        nonlocal release
+        release = asyncio.Event()
+        executor = UpdateExecutor(workers=2, max_queue=2)
+        await executor.submit(1, blocked)
+        await executor.submit(2, blocked)
+        third = asyncio.create_task(executor.submit(3, blocked))
+        await asyncio.sleep(0.01)
+        accepted_while_full = third.done()
+        release.set()
+        await asyncio.wait_for(third, 1.0)
+        await asyncio.wait_for(executor.join(), 1.0)
+        await executor.close()
+        return accepted_while_full, executor
+
+    accepted_while_full, executor = asyncio.run(run())
+    assert not accepted_while_full
+    assert executor.backpressure_waits == 1
+    assert executor.processed == 3
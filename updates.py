@@ -0,0 +1,118 @@
+import asyncio
+import logging
+import time
+from collections import deque
+from typing import Any, Awaitable, Callable
+
+from aiogram import BaseMiddleware
+
+from metrics import UPDATE_QUEUE_SECONDS
+
+log = logging.getLogger("bot")
+
+# Обрабатываем только то, на что есть хендлеры: остальное Telegram даже не шлёт
+ALLOWED_UPDATES = ["message", "callback_query"]
+
+
+class UpdateExecutor(BaseMiddleware):
+    """
+    Outer-middleware на dp.update: апдейт не обрабатывается сразу, а встаёт в очередь.
+      - не больше `workers` хендлеров одновременно
+      - апдейты одного чата — строго по порядку, разные чаты — параллельно
+      - в очереди и в работе не больше `max_queue` апдейтов: дальше приём ждёт
+        (polling не берёт новые getUpdates, webhook отвечает Telegram медленнее)
+    """
+
+    def __init__(self, *, workers: int = 32, max_queue: int = 1000):
+        self.workers = workers
+        self.max_queue = max_queue
+        self._slots = asyncio.Semaphore(max_queue)
+        self._pending: dict[Any, deque] = {}
+        self._ready: asyncio.Queue = asyncio.Queue()
+        self._tasks: list[asyncio.Task] = []
+        self._idle = asyncio.Event()
+        self._idle.set()
+        self.queued = 0
+        self.inflight = 0
+        self.processed = 0
+        self.failed = 0
+        self.backpressure_waits = 0
+
+    def stats(self) -> dict:
+        return {
+            "workers": self.workers,
+            "queued": self.queued,
+            "inflight": self.inflight,
+            "chats_pending": len(self._pending),
+            "processed": self.processed,
+            "failed": self.failed,
+            "backpressure_waits": self.backpressure_waits,
+        }
+
+    async def __call__(
+        self,
+        handler: Callable[[Any, dict], Awaitable[Any]],
+        event: Any,
+        data: dict,
+    ) -> Any:
+        chat = data.get("event_chat")
+        user = data.get("event_from_user")
+        key = chat.id if chat else (user.id if user else None)
+        await self.submit(key, lambda: handler(event, data))
+        # для aiogram апдейт «обработан», как только принят в очередь
+        return None
+
+    async def submit(self, key: Any, fn: Callable[[], Awaitable[Any]]):
+        """Поставить вызов в очередь чата key (None — без упорядочивания). Ждёт, если очередь полна."""
+        if self._slots.locked():
+            self.backpressure_waits += 1
+        await self._slots.acquire()
+        if not self._tasks:
+            self._tasks = [asyncio.create_task(self._worker()) for _ in range(self.workers)]
+        if key is None:
+            key = object()
+        self.queued += 1
+        self._idle.clear()
+        q = self._pending.get(key)
+        if q is not None:
+            # чат уже в очереди или в работе: воркер подхватит после текущего апдейта
+            q.append((fn, time.monotonic()))
+            return
+        self._pending[key] = deque([(fn, time.monotonic())])
+        self._ready.put_nowait(key)
+
+    async def join(self):
+        """Дождаться, пока всё принятое будет обработано."""
+        await self._idle.wait()
+
+    async def close(self):
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+    async def _worker(self):
+        while True:
+            key = await self._ready.get()
+            q = self._pending[key]
+            fn, queued_at = q.popleft()
+            self.queued -= 1
+            self.inflight += 1
+            UPDATE_QUEUE_SECONDS.observe(time.monotonic() - queued_at)
+            try:
+                await fn()
+                self.processed += 1
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                self.failed += 1
+                log.exception("Update handler failed")
+            finally:
+                self.inflight -= 1
+                self._slots.release()
+                if q:
+                    self._ready.put_nowait(key)
+                else:
+                    del self._pending[key]
+                    if not self._pending:
+                        self._idle.set()